@@ -0,0 +1,206 @@
+import hashlib
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+
+class ChunkDiff:
+    """
+    文本块差异计算（增量更新使用）
+
+    功能特点：
+    1. 新文本只归一化一次，只记录连续空白处的偏移即可把归一化位置映射回原文
+    2. 旧块按前缀窗口的滚动指纹（窗口字符和与平方和，numpy前缀和一次算出）定位候选位置，
+       再逐个校验完整文本，整体接近线性，不再对全文反复 replace / 拼接大正则
+    3. 已定位的旧块保留原块ID；未覆盖的空隙按原文（非归一化文本）交给分割器重新切分
+    4. 新切出的块按内容哈希与未定位的旧块匹配，内容相同则沿用旧块ID
+    5. 结果按新文本中的顺序输出
+    """
+
+    WHITESPACE_RUN_PATTERN = re.compile(r'\s{2,}')
+
+    def __init__(self, window: int = 64):
+        """
+        参数:
+            window: 指纹窗口长度（字符），短于该长度的块使用自身长度
+        """
+        self.window = window
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """去除首尾空格、合并多余空格、换行转换为空格"""
+        return re.sub(r'\s+', ' ', text.strip())
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.blake2b(ChunkDiff.normalize_text(text).encode("utf-8"), digest_size=16).hexdigest()
+
+    def diff(self, old_blocks: List[Tuple[str, str]], new_text: str,
+             split_fun: Callable[[str], list]) -> Dict:
+        """
+        计算旧块与新文本的差异
+
+        参数:
+            old_blocks: 旧文本块 [(块ID, 文本)]
+            new_text: 新文本
+            split_fun: 分割函数，返回 [(块ID, 文本)] 或 [(块ID, 文本, 元数据)]
+
+        返回:
+            {
+                "blocks": 新文本对应的全部块（按顺序） [(块ID, 文本)],
+                "kept": 保留的旧块 [(块ID, 文本)],
+                "removed": 被删除的旧块 [(块ID, 文本)],
+                "added": 新增的块 [(块ID, 文本)],
+                "metadata": 新增块的元数据 {块ID: dict}
+            }
+        """
+        normalized, leading, run_starts, run_shifts = self._normalize_with_offsets(new_text)
+        matches = self._locate_blocks(old_blocks, normalized)
+
+        def to_original(pos: int) -> int:
+            # 归一化位置 -> 原文位置：加上之前所有被合并的空白长度
+            k = bisect_left(run_starts, pos) - 1
+            return leading + pos + (run_shifts[k] if k >= 0 else 0)
+
+        # 按位置拼出保留块与空隙
+        segments = []
+        cursor = 0
+        for start, end, index in matches:
+            if start > cursor:
+                segments.append(("gap", to_original(cursor), to_original(start)))
+            segments.append(("kept", index))
+            cursor = end
+        if cursor < len(normalized):
+            segments.append(("gap", to_original(cursor), len(new_text)))
+
+        matched_indexes = {index for _, _, index in matches}
+        unmatched = defaultdict(list)
+        for index, (bid, text) in enumerate(old_blocks):
+            if index not in matched_indexes:
+                unmatched[self.content_hash(text)].append(index)
+
+        used_bids = {bid for bid, _ in old_blocks}
+        blocks, kept, added = [], [], []
+        metadata = {}
+        for segment in segments:
+            if segment[0] == "kept":
+                block = old_blocks[segment[1]]
+                blocks.append(block)
+                kept.append(block)
+                continue
+
+            gap_text = new_text[segment[1]:segment[2]]
+            if not gap_text.strip():
+                continue
+            for chunk in split_fun(gap_text):
+                bid, text = chunk[0], chunk[1]
+                if not text or not text.strip():
+                    continue
+                # 内容与未定位的旧块相同（如被移动的块），沿用旧块ID
+                same_content = unmatched.get(self.content_hash(text))
+                if same_content:
+                    block = old_blocks[same_content.pop(0)]
+                    blocks.append(block)
+                    kept.append(block)
+                    continue
+                bid = self._unique_bid(bid, used_bids)
+                used_bids.add(bid)
+                blocks.append((bid, text))
+                added.append((bid, text))
+                if len(chunk) > 2 and chunk[2]:
+                    metadata[bid] = chunk[2]
+
+        kept_bids = {bid for bid, _ in kept}
+        removed = [(bid, text) for bid, text in old_blocks if bid not in kept_bids]
+        return {
+            "blocks": blocks,
+            "kept": kept,
+            "removed": removed,
+            "added": added,
+            "metadata": metadata
+        }
+
+    def _normalize_with_offsets(self, text: str):
+        """
+        归一化文本并记录位置偏移
+
+        单个空白字符归一化后长度不变，只需记录连续空白（被合并为一个空格）处的偏移
+
+        返回:
+            (归一化文本, 开头被去除的空白长度, 连续空白在归一化文本中的位置列表, 到该处为止累计被合并的长度列表)
+        """
+        body = text.strip()
+        leading = len(text) - len(text.lstrip())
+        run_starts, run_shifts = [], []
+        shift = 0
+        for match in self.WHITESPACE_RUN_PATTERN.finditer(body):
+            run_starts.append(match.start() - shift)
+            shift += match.end() - match.start() - 1
+            run_shifts.append(shift)
+        return self.normalize_text(body), leading, run_starts, run_shifts
+
+    def _locate_blocks(self, old_blocks: List[Tuple[str, str]], normalized: str) -> List[Tuple[int, int, int]]:
+        """
+        在归一化新文本中定位旧块
+
+        返回:
+            互不重叠、按位置排序的匹配 [(起始位置, 结束位置, 旧块下标)]
+        """
+        if not normalized or not old_blocks:
+            return []
+
+        codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        sum1 = np.concatenate(([0], np.cumsum(codes)))
+        sum2 = np.concatenate(([0], np.cumsum(codes * codes)))
+
+        # 按窗口长度分组，每组只计算一次全部窗口的指纹
+        normalized_blocks = {}
+        by_window = defaultdict(lambda: defaultdict(list))
+        for index, (_, text) in enumerate(old_blocks):
+            norm = self.normalize_text(text)
+            if not norm or len(norm) > len(normalized):
+                continue
+            normalized_blocks[index] = norm
+            window = min(self.window, len(norm))
+            prefix = np.frombuffer(norm[:window].encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+            key = int(prefix.sum()) * 1000003 + int((prefix * prefix).sum())
+            by_window[window][key].append(index)
+
+        candidates = []
+        for window, key_to_blocks in by_window.items():
+            keys = (sum1[window:] - sum1[:-window]) * 1000003 + (sum2[window:] - sum2[:-window])
+            block_keys = np.sort(np.fromiter(key_to_blocks, dtype=np.int64))
+            slots = np.minimum(np.searchsorted(block_keys, keys), len(block_keys) - 1)
+            positions = np.nonzero(block_keys[slots] == keys)[0]
+            for position in positions.tolist():
+                for index in key_to_blocks[int(keys[position])]:
+                    norm = normalized_blocks[index]
+                    # 指纹只是候选，逐个校验完整文本
+                    if normalized.startswith(norm, position):
+                        candidates.append((position, -len(norm), index))
+
+        # 按位置贪心选择互不重叠的匹配，同一位置优先较长的块，每个旧块只使用一次
+        candidates.sort()
+        matches = []
+        used = set()
+        cursor = 0
+        for position, negative_length, index in candidates:
+            if position < cursor or index in used:
+                continue
+            matches.append((position, position - negative_length, index))
+            used.add(index)
+            cursor = position - negative_length
+        return matches
+
+    @staticmethod
+    def _unique_bid(bid: str, used_bids: set) -> str:
+        """新块ID与已有块ID冲突时追加序号"""
+        if bid not in used_bids:
+            return bid
+        suffix = 1
+        while f"{bid}_{suffix}" in used_bids:
+            suffix += 1
+        return f"{bid}_{suffix}"
@@ -0,0 +1,169 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+
+class CompactGraph:
+    """
+    紧凑的知识图谱表示（只保存语义属性）
+
+    功能特点：
+    1. 节点名驻留为整数ID，节点类型、关系名、上下文都存入共享字符串池
+    2. 边保存为 numpy 数组：source / target / weight / 关系名ID / 上下文ID
+    3. 批量构建：同一有向实体对只保留最后一条关系（与逐条 add_edge 覆盖的结果一致）
+    4. 颜色、粗细、字体等样式不属于图谱本身，只在绘制时生成
+    5. 序列化为扁平的列表结构，比 node_link_data 小且无需逐个属性字典
+    """
+
+    FORMAT = "compact-v1"
+
+    def __init__(self, nodes: List[str], node_groups: np.ndarray, strings: List[str],
+                 src: np.ndarray, dst: np.ndarray, weight: np.ndarray,
+                 label: np.ndarray, context: np.ndarray):
+        self.nodes = nodes
+        self.node_index = {node: i for i, node in enumerate(nodes)}
+        self.node_groups = node_groups
+        self.strings = strings
+        self.src = src
+        self.dst = dst
+        self.weight = weight
+        self.label = label
+        self.context = context
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def number_of_edges(self) -> int:
+        return len(self.src)
+
+    def node_group(self, node: str) -> str:
+        return self.strings[self.node_groups[self.node_index[node]]]
+
+    def edges(self) -> Iterable[Tuple[str, str, Dict]]:
+        """按 (source, target, 语义属性) 遍历边"""
+        for s, t, w, l, c in zip(self.src.tolist(), self.dst.tolist(), self.weight.tolist(),
+                                 self.label.tolist(), self.context.tolist()):
+            yield self.nodes[s], self.nodes[t], {"label": self.strings[l], "title": self.strings[c], "weight": w}
+
+    @classmethod
+    def from_relations(cls, relations: List[Dict], entity_to_label: Dict[str, str],
+                       default_label: str = "未知标签") -> "CompactGraph":
+        """
+        由关系列表批量构建
+
+        参数:
+            relations: [{"bid": ..., "relation": [{"source", "target", "relation", "context", "weight"}]}]
+            entity_to_label: 实体 -> 实体类型
+        """
+        builder = _Builder(entity_to_label, default_label)
+        for relation in relations:
+            for rel in relation['relation']:
+                builder.add_edge(rel['source'], rel['target'], rel['relation'], rel['context'], rel.get('weight', 0.5))
+        return builder.build()
+
+    @classmethod
+    def from_networkx(cls, graph: nx.DiGraph, default_label: str = "未知标签") -> "CompactGraph":
+        """由 networkx 图构建，只保留节点类型与边的关系名/上下文/权重"""
+        builder = _Builder({}, default_label)
+        for node, attr in graph.nodes(data=True):
+            builder.add_node(node, attr.get('group', attr.get('title', default_label)))
+        for source, target, attr in graph.edges(data=True):
+            builder.add_edge(source, target, attr.get('label', ''), attr.get('title', ''), attr.get('weight', 0.5))
+        return builder.build()
+
+    def to_networkx(self) -> nx.DiGraph:
+        """转换为只带语义属性的 networkx 有向图"""
+        graph = nx.DiGraph()
+        groups = [self.strings[i] for i in self.node_groups.tolist()]
+        graph.add_nodes_from((node, {"group": group}) for node, group in zip(self.nodes, groups))
+        graph.add_edges_from(self.edges())
+        return graph
+
+    def to_dict(self) -> Dict:
+        return {
+            "format": self.FORMAT,
+            "nodes": self.nodes,
+            "node_groups": self.node_groups.tolist(),
+            "strings": self.strings,
+            "src": self.src.tolist(),
+            "dst": self.dst.tolist(),
+            "weight": self.weight.tolist(),
+            "label": self.label.tolist(),
+            "context": self.context.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CompactGraph":
+        return cls(
+            nodes=list(data["nodes"]),
+            node_groups=np.asarray(data["node_groups"], dtype=np.int32),
+            strings=list(data["strings"]),
+            src=np.asarray(data["src"], dtype=np.int32),
+            dst=np.asarray(data["dst"], dtype=np.int32),
+            weight=np.asarray(data["weight"], dtype=np.float64),
+            label=np.asarray(data["label"], dtype=np.int32),
+            context=np.asarray(data["context"], dtype=np.int32)
+        )
+
+    @classmethod
+    def is_compact(cls, data: Dict) -> bool:
+        return isinstance(data, dict) and data.get("format") == cls.FORMAT
+
+
+class _Builder:
+    """CompactGraph 的批量构建器：驻留节点与字符串，同一有向实体对后写覆盖先写"""
+
+    def __init__(self, entity_to_label: Dict[str, str], default_label: str):
+        self.entity_to_label = entity_to_label
+        self.default_label = default_label
+        self.nodes: List[str] = []
+        self.node_index: Dict[str, int] = {}
+        self.node_groups: List[int] = []
+        self.strings: List[str] = []
+        self.string_index: Dict[str, int] = {}
+        # (src, dst) -> (weight, label, context)，dict保持首次插入顺序
+        self.edges: Dict[Tuple[int, int], Tuple[float, int, int]] = {}
+
+    def intern(self, text: Optional[str]) -> int:
+        text = "" if text is None else str(text)
+        index = self.string_index.get(text)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(text)
+            self.string_index[text] = index
+        return index
+
+    def add_node(self, node: str, group: Optional[str] = None) -> int:
+        index = self.node_index.get(node)
+        if index is None:
+            index = len(self.nodes)
+            self.nodes.append(node)
+            self.node_index[node] = index
+            self.node_groups.append(self.intern(group or self.entity_to_label.get(node, self.default_label)))
+        return index
+
+    def add_edge(self, source: str, target: str, label: str, context: str, weight) -> None:
+        try:
+            weight = float(weight)
+        except (ValueError, TypeError):
+            print(f"警告: 无法转换权重值 '{weight}' 为浮点数，使用默认值0.5")
+            weight = 0.5
+        key = (self.add_node(source), self.add_node(target))
+        self.edges[key] = (weight, self.intern(label), self.intern(context))
+
+    def build(self) -> CompactGraph:
+        keys = list(self.edges)
+        values = list(self.edges.values())
+        return CompactGraph(
+            nodes=self.nodes,
+            node_groups=np.asarray(self.node_groups, dtype=np.int32),
+            strings=self.strings,
+            src=np.fromiter((s for s, _ in keys), dtype=np.int32, count=len(keys)),
+            dst=np.fromiter((t for _, t in keys), dtype=np.int32, count=len(keys)),
+            weight=np.fromiter((w for w, _, _ in values), dtype=np.float64, count=len(values)),
+            label=np.fromiter((l for _, l, _ in values), dtype=np.int32, count=len(values)),
+            context=np.fromiter((c for _, _, c in values), dtype=np.int32, count=len(values))
+        )
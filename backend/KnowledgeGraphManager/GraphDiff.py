@@ -0,0 +1,174 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from KnowledgeGraphManager.CompactGraph import CompactGraph
+
+
+class GraphDiff:
+    """
+    图谱差异（紧凑边表上的向量化比较）
+
+    功能特点：
+    1. 两个图谱的节点名与字符串池先合并为统一编号，边以 (source, target) 编号对为64位键
+    2. 每条边的语义属性（关系名、上下文、权重）合成一个64位哈希，比较哈希即可判断边是否修改
+    3. 新增/删除/修改都由 numpy 的排序与集合运算得出，不构建 networkx 图
+    4. 结果为结构化字典（可直接序列化为JSON）：节点与边各一个列表，每项带状态，
+       变化边两端未变化的节点以 "unchanged" 状态附带，前端可直接按状态着色绘制
+    """
+
+    ADDED = "added"
+    REMOVED = "removed"
+    CHANGED = "changed"
+    UNCHANGED = "unchanged"
+
+    # 64位混合常数（splitmix64）
+    _MIX = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+    def __init__(self, old: CompactGraph, new: CompactGraph):
+        self.old = old
+        self.new = new
+        # 统一的节点编号与字符串编号（旧图在前，新图中新出现的追加在后）
+        self.names, old_nodes, new_nodes = self._merge(old.nodes, new.nodes)
+        self.strings, old_strings, new_strings = self._merge(old.strings, new.strings)
+        self.old_node_ids, self.new_node_ids = old_nodes, new_nodes
+        self.old_groups, self.new_groups = old_strings[old.node_groups], new_strings[new.node_groups]
+        n = max(len(self.names), 1)
+        self.old_keys = old_nodes[old.src].astype(np.int64) * n + old_nodes[old.dst]
+        self.new_keys = new_nodes[new.src].astype(np.int64) * n + new_nodes[new.dst]
+        self.old_labels, self.new_labels = old_strings[old.label], new_strings[new.label]
+        self.old_contexts, self.new_contexts = old_strings[old.context], new_strings[new.context]
+        self.old_hashes = self._edge_hashes(self.old_labels, self.old_contexts, old.weight)
+        self.new_hashes = self._edge_hashes(self.new_labels, self.new_contexts, new.weight)
+
+    @staticmethod
+    def _merge(first: List[str], second: List[str]):
+        """合并两个名字列表，返回 (统一列表, 第一个列表的统一编号, 第二个列表的统一编号)"""
+        merged = list(first)
+        index = {name: i for i, name in enumerate(merged)}
+        second_ids = np.empty(len(second), dtype=np.int64)
+        for i, name in enumerate(second):
+            j = index.get(name)
+            if j is None:
+                j = len(merged)
+                merged.append(name)
+                index[name] = j
+            second_ids[i] = j
+        return merged, np.arange(len(first), dtype=np.int64), second_ids
+
+    @classmethod
+    def _mix(cls, values: np.ndarray) -> np.ndarray:
+        values = values ^ (values >> np.uint64(30))
+        values = values * cls._MIX[1]
+        values = values ^ (values >> np.uint64(27))
+        values = values * cls._MIX[2]
+        return values ^ (values >> np.uint64(31))
+
+    @classmethod
+    def _edge_hashes(cls, labels: np.ndarray, contexts: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """关系名、上下文（统一字符串编号）与权重合成的64位哈希"""
+        with np.errstate(over="ignore"):
+            value = cls._mix(labels.astype(np.uint64) + cls._MIX[0])
+            value = cls._mix(value ^ (contexts.astype(np.uint64) + cls._MIX[0]))
+            return cls._mix(value ^ np.asarray(weights, dtype=np.float64).view(np.uint64))
+
+    def compare(self) -> Dict:
+        """
+        返回:
+            {"summary": {各类变化数量与新旧规模},
+             "nodes": [{"id", "status", "group", 修改时另含 "old_group"}],
+             "edges": [{"from", "to", "status", "label", "title", "weight", 修改时另含 "old"}]}
+        """
+        old_nodes, new_nodes = self.old_node_ids, self.new_node_ids
+        _, old_common, new_common = np.intersect1d(old_nodes, new_nodes, assume_unique=True, return_indices=True)
+        removed_nodes = np.setdiff1d(np.arange(len(old_nodes)), old_common, assume_unique=True)
+        added_nodes = np.setdiff1d(np.arange(len(new_nodes)), new_common, assume_unique=True)
+        group_changed = self.old_groups[old_common] != self.new_groups[new_common]
+        changed_nodes = new_common[group_changed]
+
+        _, old_shared, new_shared = np.intersect1d(self.old_keys, self.new_keys, assume_unique=True,
+                                                   return_indices=True)
+        removed_edges = np.setdiff1d(np.arange(len(self.old_keys)), old_shared, assume_unique=True)
+        added_edges = np.setdiff1d(np.arange(len(self.new_keys)), new_shared, assume_unique=True)
+        modified = self.old_hashes[old_shared] != self.new_hashes[new_shared]
+        changed_old, changed_new = old_shared[modified], new_shared[modified]
+
+        nodes = [self._node(self.new, i, self.ADDED) for i in added_nodes.tolist()]
+        nodes += [self._node(self.old, i, self.REMOVED) for i in removed_nodes.tolist()]
+        for old_i, new_i in zip(old_common[group_changed].tolist(), changed_nodes.tolist()):
+            record = self._node(self.new, new_i, self.CHANGED)
+            record["old_group"] = self.old.strings[self.old.node_groups[old_i]]
+            nodes.append(record)
+
+        edges = [self._edge(self.new, e, self.ADDED) for e in added_edges.tolist()]
+        edges += [self._edge(self.old, e, self.REMOVED) for e in removed_edges.tolist()]
+        for old_e, new_e in zip(changed_old.tolist(), changed_new.tolist()):
+            record = self._edge(self.new, new_e, self.CHANGED)
+            previous = self._edge(self.old, old_e, self.CHANGED)
+            record["old"] = {key: previous[key] for key in ("label", "title", "weight")}
+            edges.append(record)
+
+        # 变化边两端中未变化的节点（绘制边时需要）
+        listed = {record["id"] for record in nodes}
+        for record in edges:
+            for name in (record["from"], record["to"]):
+                if name not in listed:
+                    listed.add(name)
+                    graph = self.new if name in self.new.node_index else self.old
+                    nodes.append(self._node(graph, graph.node_index[name], self.UNCHANGED))
+
+        return {
+            "summary": {
+                "added_nodes": len(added_nodes),
+                "removed_nodes": len(removed_nodes),
+                "changed_nodes": len(changed_nodes),
+                "added_edges": len(added_edges),
+                "removed_edges": len(removed_edges),
+                "changed_edges": len(changed_new),
+                "old_nodes": self.old.number_of_nodes,
+                "new_nodes": self.new.number_of_nodes,
+                "old_edges": self.old.number_of_edges,
+                "new_edges": self.new.number_of_edges
+            },
+            "nodes": nodes,
+            "edges": edges
+        }
+
+    @staticmethod
+    def _node(graph: CompactGraph, i: int, status: str) -> Dict:
+        return {"id": graph.nodes[i], "status": status, "group": graph.strings[graph.node_groups[i]]}
+
+    @staticmethod
+    def _edge(graph: CompactGraph, e: int, status: str) -> Dict:
+        return {
+            "from": graph.nodes[graph.src[e]],
+            "to": graph.nodes[graph.dst[e]],
+            "status": status,
+            "label": graph.strings[graph.label[e]],
+            "title": graph.strings[graph.context[e]],
+            "weight": float(graph.weight[e])
+        }
+
+    @classmethod
+    def between(cls, old: Optional[CompactGraph], new: CompactGraph) -> Dict:
+        """比较两个紧凑图谱，旧图谱为空时视为全部新增"""
+        if old is None:
+            old = CompactGraph.from_relations([], {})
+        return cls(old, new).compare()
+
+    @classmethod
+    def truncate(cls, diff: Dict, limit: int) -> Dict:
+        """
+        限制返回的边数量（按新增、删除、修改的顺序截取），保留这些边的端点与其余有变化的节点，统计保持完整
+        """
+        edges = diff["edges"][:limit]
+        names = {name for record in edges for name in (record["from"], record["to"])}
+        needed = [record for record in diff["nodes"] if record["id"] in names]
+        others = [record for record in diff["nodes"] if record["id"] not in names and record["status"] != cls.UNCHANGED]
+        nodes = needed + others[:max(limit - len(needed), 0)]
+        return {
+            "summary": diff["summary"],
+            "nodes": nodes,
+            "edges": edges,
+            "truncated": len(edges) < len(diff["edges"]) or len(nodes) < len(diff["nodes"])
+        }
@@ -0,0 +1,143 @@
+from typing import Optional
+
+import numpy as np
+
+
+class GraphLayout:
+    """
+    图谱布局（numpy 力导向，Fruchterman-Reingold）
+
+    功能特点：
+    1. 边的引力与节点间斥力都是数组运算，斥力按目标节点分批计算，每批的临时数组大小固定
+    2. 节点较多时每轮只对随机抽样的节点计算斥力并按比例放大，计算量与节点数线性相关
+    3. 可指定初始坐标与固定节点，只移动其余节点（增量放置新节点时斥力只对新节点计算）
+    4. 随机种子固定，同一张图的布局结果稳定
+    """
+
+    # 超过该节点数时斥力改为抽样计算
+    DENSE_LIMIT = 2000
+    REPULSION_SAMPLES = 256
+    # 斥力按目标节点分批计算，每批的节点对数不超过该值（临时数组约 16 字节/对）
+    REPULSION_BATCH_PAIRS = 1 << 18
+
+    @classmethod
+    def force_layout(cls, n: int, src: np.ndarray, dst: np.ndarray, weight: Optional[np.ndarray] = None,
+                     positions: Optional[np.ndarray] = None, fixed: Optional[np.ndarray] = None,
+                     iterations: int = 50, seed: int = 0) -> np.ndarray:
+        """
+        参数:
+            n: 节点数
+            src, dst: 边的两端节点编号
+            weight: 边权重（影响引力），为空时均为1
+            positions: 初始坐标 (n, 2)，为空时随机
+            fixed: 不移动的节点掩码
+        返回:
+            (n, 2) 坐标，范围约为 [-1, 1]
+        """
+        rng = np.random.default_rng(seed)
+        if positions is None:
+            positions = rng.uniform(-1.0, 1.0, size=(n, 2))
+        pos = np.array(positions, dtype=np.float64, copy=True)
+        if n <= 1:
+            return pos
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        weight = np.ones(len(src)) if weight is None else np.asarray(weight, dtype=np.float64)
+        movable = np.ones(n, dtype=bool) if fixed is None else ~np.asarray(fixed, dtype=bool)
+        if not movable.any():
+            return pos
+
+        # 理想边长（单位面积内均匀分布）
+        k = 1.0 / np.sqrt(n)
+        temperature = 0.1 * max(np.ptp(pos[:, 0]), np.ptp(pos[:, 1]), 1.0)
+        cooling = temperature / (iterations + 1)
+        moving = np.nonzero(movable)[0]
+        for _ in range(iterations):
+            # 斥力只对可移动的节点计算（增量放置时只有新节点）
+            displacement = np.zeros_like(pos)
+            displacement[moving] = cls._repulsion(pos[moving], pos, k, rng)
+
+            # 引力：沿边拉近两端节点
+            delta = pos[src] - pos[dst]
+            distance = np.maximum(np.linalg.norm(delta, axis=1), 0.01)
+            pull = delta * (weight * distance / k)[:, None]
+            displacement[:, 0] -= np.bincount(src, weights=pull[:, 0], minlength=n)
+            displacement[:, 1] -= np.bincount(src, weights=pull[:, 1], minlength=n)
+            displacement[:, 0] += np.bincount(dst, weights=pull[:, 0], minlength=n)
+            displacement[:, 1] += np.bincount(dst, weights=pull[:, 1], minlength=n)
+
+            # 每轮移动距离不超过当前温度
+            length = np.maximum(np.linalg.norm(displacement, axis=1), 0.01)
+            step = displacement * (np.minimum(length, temperature) / length)[:, None]
+            pos[movable] += step[movable]
+            temperature -= cooling
+        return pos
+
+    @classmethod
+    def _repulsion(cls, targets: np.ndarray, pos: np.ndarray, k: float, rng: np.random.Generator) -> np.ndarray:
+        """targets 受到来自全部节点 pos 的斥力"""
+        n = len(pos)
+        if n <= cls.DENSE_LIMIT:
+            others, scale = pos, 1.0
+        else:
+            others = pos[rng.choice(n, cls.REPULSION_SAMPLES, replace=False)]
+            scale = n / cls.REPULSION_SAMPLES
+        force = np.empty_like(targets)
+        batch = max(1, cls.REPULSION_BATCH_PAIRS // len(others))
+        for start in range(0, len(targets), batch):
+            delta = targets[start:start + batch, None, :] - others[None, :, :]
+            distance_sq = np.maximum((delta ** 2).sum(axis=2), 1.0e-4)
+            force[start:start + batch] = (delta * (k * k / distance_sq)[:, :, None]).sum(axis=1)
+        return scale * force
+
+    @classmethod
+    def place_new_nodes(cls, n: int, src: np.ndarray, dst: np.ndarray, weight: Optional[np.ndarray],
+                        positions: np.ndarray, known: np.ndarray, iterations: int = 30,
+                        seed: int = 0) -> np.ndarray:
+        """
+        增量布局：已有节点保持不动，新节点先放在已布局邻居的中心附近，再只移动新节点
+
+        参数:
+            positions: (n, 2) 坐标，known 为 False 的行会被覆盖
+            known: 已有坐标的节点掩码
+        """
+        rng = np.random.default_rng(seed)
+        known = np.asarray(known, dtype=bool)
+        pos = np.array(positions, dtype=np.float64, copy=True)
+        new = np.nonzero(~known)[0]
+        if len(new) == 0:
+            return pos
+        if not known.any():
+            return cls.rescale(cls.force_layout(n, src, dst, weight, seed=seed))
+
+        # 新节点的初始位置：已布局邻居的平均位置，没有已布局邻居时随机放在已有范围内
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        ends = np.concatenate([src, dst])
+        others = np.concatenate([dst, src])
+        use = ~known[ends] & known[others]
+        count = np.bincount(ends[use], minlength=n)
+        total_x = np.bincount(ends[use], weights=pos[others[use], 0], minlength=n)
+        total_y = np.bincount(ends[use], weights=pos[others[use], 1], minlength=n)
+        low, high = pos[known].min(axis=0), pos[known].max(axis=0)
+        jitter = 1.0 / np.sqrt(n)
+        pos[new] = rng.uniform(low, high, size=(len(new), 2))
+        near = new[count[new] > 0]
+        pos[near, 0] = total_x[near] / count[near]
+        pos[near, 1] = total_y[near] / count[near]
+        pos[near] += rng.uniform(-jitter, jitter, size=(len(near), 2))
+        return cls.force_layout(n, src, dst, weight, positions=pos, fixed=known, iterations=iterations, seed=seed)
+
+    @staticmethod
+    def display_scale(n: int) -> float:
+        """布局坐标（约 [-1, 1]）到前端像素坐标的缩放系数"""
+        return 30.0 * np.sqrt(max(n, 1))
+
+    @staticmethod
+    def rescale(pos: np.ndarray, scale: float = 1.0) -> np.ndarray:
+        """居中并缩放到 [-scale, scale]"""
+        if len(pos) == 0:
+            return pos
+        pos = pos - pos.mean(axis=0)
+        extent = np.abs(pos).max()
+        return pos * (scale / extent) if extent > 0 else pos
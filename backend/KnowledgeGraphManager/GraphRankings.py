@@ -0,0 +1,89 @@
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from KnowledgeGraphManager.CompactGraph import CompactGraph
+
+
+class GraphRankings:
+    """
+    节点排名（度数 / 加权度数 / PageRank）
+
+    功能特点：
+    1. 保存图谱时由紧凑图谱的边数组一次算出，随图谱状态持久化
+    2. 每种指标只保存前 limit 名（argpartition 部分选择后再排序），查询 top-k 直接切片
+    3. 增量更新保存时随图谱一起重算（全部为数组运算，与边数线性相关）
+    """
+
+    METRICS = ("degree", "weighted_degree", "pagerank")
+
+    def __init__(self, rankings: Dict[str, List[Tuple[str, float]]]):
+        self.rankings = rankings
+
+    @classmethod
+    def compute(cls, compact: CompactGraph, limit: int = None, damping: float = 0.85,
+                max_iter: int = 100, tol: float = 1.0e-6) -> "GraphRankings":
+        """
+        参数:
+            compact: 紧凑图谱
+            limit: 每种指标保存的名次数（默认取环境变量 RANKING_LIMIT）
+            damping: PageRank阻尼系数
+        """
+        limit = limit or int(os.getenv("RANKING_LIMIT", "500"))
+        n = compact.number_of_nodes
+        src, dst, weight = compact.src, compact.dst, compact.weight
+
+        # 有向图度数 = 出度 + 入度（与 networkx DiGraph.degree 一致）
+        degree = np.bincount(src, minlength=n) + np.bincount(dst, minlength=n)
+        weighted_degree = np.bincount(src, weights=weight, minlength=n) + np.bincount(dst, weights=weight, minlength=n)
+        pagerank = cls._pagerank(src, dst, weight, n, damping, max_iter, tol)
+
+        return cls({
+            "degree": cls._top(compact.nodes, degree, limit, int),
+            "weighted_degree": cls._top(compact.nodes, weighted_degree, limit, float),
+            "pagerank": cls._top(compact.nodes, pagerank, limit, float)
+        })
+
+    @staticmethod
+    def _pagerank(src: np.ndarray, dst: np.ndarray, weight: np.ndarray, n: int,
+                  damping: float, max_iter: int, tol: float) -> np.ndarray:
+        """加权PageRank幂迭代（悬挂节点的得分均匀分配）"""
+        if n == 0:
+            return np.zeros(0)
+        out_weight = np.bincount(src, weights=weight, minlength=n)
+        dangling = out_weight == 0
+        edge_share = np.divide(weight, out_weight[src], out=np.zeros(len(src)), where=out_weight[src] > 0)
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            previous = rank
+            rank = np.bincount(dst, weights=previous[src] * edge_share, minlength=n)
+            rank = damping * (rank + previous[dangling].sum() / n) + (1.0 - damping) / n
+            if np.abs(rank - previous).sum() < n * tol:
+                break
+        return rank
+
+    @staticmethod
+    def _top(nodes: List[str], scores: np.ndarray, limit: int, cast) -> List[Tuple[str, float]]:
+        """取分数最高的limit个节点，分数相同时保持节点顺序"""
+        if len(scores) > limit:
+            candidates = np.argpartition(-scores, limit - 1)[:limit]
+            # 边界上的同分节点全部纳入候选，保证与完整排序的结果一致
+            threshold = scores[candidates].min()
+            candidates = np.nonzero(scores >= threshold)[0]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.lexsort((candidates, -scores[candidates]))][:limit]
+        return [(nodes[i], cast(scores[i])) for i in order.tolist()]
+
+    def top(self, metric: str, n: int) -> List[Tuple[str, float]]:
+        if metric not in self.rankings:
+            raise ValueError(f"不支持的排名指标: {metric}，可选: {', '.join(self.METRICS)}")
+        return self.rankings[metric][:n]
+
+    def to_dict(self) -> Dict:
+        return {metric: [[node, score] for node, score in ranking] for metric, ranking in self.rankings.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "GraphRankings":
+        return cls({metric: [(node, score) for node, score in ranking] for metric, ranking in data.items()})
@@ -1,16 +1,24 @@
 import json
 import os
-import re
 from collections import defaultdict
 from dotenv import load_dotenv
-from pyvis.network import Network
+import numpy as np
 import networkx as nx
 import concurrent.futures
 
+from KnowledgeGraphManager.ChunkDiff import ChunkDiff
+from KnowledgeGraphManager.CompactGraph import CompactGraph
+from KnowledgeGraphManager.GraphDiff import GraphDiff
+from KnowledgeGraphManager.GraphLayout import GraphLayout
+from KnowledgeGraphManager.ProvenanceIndex import ProvenanceIndex
+
 load_dotenv(dotenv_path="./.env")
 prompt_vision = os.getenv("PROMPTVISION")
 
 class KgManager:
+    # 还原管理器状态需要的字段（排名只在查询侧使用，不在此加载）
+    STATE_FIELDS = ["kg_triplet", "bidirectional_mapping", "current_G", "Bolts", "provenance", "layout"]
+
     def __init__(self,agent,splitter,embedding_model,store):
         self.store = store
         # 大模型的对象
@@ -23,7 +31,7 @@ class KgManager:
         self.file = ""
         # 原始文件类型
         self.original_file_type = ""
-        # 当前 文本块bid-对应的关系的表
+        # 当前 文本块bid-对应的关系的表（按bid索引，见 kg_triplet 属性）
         self.kg_triplet = []
         # 当前 实体-实体标签映射表
         self.bidirectional_mapping = {
@@ -34,10 +42,33 @@ class KgManager:
         self.current_G = nx.DiGraph()
         # 当前 文本分块
         self.Bolts = []
-
+        # 文本分块的元数据（如Markdown标题路径） bid -> dict
+        self.bolt_metadata = {}
+        # 图谱来源索引 bid <-> 边 <-> 实体
+        self.provenance = ProvenanceIndex()
+        # 图谱布局 实体 -> (x, y)，保存时计算，增量更新只放置新节点
+        self.layout = {}
+
+
+    @property
+    def kg_triplet(self):
+        """文本块bid-对应的关系的表（列表形式，只在保存状态、重建来源索引时生成）"""
+        return list(self.triplet_index.values())
+
+    @kg_triplet.setter
+    def kg_triplet(self, items):
+        # bid -> {"bid", "relation"}，增量更新按bid直接增删与查找，不遍历整个文档的抽取结果
+        self.triplet_index = {}
+        for item in items or []:
+            existing = self.triplet_index.get(item['bid'])
+            if existing is None:
+                self.triplet_index[item['bid']] = item
+            else:
+                # 旧状态中同一块出现多次时合并其关系
+                self.triplet_index[item['bid']] = {**existing, 'relation': existing['relation'] + item['relation']}
 
     def form_default(self,filename):
-        default_data = self.store.load_state(filename)
+        default_data = self.store.load_state(filename, fields=self.STATE_FIELDS)
         if default_data:
             self.file = default_data['file']
             self.kg_triplet = default_data['kg_triplet']
@@ -45,6 +76,8 @@ class KgManager:
             self.current_G = default_data['current_G']
             self.Bolts = default_data['Bolts']
             self.original_file_type = default_data.get('original_file_type', '.txt')
+            self._load_provenance(default_data.get('provenance'))
+            self._load_layout(default_data.get('layout'))
         else:
             return None
 
@@ -79,7 +112,13 @@ class KgManager:
         documents = []
         embed = []
         ids = []
-        self.Bolts = self.splitter.split_text(text)
+        if hasattr(self.splitter, "split_text_with_metadata"):
+            chunks = self.splitter.split_text_with_metadata(text)
+            self.Bolts = [(bid, Bolt) for bid, Bolt, _ in chunks]
+            self.bolt_metadata = {bid: metadata for bid, _, metadata in chunks}
+        else:
+            self.Bolts = self.splitter.split_text(text)
+        self.Bolts = self._fit_llm_budget(self.Bolts)
         for bid, Bolt in self.Bolts:
             ids.append(bid)
             documents.append(Bolt)
@@ -87,6 +126,27 @@ class KgManager:
         return self.Bolts
 
 
+    # 超出大模型可用上下文（扣除关系抽取提示词）的块继续切分，避免请求被截断或失败
+    def _fit_llm_budget(self, bolts):
+        budget = getattr(self.store, "token_budget", None)
+        if budget is None:
+            return bolts
+        prompt = open(f"./prompt/{prompt_vision}/relationship_extraction2.txt", encoding='utf-8').read()
+        prompt_tokens = budget.count("llm", prompt)
+        limit = budget.consumer("llm").capacity - prompt_tokens
+        fitted = []
+        for bid, text in bolts:
+            if budget.count("llm", text) <= limit:
+                fitted.append((bid, text))
+                continue
+            print(f"文本块 {bid} 超出大模型可用上下文，继续切分")
+            pieces = budget.split_to_fit("llm", text, extra_reserved=prompt_tokens)
+            # 切分片段ID为 "{块ID}#p{序号}"，与检索子块的 "#c{序号}" 区分
+            fitted.extend((f"{bid}#p{i}", piece) for i, piece in enumerate(pieces, 1))
+            self.bolt_metadata.update({f"{bid}#p{i}": self.bolt_metadata[bid]
+                                       for i in range(1, len(pieces) + 1) if bid in self.bolt_metadata})
+        return fitted
+
     def 实体提取(self,input_parameter):
         entity_label = []
         prompt = open(f"./prompt/{prompt_vision}/entity_extraction2.txt", encoding='utf-8').read()
@@ -124,67 +184,20 @@ class KgManager:
 
     def 知识融合(self,relations):
         # 创建一个字典来存储实体对及其关系
-        entity_pairs = defaultdict(list)
-
-        # 收集所有具有相同实体的关系
-        for relation in relations:
-            for rel in relation['relation']:
-                source = rel['source']
-                target = rel['target']
-                # 使用排序后的实体对作为键，确保(source,target)和(target,source)被视为相同
-                entity_pair = tuple(sorted([source, target]))
-                entity_pairs[entity_pair].append({
-                    'bid': relation['bid'],
-                    'relation': rel
-                })
+        entity_pairs = self._group_by_entity_pair(relations)
 
         # 处理需要融合的关系
         merged_relations = []
         for entity_pair, rel_list in entity_pairs.items():
             if len(rel_list) > 1:  # 只处理有多个关系的实体对
-                print(entity_pair,"需要更新的",rel_list)
-                # 构建输入文本
-                input_text = f"实体1：{entity_pair[0]}\n实体2：{entity_pair[1]}\n"
-                input_text += "现有关系：\n"
-                for rel in rel_list:
-                    # 确保获取到的权重是浮点数
-                    try:
-                        weight = float(rel['relation'].get('weight', 0.5))
-                    except (ValueError, TypeError):
-                        weight = 0.5
-                    input_text += f"- {rel['relation']['relation']}（上下文：{rel['relation']['context']}，权重：{weight}）\n"
-
-                # 读取提示词模板
-                prompt = open(f"./prompt/{prompt_vision}/knowledge_fusion.txt", encoding='utf-8').read()
-                prompt = prompt.replace("{input_text}", input_text)
-                # print(input_text,"input_text")
-                # 使用Agent进行关系融合
-                merged_result = self.Agent.agent_safe_generate_response(prompt, input_text)
-                print(merged_result, "关系融合")
-
-                # 确保融合后的关系中包含权重
-                if isinstance(merged_result, dict):
-                    merged_result = []
-                else:
-                    for rel in merged_result.get('relations', []):
-                        if 'weight' not in rel:
-                            rel['weight'] = 0.5
-                        else:
-                            # 确保weight是浮点数
-                            try:
-                                rel['weight'] = float(rel['weight'])
-                            except (ValueError, TypeError):
-                                rel['weight'] = 0.5
+                merged = self._fuse_entity_pair(entity_pair, rel_list)
 
                 # 将融合后的关系添加到结果中
                 for rel in rel_list:
-                    if isinstance(rel, dict) and isinstance(merged_result, dict):
-                        merged_relations.append({
-                            'bid': rel['bid'],
-                            'relation': merged_result.get('relations', [])  # 使用完整的融合后关系列表
-                        })
-                    else:
-                        continue
+                    merged_relations.append({
+                        'bid': rel['bid'],
+                        'relation': merged  # 使用完整的融合后关系列表
+                    })
             else:
                 # 对于只有一个关系的实体对，直接保留原关系
                 merged_relations.append({
@@ -197,29 +210,69 @@ class KgManager:
         for relation in merged_relations:
             formatted_relation = {
                 'bid': relation['bid'],
-                'relation': []
+                'relation': self._valid_relations(relation['relation'])
             }
-            for rel in relation['relation']:
-                if isinstance(rel, dict) and all(k in rel for k in ['source', 'target', 'relation', 'context']):
-                    # 确保权重字段存在且为浮点数
-                    if 'weight' not in rel:
-                        rel['weight'] = 0.5
-                    else:
-                        try:
-                            rel['weight'] = float(rel['weight'])
-                        except (ValueError, TypeError):
-                            print(f"警告: 无法将权重 '{rel['weight']}' 转换为浮点数，使用默认值0.5")
-                            rel['weight'] = 0.5
-
-                    formatted_relation['relation'].append(rel)
-                    # print(f"添加关系: {rel['source']} -> {rel['target']}, 权重: {rel['weight']}")
-                else:
-                    print(f"警告：跳过格式不正确的关系: {rel}")
             if formatted_relation['relation']:  # 只添加有效的关系
                 formatted_relations.append(formatted_relation)
 
         return formatted_relations
 
+    # 按实体对收集关系，(source,target)与(target,source)视为同一实体对
+    def _group_by_entity_pair(self, relations):
+        entity_pairs = defaultdict(list)
+        for relation in relations:
+            for rel in relation['relation']:
+                # 使用排序后的实体对作为键，确保(source,target)和(target,source)被视为相同
+                entity_pair = tuple(sorted([rel['source'], rel['target']]))
+                entity_pairs[entity_pair].append({
+                    'bid': relation['bid'],
+                    'relation': rel
+                })
+        return entity_pairs
+
+    # 调用大模型融合同一实体对的多条关系，失败时返回空列表
+    def _fuse_entity_pair(self, entity_pair, rel_list):
+        print(entity_pair,"需要更新的",rel_list)
+        # 构建输入文本
+        input_text = f"实体1：{entity_pair[0]}\n实体2：{entity_pair[1]}\n"
+        input_text += "现有关系：\n"
+        for rel in rel_list:
+            # 确保获取到的权重是浮点数
+            try:
+                weight = float(rel['relation'].get('weight', 0.5))
+            except (ValueError, TypeError):
+                weight = 0.5
+            input_text += f"- {rel['relation']['relation']}（上下文：{rel['relation']['context']}，权重：{weight}）\n"
+
+        # 读取提示词模板
+        prompt = open(f"./prompt/{prompt_vision}/knowledge_fusion.txt", encoding='utf-8').read()
+        prompt = prompt.replace("{input_text}", input_text)
+        # 使用Agent进行关系融合
+        merged_result = self.Agent.agent_safe_generate_response(prompt, input_text)
+        print(merged_result, "关系融合")
+
+        if not isinstance(merged_result, dict):
+            return []
+        return merged_result.get('relations', [])
+
+    # 过滤格式不正确的关系，并确保权重字段存在且为浮点数
+    def _valid_relations(self, relations):
+        valid = []
+        for rel in relations:
+            if isinstance(rel, dict) and all(k in rel for k in ['source', 'target', 'relation', 'context']):
+                if 'weight' not in rel:
+                    rel['weight'] = 0.5
+                else:
+                    try:
+                        rel['weight'] = float(rel['weight'])
+                    except (ValueError, TypeError):
+                        print(f"警告: 无法将权重 '{rel['weight']}' 转换为浮点数，使用默认值0.5")
+                        rel['weight'] = 0.5
+                valid.append(rel)
+            else:
+                print(f"警告：跳过格式不正确的关系: {rel}")
+        return valid
+
     # 输入处理好的分割文本，输出bid与实体-关系三元集合
     def 知识图谱的构建(self, text=None):
         if type(text) == str:
@@ -228,557 +281,223 @@ class KgManager:
             self.Bolts = text
         elif text is None:
             pass
-        kg_triplet = []
+        kg_triplet, entity_labels = self._extract_blocks(self.Bolts)
+        self.bidirectional_mapping = self._build_bidirectional_mapping(entity_labels)
+        self.kg_triplet = kg_triplet
+        # print(kg_triplet)
+        return kg_triplet
+
+    # 对给定文本块做实体与关系抽取，返回 (bid与关系列表, 实体-标签列表)，不修改当前状态
+    def _extract_blocks(self, bolts):
+        num_blocks = len(bolts)
+        if num_blocks == 0:
+            return [], []
         entity_labels = []
-        num_blocks = len(self.Bolts)
         # 用于存储每个块的实体识别结果
         entity_futures = [None] * num_blocks
         relation_futures = [None] * num_blocks
         results = [None] * num_blocks
         with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
             # 1. 先提交第一个块的实体提取
-            entity_futures[0] = executor.submit(self.实体提取, self.Bolts[0][1])
+            entity_futures[0] = executor.submit(self.实体提取, bolts[0][1])
             for i in range(num_blocks):
                 # 等待当前块实体提取完成
                 entity_label = entity_futures[i].result()
                 entity_labels += entity_label
                 entity = [e[0] for e in entity_label]
                 # 立即提交当前块的关系提取
-                relation_futures[i] = executor.submit(self.关系提取, self.Bolts[i][1], entity)
+                relation_futures[i] = executor.submit(self.关系提取, bolts[i][1], entity)
                 # 如果还有下一个块，提前提交下一个块的实体提取
                 if i + 1 < num_blocks:
-                    entity_futures[i + 1] = executor.submit(self.实体提取, self.Bolts[i + 1][1])
+                    entity_futures[i + 1] = executor.submit(self.实体提取, bolts[i + 1][1])
                 # 等待当前块关系提取完成
                 relation = relation_futures[i].result()
-                results[i] = {"bid": self.Bolts[i][0], "relation": relation}
-        kg_triplet = results
-        self.bidirectional_mapping = self._build_bidirectional_mapping(entity_labels)
-        self.kg_triplet = kg_triplet
-        # print(kg_triplet)
-        return kg_triplet
-
-
+                results[i] = {"bid": bolts[i][0], "relation": relation}
+        return results, entity_labels
 
     def 三元组转有向图nx(self,relations):
-        knowledge_graph = self.bidirectional_mapping
-        self.current_G = nx.DiGraph()
+        # 批量构建紧凑图谱，只保留语义属性（样式由前端查看器生成）
+        compact = CompactGraph.from_relations(relations, self.bidirectional_mapping["entity_to_label"])
+        self.current_G = compact.to_networkx()
+        self.provenance = ProvenanceIndex()
         for relation in relations:
             for rel in relation['relation']:
-                source = rel['source']
-                target = rel['target']
-                context = rel['context']
-                relation_text = rel['relation']
-                # 获取权重，确保是浮点数
-                try:
-                    weight = float(rel.get('weight', 0.5))
-                except (ValueError, TypeError):
-                    print(f"警告: 无法转换权重值 '{rel.get('weight')}' 为浮点数，使用默认值0.5")
-                    weight = 0.5
-
-                # print(f"添加边 {source} -> {target} 权重: {weight}")
-
-                # 添加节点
-                self.current_G.add_node(source,
-                                        title=self.get_entity_label(knowledge_graph, source),
-                                        group=self.get_entity_label(knowledge_graph, source))
-                self.current_G.add_node(target,
-                                        title=self.get_entity_label(knowledge_graph, target),
-                                        group=self.get_entity_label(knowledge_graph, target))
-
-                # 添加边（初始状态）
-                self.current_G.add_edge(source, target,
-                                        title=context,
-                                        label=relation_text,
-                                        weight=weight,  # 添加权重
-                                        font={"size": 0},  # 初始标签隐藏
-                                        color='#97c2fc',
-                                        width=1 + weight * 3,  # 根据权重调整边的粗细
-                                        hoverWidth=3 + weight * 2,
-                                        chosen={  # 点击选中样式
-                                            "edge": {
-                                                "color": "#00FF00",
-                                                "width": 4
-                                            }
-                                        })
+                self.provenance.add(rel['source'], rel['target'], [relation['bid']])
         return self.current_G
 
+    # 向当前图谱添加一条关系边，并在来源索引中记录产生该边的文本块（边已存在时覆盖属性、合并来源）
+    def _add_relation_edge(self, rel, bids):
+        source = rel['source']
+        target = rel['target']
+        # 获取权重，确保是浮点数
+        try:
+            weight = float(rel.get('weight', 0.5))
+        except (ValueError, TypeError):
+            print(f"警告: 无法转换权重值 '{rel.get('weight')}' 为浮点数，使用默认值0.5")
+            weight = 0.5
+
+        for node in (source, target):
+            if node not in self.current_G:
+                self.current_G.add_node(node, group=self.get_entity_label(self.bidirectional_mapping, node))
+        self.current_G.add_edge(source, target, title=rel['context'], label=rel['relation'], weight=weight)
+        self.provenance.add(source, target, bids)
+
     # 增量更新找到要处理的块
     def _replace_blocks_and_find_changes(self, original_blocks, new_text, split_text_fun):
-        def normalize_text(text):
-            """去除首尾空格、合并多余空格、换行转换为空格"""
-            return re.sub(r'\s+', ' ', text.strip())
-
-        """用原文块替换未变部分，找出新增和删除的块"""
-        normalized_new_text = normalize_text(new_text)  # 归一化新文本
-        replaced_text = normalized_new_text  # 复制新文本
-        matched_blocks = set()  # 记录匹配的块文本
-
-        # **第一步**：替换未变的部分
-        for bid, text in original_blocks:
-            norm_text = normalize_text(text)
-            if norm_text in replaced_text:
-                replaced_text = replaced_text.replace(norm_text, bid, 1)
-                matched_blocks.add(norm_text)
-
-        # **第二步**：计算删除的块（原文本中未出现在新文本中的部分）
-        deleted_blocks = [(bid, text) for bid, text in original_blocks if
-                          normalize_text(text) not in normalized_new_text]
-
-        # **第三步**：用 `block_id` 作为分隔符，分割出变动部分
-        split_pattern = '|'.join(re.escape(bid) for bid, _ in original_blocks)
-        unmatched_parts = re.split(split_pattern, replaced_text)  # 只保留变动部分
-        unmatched_parts = [normalize_text(part) for part in unmatched_parts if part.strip()]  # 清理空格
-
-        # **第四步**：用你的 `split_text()` 切割新增内容
-        added_texts = []
-        for part in unmatched_parts:
-            added_texts.extend([t for t in split_text_fun(part) if t])
-
-        # **第五步**：分配新增块 ID
-        added_blocks = [text for i, text in enumerate(added_texts)]
-
-        return replaced_text, deleted_blocks, added_blocks
+        """定位新文本中未变的旧块，找出新增和删除的块"""
+        return ChunkDiff().diff(original_blocks, new_text, split_text_fun)
 
     def 增量更新(self, new_text:str):
-        replaced_new_text, deleted_blocks, added_blocks = self._replace_blocks_and_find_changes(
-            self.Bolts,
-            new_text,
-            self.splitter.split_text)
+        """
+        比较新文本与当前文本块，只对新增块做抽取，并把变化应用到当前图谱
 
-        bids_to_remove = []
+        返回:
+            {"added_bolts": [(bid, text)], "removed_bids": [bid], "affected_pairs": [(实体1, 实体2)]}
+        """
+        split_fun = getattr(self.splitter, "split_text_with_metadata", self.splitter.split_text)
+        changes = self._replace_blocks_and_find_changes(self.Bolts, new_text, split_fun)
 
         # 被删除的块
-        for bid, text in deleted_blocks:
-            bids_to_remove.append(bid)
-
-        filtered_data = [item for item in self.kg_triplet if item['bid'] not in bids_to_remove]
-
-        # 只有在有需要删除的ID时才执行删除操作
-        if bids_to_remove:
-            self.store.vector_collection.delete(
-                where={"file": self.file},
-                ids=bids_to_remove
-            )
-
-        add_data = []
-
-        # 新增的块
-        for bid, text in added_blocks:
-            add_data.append((bid, text))
-        print(f"增量更新：\n 新增的块：{add_data},\n  被删除的块：{bids_to_remove}")
-        self.kg_triplet = self.知识图谱的构建(add_data)
-        new_kg_triplet = self.kg_triplet + filtered_data
-
-        return new_kg_triplet
-
-
-    # 绘制图谱保存为html并且返回network的nx.DiGraph()有向图对象
-    def 绘制知识图谱(self, name):
-        self.file = name
-        # 使用pyvis可视化
-        net = Network(notebook=True, height="750px", width="100%",
-                      bgcolor="#ffffff", font_color="black", directed=True)
-
-        # 配置选项
-        options = {
-            "edges": {
-                "font": {
-                    "size": 0,
-                    "face": "arial",
-                    "align": "middle"
-                },
-                "color": {
-                    "inherit": False,
-                    "highlight": "#FFA500",
-                    "hover": "#FFA500"
-                },
-                "selectionWidth": 1.5,
-                "smooth": {"type": "continuous"},
-                "scaling": {
-                    "min": 1,
-                    "max": 10,
-                    "label": {
-                        "enabled": True,
-                        "min": 14,
-                        "max": 30
-                    }
-                }
-            },
-            "interaction": {
-                "hover": True,
-                "tooltipDelay": 150,
-                "hideEdgesOnDrag": False,
-                "multiselect": True  # 允许多选
-            },
-            "physics": {
-                "stabilization": {
-                    "enabled": True,
-                    "iterations": 1000,
-                    "updateInterval": 100
-                }
-            }
+        bids_to_remove = {bid for bid, _ in changes["removed"]}
+
+        # 新增的块（超出大模型上下文的继续切分）
+        self.bolt_metadata = {bid: metadata for bid, metadata in self.bolt_metadata.items()
+                              if bid not in bids_to_remove}
+        self.bolt_metadata.update(changes["metadata"])
+        fitted = {bid: self._fit_llm_budget([(bid, text)]) for bid, text in changes["added"]}
+        add_data = [block for bid, _ in changes["added"] for block in fitted[bid]]
+
+        # 当前文本块 = 保留的旧块 + 新增的块（按新文本顺序）
+        self.Bolts = [block for bid, text in changes["blocks"] for block in fitted.get(bid, [(bid, text)])]
+
+        print(f"增量更新：\n 新增的块：{add_data},\n  被删除的块：{list(bids_to_remove)}")
+        added_triplets, entity_labels = self._extract_blocks(add_data)
+        affected_pairs = self.apply_delta(bids_to_remove, added_triplets, entity_labels)
+
+        return {
+            "added_bolts": add_data,
+            "removed_bids": sorted(bids_to_remove),
+            "affected_pairs": affected_pairs
         }
-        net.set_options(json.dumps(options, indent=2))
-
-        # 手动添加节点和边，确保权重正确应用
-        for node, attr in self.current_G.nodes(data=True):
-            net.add_node(node, title=attr.get('title', ''), group=attr.get('group', ''))
-
-        # 添加所有边，确保权重被正确应用
-        for source, target, attr in self.current_G.edges(data=True):
-            weight = attr.get('weight', 0.5)
-            # print(f"添加边到pyvis: {source} -> {target}, 权重: {weight}")
-            # 计算基于权重的宽度
-            width = 1 + weight * 4
-            net.add_edge(
-                source=source,
-                to=target,
-                title=attr.get('title', ''),
-                label=attr.get('label', ''),
-                weight=weight,
-                width=width,  # 显式设置宽度
-                font={"size": 0},
-                color='#97c2fc',
-                hoverWidth=3 + weight * 2
-            )
-
-        # 生成HTML文件
-        html_file = f"{name}.html"
-        net.show(html_file)
-
-        # 增强交互功能
-        with open(html_file, "r+", encoding="utf-8") as f:
-            content = f.read()
-
-            js_injection = """
-              <style>
-                  .control-panel {
-                      position: absolute;
-                      top: 10px;
-                      right: 10px;
-                      z-index: 1000;
-                      background: rgba(255,255,255,0.9);
-                      padding: 10px;
-                      border-radius: 5px;
-                      box-shadow: 0 2px 10px rgba(0,0,0,0.2);
-                  }
-                  .search-panel {
-                      position: absolute;
-                      top: 10px;
-                      left: 10px;
-                      z-index: 1000;
-                      background: rgba(255,255,255,0.9);
-                      padding: 10px;
-                      border-radius: 5px;
-                      box-shadow: 0 2px 10px rgba(0,0,0,0.2);
-                      width: 300px;
-                  }
-                  .search-input {
-                      width: 100%;
-                      padding: 8px;
-                      margin: 5px 0;
-                      border: 1px solid #ddd;
-                      border-radius: 4px;
-                      box-sizing: border-box;
-                  }
-                  .search-results {
-                      max-height: 200px;
-                      overflow-y: auto;
-                      margin-top: 10px;
-                      border: 1px solid #ddd;
-                      border-radius: 4px;
-                      background: white;
-                  }
-                  .search-result-item {
-                      padding: 8px;
-                      cursor: pointer;
-                      border-bottom: 1px solid #eee;
-                  }
-                  .search-result-item:hover {
-                      background: #f5f5f5;
-                  }
-                  .control-btn {
-                      padding: 8px 12px;
-                      margin: 5px;
-                      border: none;
-                      border-radius: 4px;
-                      cursor: pointer;
-                      font-size: 14px;
-                      transition: all 0.3s;
-                  }
-                  .control-btn:hover {
-                      transform: translateY(-2px);
-                      box-shadow: 0 2px 5px rgba(0,0,0,0.2);
-                  }
-                  #showAllBtn {
-                      background-color: #4CAF50;
-                      color: white;
-                  }
-                  #hideAllBtn {
-                      background-color: #f44336;
-                      color: white;
-                  }
-                  #toggleBtn {
-                      background-color: #2196F3;
-                      color: white;
-                  }
-                  #resetBtn {
-                      background-color: #9E9E9E;
-                      color: white;
-                  }
-                  .status-indicator {
-                      margin-top: 10px;
-                      font-size: 12px;
-                      color: #555;
-                  }
-              </style>
-
-              <script>
-              // 全局状态管理
-              const edgeStates = {};
-              let globalHideMode = true;
-              let searchTimeout = null;
-
-              document.addEventListener("DOMContentLoaded", function() {
-                  // 初始化所有边状态
-                  network.body.data.edges.get().forEach(edge => {
-                      edgeStates[edge.id] = {
-                          clicked: false,
-                          labelVisible: false
-                      };
-                  });
-
-                  // 创建控制面板
-                  const container = document.getElementById("mynetwork");
-                  
-                  // 创建搜索面板
-                  const searchPanel = document.createElement("div");
-                  searchPanel.className = "search-panel";
-                  searchPanel.innerHTML = `
-                      <input type="text" id="searchInput" class="search-input" placeholder="搜索实体或关系...">
-                      <div class="search-results" id="searchResults"></div>
-                  `;
-                  container.parentNode.insertBefore(searchPanel, container);
-
-                  // 创建控制面板
-                  const panel = document.createElement("div");
-                  panel.className = "control-panel";
-                  panel.innerHTML = `
-                      <button id="showAllBtn" class="control-btn">显示所有标签</button>
-                      <button id="hideAllBtn" class="control-btn">隐藏未点击标签</button>
-                      <button id="toggleBtn" class="control-btn">切换显示状态</button>
-                      <button id="resetBtn" class="control-btn">重置所有状态</button>
-                      <div class="status-indicator">已复习: <span id="counter">0</span>/${network.body.data.edges.get().length}</div>
-                  `;
-                  container.parentNode.insertBefore(panel, container);
-
-                  // 搜索功能
-                  const searchInput = document.getElementById("searchInput");
-                  const searchResults = document.getElementById("searchResults");
-
-                  searchInput.addEventListener("input", function() {
-                      clearTimeout(searchTimeout);
-                      searchTimeout = setTimeout(() => {
-                          const searchTerm = this.value.toLowerCase();
-                          if (searchTerm.length < 2) {
-                              searchResults.innerHTML = "";
-                              return;
-                          }
-
-                          const results = [];
-                          // 搜索节点
-                          network.body.data.nodes.get().forEach(node => {
-                              if (node.label.toLowerCase().includes(searchTerm)) {
-                                  results.push({
-                                      type: "node",
-                                      id: node.id,
-                                      label: node.label
-                                  });
-                              }
-                          });
-
-                          // 搜索边
-                          network.body.data.edges.get().forEach(edge => {
-                              if (edge.label && edge.label.toLowerCase().includes(searchTerm)) {
-                                  results.push({
-                                      type: "edge",
-                                      id: edge.id,
-                                      label: edge.label
-                                  });
-                              }
-                          });
-
-                          // 显示结果
-                          searchResults.innerHTML = results.map(result => `
-                              <div class="search-result-item" data-type="${result.type}" data-id="${result.id}">
-                                  ${result.type === "node" ? "节点" : "关系"}: ${result.label}
-                              </div>
-                          `).join("");
-
-                          // 添加点击事件
-                          searchResults.querySelectorAll(".search-result-item").forEach(item => {
-                              item.addEventListener("click", function() {
-                                  const type = this.dataset.type;
-                                  const id = this.dataset.id;
-                                  
-                                  if (type === "node") {
-                                      // 高亮节点
-                                      network.selectNodes([id]);
-                                      network.focus(id, {
-                                          scale: 1.5,
-                                          animation: true
-                                      });
-                                  } else {
-                                      // 高亮边
-                                      network.selectEdges([id]);
-                                      const edge = network.body.data.edges.get(id);
-                                      network.focus({
-                                          nodes: [edge.from, edge.to],
-                                          scale: 1.5,
-                                          animation: true
-                                      });
-                                  }
-                              });
-                          });
-                      }, 300);
-                  });
-
-                  // 更新计数器
-                  function updateCounter() {
-                      const count = Object.values(edgeStates).filter(s => s.clicked).length;
-                      document.getElementById("counter").innerText = count;
-                  }
-
-                  // 显示所有标签
-                  document.getElementById("showAllBtn").onclick = function() {
-                      network.body.data.edges.get().forEach(edge => {
-                          edge.font = {size: 14};
-                          edge.color = {color: "#97c2fc"};
-                          network.body.data.edges.update(edge);
-                          edgeStates[edge.id].labelVisible = true;
-                      });
-                      globalHideMode = false;
-                      updateCounter();
-                  };
-
-                  // 隐藏未点击标签
-                  document.getElementById("hideAllBtn").onclick = function() {
-                      network.body.data.edges.get().forEach(edge => {
-                          if (!edgeStates[edge.id].clicked) {
-                              edge.font = {size: 0};
-                              edge.color = {color: "#97c2fc"};
-                              network.body.data.edges.update(edge);
-                              edgeStates[edge.id].labelVisible = false;
-                          }
-                      });
-                      globalHideMode = true;
-                      updateCounter();
-                  };
-
-                  // 切换显示状态
-                  document.getElementById("toggleBtn").onclick = function() {
-                      globalHideMode = !globalHideMode;
-                      network.body.data.edges.get().forEach(edge => {
-                          edge.font = {size: globalHideMode && !edgeStates[edge.id].clicked ? 0 : 14};
-                          network.body.data.edges.update(edge);
-                          edgeStates[edge.id].labelVisible = !globalHideMode || edgeStates[edge.id].clicked;
-                      });
-                      updateCounter();
-                  };
-
-                  // 重置所有状态
-                  document.getElementById("resetBtn").onclick = function() {
-                      network.body.data.edges.get().forEach(edge => {
-                          edge.font = {size: 0};
-                          edge.color = {color: "#97c2fc"};
-                          network.body.data.edges.update(edge);
-                          edgeStates[edge.id] = {
-                              clicked: false,
-                              labelVisible: false
-                          };
-                      });
-                      globalHideMode = true;
-                      updateCounter();
-                  };
-
-                  // 点击边持久化显示
-                  network.on("selectEdge", function(params) {
-                      const edge = network.body.data.edges.get(params.edges[0]);
-                      edgeStates[edge.id].clicked = true;
-                      edge.font = {size: 14};
-                      edge.color = {color: "#00FF00", highlight: "#00FF00"};
-                      network.body.data.edges.update(edge);
-                      updateCounter();
-                  });
-
-                  // 悬停边时高亮并显示权重信息
-                  network.on("hoverEdge", function(params) {
-                      const edge = network.body.data.edges.get(params.edge);
-                      if (!edgeStates[edge.id].clicked) {
-                          edge.color = {color: "#FFA500", highlight: "#FFA500"};
-                          network.body.data.edges.update(edge);
-                      }
-                      
-                      // 创建权重提示框
-                      let title = edge.title || '';
-                      let label = edge.label || '';
-                      let weight = edge.weight || 0.5;
-                      
-                      // 创建或更新悬停提示
-                      let tooltip = document.getElementById('edge-tooltip');
-                      if (!tooltip) {
-                          tooltip = document.createElement('div');
-                          tooltip.id = 'edge-tooltip';
-                          tooltip.style.position = 'absolute';
-                          tooltip.style.backgroundColor = 'rgba(0,0,0,0.7)';
-                          tooltip.style.color = 'white';
-                          tooltip.style.padding = '8px';
-                          tooltip.style.borderRadius = '4px';
-                          tooltip.style.zIndex = '1000';
-                          tooltip.style.maxWidth = '300px';
-                          document.body.appendChild(tooltip);
-                      }
-                      
-                      // 设置提示内容
-                      tooltip.innerHTML = `
-                          <div><strong>关系:</strong> ${label}</div>
-                          <div><strong>上下文:</strong> ${title}</div>
-                          <div><strong>权重:</strong> ${weight.toFixed(2)}</div>
-                      `;
-                      
-                      // 定位提示框
-                      tooltip.style.left = (event.clientX + 10) + 'px';
-                      tooltip.style.top = (event.clientY + 10) + 'px';
-                      tooltip.style.display = 'block';
-                  });
-
-                  // 移出边时恢复
-                  network.on("blurEdge", function(params) {
-                      const edge = network.body.data.edges.get(params.edge);
-                      if (!edgeStates[edge.id].clicked) {
-                          edge.color = {color: "#97c2fc", highlight: "#97c2fc"};
-                          network.body.data.edges.update(edge);
-                      }
-                      
-                      // 隐藏提示框
-                      const tooltip = document.getElementById('edge-tooltip');
-                      if (tooltip) {
-                          tooltip.style.display = 'none';
-                      }
-                  });
-
-                  updateCounter();
-              });
-              </script>
-              """
-            content = content.replace("</body>", js_injection + "</body>")
-            content = content.replace(f' <script src="lib/bindings/utils.js"></script>','')
-            f.seek(0)
-            f.write(content)
-            f.truncate()
-
-        print(f"知识图谱已生成，保存为 {html_file}")
-        return self.current_G
+
+    def apply_delta(self, removed_bids, added_triplets, entity_labels=None):
+        """
+        把文本块的增删应用到当前图谱，只处理受影响的实体对
+
+        1. 删除只由被删除块产生的边，以及因此孤立的节点
+        2. 加入新增块的关系，合并实体-标签映射
+        3. 受影响的实体对若仍有多条来源关系，只对这些实体对重新做知识融合
+
+        参数:
+            removed_bids: 被删除的文本块ID
+            added_triplets: 新增块的抽取结果 [{"bid": ..., "relation": [...]}]
+            entity_labels: 新增块的实体-标签列表
+
+        返回:
+            受影响的实体对列表
+        """
+        removed_bids = set(removed_bids)
+
+        # 合并实体-标签映射（已有实体保留原标签）
+        for entity, label in entity_labels or []:
+            if entity not in self.bidirectional_mapping["entity_to_label"]:
+                self.bidirectional_mapping["entity_to_label"][entity] = label
+                self.bidirectional_mapping["label_to_entities"].setdefault(label, []).append(entity)
+
+        # 受影响的实体对 -> 仍然有效的来源文本块（通过来源索引只访问受影响的边）
+        affected = defaultdict(set)
+        for source, target in self.provenance.edges_of_bids(removed_bids):
+            affected[tuple(sorted([source, target]))] |= self.provenance.bids_of_edge(source, target) - removed_bids
+        for triplet in added_triplets:
+            for rel in triplet['relation']:
+                pair = tuple(sorted([rel['source'], rel['target']]))
+                affected[pair].add(triplet['bid'])
+                for source, target in (pair, pair[::-1]):
+                    affected[pair] |= self.provenance.bids_of_edge(source, target) - removed_bids
+
+        for bid in removed_bids:
+            self.triplet_index.pop(bid, None)
+        for item in added_triplets:
+            if item['relation']:
+                self.triplet_index[item['bid']] = item
+
+        for pair, bids in affected.items():
+            for source, target in (pair, pair[::-1]):
+                if self.current_G.has_edge(source, target):
+                    self.current_G.remove_edge(source, target)
+                self.provenance.remove_edge(source, target)
+
+            rel_list = [{'bid': bid, 'relation': rel}
+                        for bid in sorted(bids) if bid in self.triplet_index
+                        for rel in self.triplet_index[bid]['relation']
+                        if tuple(sorted([rel['source'], rel['target']])) == pair]
+            if not rel_list:
+                continue
+            relations = [item['relation'] for item in rel_list]
+            if len(rel_list) > 1:
+                merged = [rel for rel in self._valid_relations(self._fuse_entity_pair(pair, rel_list))
+                          if tuple(sorted([rel['source'], rel['target']])) == pair]
+                relations = merged or relations
+            contributing = [item['bid'] for item in rel_list]
+            for rel in self._valid_relations(relations):
+                self._add_relation_edge(rel, contributing)
+
+        # 删除孤立节点及其实体-标签映射
+        endpoints = {entity for pair in affected for entity in pair}
+        isolated = [node for node in endpoints if node in self.current_G and self.current_G.degree(node) == 0]
+        self.current_G.remove_nodes_from(isolated)
+        for entity in isolated:
+            label = self.bidirectional_mapping["entity_to_label"].pop(entity, None)
+            entities = self.bidirectional_mapping["label_to_entities"].get(label)
+            if entities and entity in entities:
+                entities.remove(entity)
+                if not entities:
+                    self.bidirectional_mapping["label_to_entities"].pop(label)
+
+        return list(affected)
+
+    # 加载来源索引，旧版本保存的状态没有索引时按图谱与kg_triplet重建
+    def _load_provenance(self, data):
+        if data:
+            self.provenance = ProvenanceIndex.from_dict(data)
+        else:
+            self.provenance = ProvenanceIndex.rebuild(self.current_G, self.kg_triplet)
+
+
+    def _load_layout(self, data):
+        """布局按图谱节点顺序保存 {"x": [...], "y": [...]}，与图谱不一致（旧状态）时重新计算"""
+        nodes = list(self.current_G.nodes)
+        if data and len(data["x"]) == len(nodes):
+            self.layout = dict(zip(nodes, zip(data["x"], data["y"])))
+        else:
+            self.layout = {}
+
+    def update_layout(self):
+        """
+        更新图谱布局：首次保存时计算全部节点，之后已有节点保持不动，只放置新节点
+
+        返回:
+            新放置的节点数
+        """
+        nodes = list(self.current_G.nodes)
+        index = {node: i for i, node in enumerate(nodes)}
+        positions = np.zeros((len(nodes), 2))
+        known = np.zeros(len(nodes), dtype=bool)
+        for i, node in enumerate(nodes):
+            if node in self.layout:
+                positions[i] = self.layout[node]
+                known[i] = True
+
+        if not known.all():
+            edges = list(self.current_G.edges(data='weight', default=0.5))
+            src = np.fromiter((index[u] for u, _, _ in edges), dtype=np.int64, count=len(edges))
+            dst = np.fromiter((index[v] for _, v, _ in edges), dtype=np.int64, count=len(edges))
+            weight = np.fromiter((w for _, _, w in edges), dtype=np.float64, count=len(edges))
+            positions = GraphLayout.place_new_nodes(len(nodes), src, dst, weight, positions, known)
+
+        # 被删除的节点随之移出布局
+        self.layout = {node: (float(x), float(y)) for node, (x, y) in zip(nodes, positions.tolist())}
+        return int((~known).sum())
 
     # 获取提问的实体（存在与知识图谱的）
     def text2entity(self, text):
@@ -789,90 +508,38 @@ class KgManager:
         return output['entities']
 
     # 对比两个有向图对象的差异
-    def compare_and_visualize(self, G2, output_file="diff_graph"):
-        G1 = self.current_G.to_undirected()
-        """比较两个有向图并用pyvis高亮差异"""
-        # 创建合并图（包含G1和G2的所有节点和边）
-        G_diff = nx.DiGraph()
-
-        # 记录差异
-        diff = {
-            "added_nodes": set(G2.nodes()) - set(G1.nodes()),
-            "removed_nodes": set(G1.nodes()) - set(G2.nodes()),
-            "added_edges": set(G2.edges()) - set(G1.edges()),
-            "removed_edges": set(G1.edges()) - set(G2.edges()),
-            "node_attr_changes": {},
-            "edge_attr_changes": {}
-        }
-
-        # 检查节点属性变化
-        common_nodes = set(G1.nodes()) & set(G2.nodes())
-        for node in common_nodes:
-            if G1.nodes[node] != G2.nodes[node]:
-                diff["node_attr_changes"][node] = {
-                    "old": G1.nodes[node],
-                    "new": G2.nodes[node]
-                }
-
-        # 检查边属性变化
-        common_edges = set(G1.edges()) & set(G2.edges())
-        for u, v in common_edges:
-            if G1.edges[u, v] != G2.edges[u, v]:
-                diff["edge_attr_changes"][(u, v)] = {
-                    "old": G1.edges[u, v],
-                    "new": G2.edges[u, v]
-                }
-
-        # 将差异信息添加到图
-        for node in G1.nodes() | G2.nodes():
-            G_diff.add_node(node)
-
-            # 设置节点颜色和标题（悬停显示详情）
-            if node in diff["added_nodes"]:
-                G_diff.nodes[node]["color"] = "green"
-                G_diff.nodes[node]["title"] = f"新增节点: {node}"
-            elif node in diff["removed_nodes"]:
-                G_diff.nodes[node]["color"] = "red"
-                G_diff.nodes[node]["title"] = f"删除节点: {node}"
-            elif node in diff["node_attr_changes"]:
-                G_diff.nodes[node]["color"] = "yellow"
-                changes = diff["node_attr_changes"][node]
-                G_diff.nodes[node]["title"] = (
-                    f"节点属性修改: {node}\n"
-                    f"旧值: {changes['old']}\n"
-                    f"新值: {changes['new']}"
-                )
-            else:
-                G_diff.nodes[node]["color"] = "skyblue"
-
-        for u, v in G1.edges() | G2.edges():
-            if (u, v) in diff["added_edges"]:
-                G_diff.add_edge(u, v, color="green", title=f"新增边: ({u}→{v})")
-            elif (u, v) in diff["removed_edges"]:
-                G_diff.add_edge(u, v, color="red", title=f"删除边: ({u}→{v})")
-            elif (u, v) in diff["edge_attr_changes"]:
-                changes = diff["edge_attr_changes"][(u, v)]
-                G_diff.add_edge(u, v, color="yellow",
-                                title=f"边属性修改: ({u}→{v})\n旧值: {changes['old']}\n新值: {changes['new']}")
-            else:
-                G_diff.add_edge(u, v, color="gray")
-
-        # 用pyvis绘制动态图
-        nt = Network(height="900px", width="100%", notebook=True)
-        nt.from_nx(G_diff)
-
-        # 保存并显示
-        nt.show(f"{output_file}.html")
+    def compare_and_visualize(self, G2, output_file=None):
+        """
+        比较当前图谱与另一个有向图，返回结构化差异（GraphDiff），不再生成pyvis页面
+
+        参数:
+            G2: 对比的有向图（视为新版本）
+            output_file: 提供时同时把差异写入 {output_file}.json
+        返回:
+            {"summary", "nodes", "edges"}，节点与边带 added/removed/changed/unchanged 状态
+        """
+        diff = GraphDiff.between(CompactGraph.from_networkx(self.current_G), CompactGraph.from_networkx(G2))
+        if output_file:
+            with open(f"{output_file}.json", "w", encoding="utf-8") as f:
+                json.dump(diff, f, ensure_ascii=False)
+        return diff
 
     def save_store(self):
         """将当前状态保存到存储"""
         if self.store:
+            self.update_layout()
             self.store.save_state(self)
 
+    def save_delta(self, added_bolts, removed_bids):
+        """只保存增量更新中变化的文本块向量，并更新图谱状态（布局只放置新节点）"""
+        if self.store:
+            self.update_layout()
+            self.store.save_delta(self, added_bolts, removed_bids)
+
     def load_store(self, filename):
         """从存储加载指定文件名的状态"""
         if self.store:
-            state = self.store.load_state(filename)
+            state = self.store.load_state(filename, fields=self.STATE_FIELDS)
             if state:
                 self.file = state["file"]
                 self.kg_triplet = state["kg_triplet"]
@@ -880,6 +547,8 @@ class KgManager:
                 self.current_G = state["current_G"]
                 self.Bolts = state["Bolts"]
                 self.original_file_type = state.get('original_file_type', '.txt')
+                self._load_provenance(state.get("provenance"))
+                self._load_layout(state.get("layout"))
                 return True
         return False
 
@@ -887,8 +556,8 @@ class KgManager:
         return self.store.delete_states(filenames)
 
 
-    def list_files(self):
-        return self.store.list_files()
+    def list_files(self, offset=0, limit=None):
+        return self.store.list_files(offset, limit)
 
 
     def select_vectors(self,query,n_results):
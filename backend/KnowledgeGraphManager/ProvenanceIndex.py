@@ -0,0 +1,95 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+Edge = Tuple[str, str]
+
+
+class ProvenanceIndex:
+    """
+    图谱元素来源索引（文本块 <-> 边 <-> 实体）
+
+    功能特点：
+    1. bid -> 边、边 -> bid、实体 -> bid 三个方向都可直接查询
+    2. 删除文本块时只访问该块产生的边，不再扫描 kg_triplet 和整张图
+    3. 只持久化边 -> bid，其余两个方向加载时重建
+    """
+
+    def __init__(self):
+        self.edge_to_bids: Dict[Edge, Set[str]] = {}
+        self.bid_to_edges: Dict[str, Set[Edge]] = defaultdict(set)
+        # 实体 -> {bid: 该bid产生的、与该实体相连的边数}
+        self._entity_bid_counts: Dict[str, Counter] = defaultdict(Counter)
+
+    def add(self, source: str, target: str, bids: Iterable[str]):
+        """记录边的来源文本块（与已有来源合并）"""
+        edge = (source, target)
+        known = self.edge_to_bids.setdefault(edge, set())
+        for bid in set(bids) - known:
+            known.add(bid)
+            self.bid_to_edges[bid].add(edge)
+            self._entity_bid_counts[source][bid] += 1
+            self._entity_bid_counts[target][bid] += 1
+
+    def remove_edge(self, source: str, target: str) -> Set[str]:
+        """删除边的全部来源记录，返回该边原来的来源文本块"""
+        edge = (source, target)
+        bids = self.edge_to_bids.pop(edge, set())
+        for bid in bids:
+            edges = self.bid_to_edges.get(bid)
+            if edges is not None:
+                edges.discard(edge)
+                if not edges:
+                    del self.bid_to_edges[bid]
+            for entity in edge:
+                counts = self._entity_bid_counts.get(entity)
+                if counts is None:
+                    continue
+                counts[bid] -= 1
+                if counts[bid] <= 0:
+                    del counts[bid]
+                if not counts:
+                    del self._entity_bid_counts[entity]
+        return bids
+
+    def bids_of_edge(self, source: str, target: str) -> Set[str]:
+        return set(self.edge_to_bids.get((source, target), ()))
+
+    def edges_of_bids(self, bids: Iterable[str]) -> Set[Edge]:
+        edges = set()
+        for bid in bids:
+            edges |= self.bid_to_edges.get(bid, set())
+        return edges
+
+    def bids_of_entity(self, entity: str) -> Set[str]:
+        return set(self._entity_bid_counts.get(entity, ()))
+
+    def to_dict(self) -> Dict:
+        """序列化（只保存边 -> bid）"""
+        return {"edges": [[source, target, sorted(bids)] for (source, target), bids in self.edge_to_bids.items()]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ProvenanceIndex":
+        index = cls()
+        for source, target, bids in data.get("edges", []):
+            index.add(source, target, bids)
+        return index
+
+    @classmethod
+    def rebuild(cls, graph, kg_triplet: List[Dict]) -> "ProvenanceIndex":
+        """
+        为没有保存来源索引的旧图谱重建索引
+
+        边上带有 bids 属性时直接使用（并从边属性中移除），否则按实体对从 kg_triplet 中收集
+        """
+        pair_bids = defaultdict(set)
+        for item in kg_triplet:
+            for rel in item['relation']:
+                pair_bids[tuple(sorted([rel['source'], rel['target']]))].add(item['bid'])
+
+        index = cls()
+        for source, target, attr in graph.edges(data=True):
+            bids = attr.pop('bids', None)
+            if bids is None:
+                bids = pair_bids.get(tuple(sorted([source, target])), set())
+            index.add(source, target, bids)
+        return index
@@ -0,0 +1,86 @@
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Tuple
+
+
+class EntityIndex:
+    """
+    跨文档实体索引（SQLite）
+
+    功能特点：
+    1. 记录 实体 -> 包含该实体的文档及其在该文档图谱中的度数
+    2. 保存/删除图谱时同步更新，跨文档查询时只需加载包含相关实体的图谱
+    3. 支持在问题文本中直接匹配已知实体名，作为跨文档实体识别的候选：
+       由问题文本生成候选子串，按主键索引查找，不扫描整个索引
+    """
+
+    # 匹配问题文本时每次查询的候选子串数（SQLite参数数量上限以内）
+    MATCH_BATCH = 500
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entity_docs ("
+                "entity TEXT NOT NULL, file TEXT NOT NULL, degree INTEGER NOT NULL, "
+                "PRIMARY KEY (entity, file))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entity_docs_file ON entity_docs (file)")
+            # 最长实体名的长度（候选子串长度上限），启动时统计一次，之后写入时更新（删除时不缩小）
+            self._max_length = self._conn.execute(
+                "SELECT COALESCE(MAX(length(entity)), 0) FROM entity_docs").fetchone()[0]
+
+    def replace_file(self, file: str, entity_degrees: Iterable[Tuple[str, int]]):
+        """用文档当前图谱的实体与度数替换该文档的全部索引记录"""
+        rows = [(entity, file, int(degree)) for entity, degree in entity_degrees]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entity_docs WHERE file = ?", (file,))
+            self._conn.executemany("INSERT OR REPLACE INTO entity_docs (entity, file, degree) VALUES (?, ?, ?)", rows)
+            self._max_length = max([self._max_length, *(len(entity) for entity, _, _ in rows)])
+
+    def delete_files(self, files: List[str]):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM entity_docs WHERE file = ?", [(file,) for file in files])
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM entity_docs LIMIT 1").fetchone() is None
+
+    def documents_for(self, entities: List[str], limit: int = 10) -> List[Tuple[str, int]]:
+        """
+        包含给定实体的文档，按命中实体的度数之和降序
+
+        返回:
+            [(文档, 度数之和)]
+        """
+        if not entities:
+            return []
+        placeholders = ",".join("?" * len(entities))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT file, SUM(degree) AS score FROM entity_docs WHERE entity IN ({placeholders}) "
+                f"GROUP BY file ORDER BY score DESC, file LIMIT ?",
+                (*entities, limit)
+            ).fetchall()
+
+    def match_in_text(self, text: str, limit: int = 200, min_length: int = 2) -> List[str]:
+        """问题文本中出现的已知实体名（按出现文档的总度数降序）"""
+        scores = {}
+        with self._lock:
+            # 问题文本中长度在 [min_length, 最长实体名] 之间的全部子串，按主键 IN 查询
+            max_length = min(self._max_length, len(text))
+            candidates = list({text[i:i + n] for n in range(min_length, max_length + 1)
+                               for i in range(len(text) - n + 1)})
+            for start in range(0, len(candidates), self.MATCH_BATCH):
+                batch = candidates[start:start + self.MATCH_BATCH]
+                scores.update(self._conn.execute(
+                    f"SELECT entity, SUM(degree) FROM entity_docs WHERE entity IN ({', '.join('?' * len(batch))}) "
+                    f"GROUP BY entity",
+                    batch
+                ).fetchall())
+        return sorted(scores, key=lambda entity: (-scores[entity], entity))[:limit]
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class FileCatalog:
+    """
+    文件目录（SQLite）
+
+    功能特点：
+    1. 每个文件一行：原始文件名、类型、文本大小、文本块/实体/关系数量、处理状态、创建与更新时间
+    2. 上传开始即写入（状态 uploading/processing/updating），保存图谱时写入统计并置为 completed，失败时置为 error；
+       列出文件不依赖进程内的状态表，服务重启后仍能看到失败的文件
+    3. 存在性检查只认已保存图谱的记录，处理中的新文件不算存在
+    4. 按更新时间倒序分页查询
+    """
+
+    # 进行中的状态（服务重启后这些任务不会继续，启动时改为 error）
+    PENDING_STATUSES = ("uploading", "processing", "updating")
+
+    COLUMNS = ("file", "original_filename", "file_type", "text_size", "bolt_count",
+               "node_count", "edge_count", "status", "created_at", "updated_at")
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "file TEXT PRIMARY KEY, original_filename TEXT NOT NULL, file_type TEXT NOT NULL, "
+                "text_size INTEGER NOT NULL DEFAULT 0, bolt_count INTEGER NOT NULL DEFAULT 0, "
+                "node_count INTEGER NOT NULL DEFAULT 0, edge_count INTEGER NOT NULL DEFAULT 0, "
+                "status TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+                "has_graph INTEGER NOT NULL DEFAULT 1)"
+            )
+            # 旧版本的目录只记录已保存图谱的文件
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+            if "has_graph" not in columns:
+                self._conn.execute("ALTER TABLE files ADD COLUMN has_graph INTEGER NOT NULL DEFAULT 1")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_updated_at ON files (updated_at)")
+
+    def upsert(self, file: str, original_filename: str, text_size: int = 0, bolt_count: int = 0,
+               node_count: int = 0, edge_count: int = 0, status: str = "completed",
+               timestamp: Optional[float] = None):
+        """保存图谱时写入或更新文件记录（保留首次写入的创建时间）"""
+        now = timestamp or time.time()
+        file_type = os.path.splitext(original_filename)[1].lstrip(".").lower()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO files (file, original_filename, file_type, text_size, bolt_count, node_count, "
+                "edge_count, status, created_at, updated_at, has_graph) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1) "
+                "ON CONFLICT(file) DO UPDATE SET original_filename = excluded.original_filename, "
+                "file_type = excluded.file_type, text_size = excluded.text_size, bolt_count = excluded.bolt_count, "
+                "node_count = excluded.node_count, edge_count = excluded.edge_count, status = excluded.status, "
+                "updated_at = excluded.updated_at, has_graph = 1",
+                (file, original_filename, file_type, int(text_size), int(bolt_count), int(node_count),
+                 int(edge_count), status, now, now)
+            )
+
+    def set_status(self, file: str, status: str, original_filename: Optional[str] = None,
+                   timestamp: Optional[float] = None):
+        """只更新处理状态；文件还没有记录时（新上传）写入一条未保存图谱的记录"""
+        now = timestamp or time.time()
+        original_filename = original_filename or file
+        file_type = os.path.splitext(original_filename)[1].lstrip(".").lower()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO files (file, original_filename, file_type, status, created_at, updated_at, has_graph) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0) "
+                "ON CONFLICT(file) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at, "
+                # 还没有保存图谱的记录（如上次失败的上传）使用本次上传的文件名
+                "original_filename = CASE WHEN has_graph = 0 THEN excluded.original_filename ELSE original_filename END, "
+                "file_type = CASE WHEN has_graph = 0 THEN excluded.file_type ELSE file_type END",
+                (file, original_filename, file_type, status, now, now)
+            )
+
+    def fail_pending(self) -> int:
+        """把进行中的记录改为 error（服务启动时调用），返回修改的记录数"""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                f"UPDATE files SET status = 'error' WHERE status IN ({', '.join('?' * len(self.PENDING_STATUSES))})",
+                self.PENDING_STATUSES
+            ).rowcount
+
+    def delete_files(self, files: List[str]):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM files WHERE file = ?", [(file,) for file in files])
+
+    def exists(self, file: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM files WHERE file = ? AND has_graph = 1",
+                                      (file,)).fetchone() is not None
+
+    def get(self, file: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM files WHERE file = ?",
+                                     (file,)).fetchone()
+        return None if row is None else dict(zip(self.COLUMNS, row))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def list(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """按更新时间倒序分页列出文件，limit为空时返回offset之后的全部记录"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM files ORDER BY updated_at DESC, file LIMIT ? OFFSET ?",
+                (-1 if limit is None else int(limit), int(offset))
+            ).fetchall()
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
@@ -0,0 +1,244 @@
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from KnowledgeGraphManager.GraphLayout import GraphLayout
+from OmniStore.GraphSnapshot import GraphSnapshot
+
+
+class GraphLevelOfDetail:
+    """
+    大图的分级展示（社区概览 -> 社区/邻域展开）
+
+    功能特点：
+    1. 概览：每个社区折叠为一个超级节点，社区间的边按社区对聚合（条数、权重和）
+    2. 展开：按需返回单个社区或某个实体k跳邻域内的节点与边，节点数、边数都有上限
+    3. 边按权重降序截取前若干条，可按最小权重过滤
+    4. 返回的节点都带坐标，前端可关闭物理模拟直接绘制：有保存的布局时直接使用（社区中心为成员坐标均值），
+       旧图谱按社区中心 + 社区内局部布局临时计算
+    5. 社区布局按快照计算一次，同一版本的图谱重复查询不再计算
+    """
+
+    # 参与力导向布局的社区数上限，其余（最小的）社区排在外圈
+    LAYOUT_COMMUNITIES = 2000
+    # 社区中心之间的基础间距与社区半径系数（前端像素坐标）
+    COMMUNITY_SPACING = 150.0
+    COMMUNITY_RADIUS = 20.0
+    MEMBER_PREVIEW = 5
+
+    def __init__(self, snapshot: GraphSnapshot):
+        self.snapshot = snapshot
+        self.partition = snapshot.partition()
+        self.number_of_communities = snapshot.number_of_communities
+        self.sizes = np.bincount(self.partition, minlength=self.number_of_communities)
+        self._centers: Optional[np.ndarray] = None
+        self._layout_lock = threading.Lock()
+
+    def community_centers(self) -> np.ndarray:
+        """社区中心坐标 (社区数, 2)"""
+        if self._centers is None:
+            with self._layout_lock:
+                if self._centers is None:
+                    self._centers = self._layout_communities()
+        return self._centers
+
+    def _stored_positions(self) -> Optional[np.ndarray]:
+        """保存的布局换算为前端像素坐标"""
+        if self.snapshot.positions is None:
+            return None
+        return self.snapshot.positions * GraphLayout.display_scale(self.snapshot.number_of_nodes)
+
+    def _layout_communities(self) -> np.ndarray:
+        count = self.number_of_communities
+        stored = self._stored_positions()
+        if stored is not None:
+            sizes = np.maximum(self.sizes, 1)
+            return np.stack([np.bincount(self.partition, weights=stored[:, 0], minlength=count) / sizes,
+                             np.bincount(self.partition, weights=stored[:, 1], minlength=count) / sizes], axis=1)
+        laid_out = min(count, self.LAYOUT_COMMUNITIES)
+        pairs, _, weights = self._community_pairs(min_weight=None)
+        keep = (pairs[:, 0] < laid_out) & (pairs[:, 1] < laid_out)
+        pos = GraphLayout.force_layout(laid_out, pairs[keep, 0], pairs[keep, 1], np.log1p(weights[keep]),
+                                       iterations=100)
+        scale = self.COMMUNITY_SPACING * np.sqrt(max(laid_out, 1))
+        centers = np.zeros((count, 2))
+        centers[:laid_out] = GraphLayout.rescale(pos, scale)
+        if count > laid_out:
+            # 其余的小社区均匀排在外圈
+            angle = np.linspace(0.0, 2.0 * np.pi, count - laid_out, endpoint=False)
+            ring = scale * 1.2
+            centers[laid_out:] = np.stack([ring * np.cos(angle), ring * np.sin(angle)], axis=1)
+        return centers
+
+    def _community_pairs(self, min_weight: Optional[float]):
+        """
+        社区间聚合边（无向）
+
+        返回:
+            (社区对 (m, 2)，每对的边数，每对的权重和)
+        """
+        snapshot = self.snapshot
+        a, b = self.partition[snapshot.src], self.partition[snapshot.dst]
+        mask = a != b
+        if min_weight is not None:
+            mask &= snapshot.weight >= min_weight
+        low, high = np.minimum(a[mask], b[mask]), np.maximum(a[mask], b[mask])
+        keys, inverse = np.unique(low * self.number_of_communities + high, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        weights = np.bincount(inverse, weights=snapshot.weight[mask], minlength=len(keys))
+        pairs = np.stack([keys // self.number_of_communities, keys % self.number_of_communities], axis=1) \
+            if len(keys) else np.empty((0, 2), dtype=np.int64)
+        return pairs, counts, weights
+
+    def _community_groups(self) -> np.ndarray:
+        """每个社区中出现最多的实体类型（字符串池编号）"""
+        groups = self.snapshot.node_groups.astype(np.int64)
+        group_count = int(groups.max()) + 1 if len(groups) else 1
+        table = np.bincount(self.partition * group_count + groups,
+                            minlength=self.number_of_communities * group_count)
+        return table.reshape(self.number_of_communities, group_count).argmax(axis=1)
+
+    def overview(self, max_communities: int = 200, max_edges: int = 500,
+                 min_weight: Optional[float] = None) -> Dict:
+        """
+        社区折叠后的概览
+
+        返回:
+            {"nodes": [超级节点], "edges": [社区间聚合边], "total_nodes", "total_edges",
+             "communities", "hidden_communities", "modularity"}
+        """
+        snapshot = self.snapshot
+        shown = min(self.number_of_communities, max_communities)
+        centers = self.community_centers()
+        groups = self._community_groups()
+
+        # 每个社区按度数取前几个成员作为预览（社区编号、度数降序）
+        order = np.lexsort((-snapshot.degrees, self.partition))
+        starts = np.concatenate(([0], np.cumsum(self.sizes)[:-1]))
+
+        nodes = []
+        for c in range(shown):
+            members = order[starts[c]:starts[c] + self.MEMBER_PREVIEW].tolist()
+            size = int(self.sizes[c])
+            leader = snapshot.nodes[members[0]]
+            nodes.append({
+                "id": f"community:{c}",
+                "community": c,
+                "label": leader if size == 1 else f"{leader} 等{size}个",
+                "group": snapshot.strings[groups[c]],
+                "size": size,
+                "members": [snapshot.nodes[i] for i in members],
+                "x": float(centers[c, 0]),
+                "y": float(centers[c, 1])
+            })
+
+        pairs, counts, weights = self._community_pairs(min_weight)
+        keep = np.nonzero((pairs[:, 0] < shown) & (pairs[:, 1] < shown))[0]
+        keep = snapshot.top_edges(keep, weights[keep], max_edges)
+        edges = [{
+            "id": f"community:{int(pairs[i, 0])}-{int(pairs[i, 1])}",
+            "from": f"community:{int(pairs[i, 0])}",
+            "to": f"community:{int(pairs[i, 1])}",
+            "count": int(counts[i]),
+            "weight": float(weights[i])
+        } for i in keep.tolist()]
+
+        return {
+            "nodes": nodes,
+            "edges": edges,
+            "total_nodes": snapshot.number_of_nodes,
+            "total_edges": snapshot.number_of_edges,
+            "communities": self.number_of_communities,
+            "hidden_communities": self.number_of_communities - shown,
+            "modularity": snapshot.modularity
+        }
+
+    def community(self, community: int, max_nodes: int = 500, max_edges: int = 2000,
+                  min_weight: Optional[float] = None) -> Optional[Dict]:
+        """展开单个社区（成员过多时保留度数最高的max_nodes个），社区不存在时返回None"""
+        if not 0 <= community < self.number_of_communities:
+            return None
+        members = np.nonzero(self.partition == community)[0]
+        view = self._view(members, False, max_nodes, max_edges, min_weight, self.community_centers()[community])
+        view["community"] = community
+        return view
+
+    def neighborhood(self, entity: str, hops: int = 1, max_nodes: int = 300, max_edges: int = 1000,
+                     min_weight: Optional[float] = None) -> Optional[Dict]:
+        """展开实体的k跳邻域（近的、度数高的节点优先），实体不存在时返回None"""
+        snapshot = self.snapshot
+        seed = snapshot.node_index.get(entity)
+        if seed is None:
+            return None
+        distance = snapshot.k_hop_ids(np.asarray([seed]), hops)
+        reached = np.nonzero(distance >= 0)[0]
+        reached = reached[np.lexsort((-snapshot.degrees[reached], distance[reached]))]
+        center = self.community_centers()[self.partition[seed]]
+        view = self._view(reached, True, max_nodes, max_edges, min_weight, center)
+        view["center"] = entity
+        return view
+
+    def _view(self, candidates: np.ndarray, ranked: bool, max_nodes: int, max_edges: int,
+              min_weight: Optional[float], center: np.ndarray) -> Dict:
+        """
+        截取候选节点并返回节点、边与局部布局坐标
+
+        参数:
+            candidates: 候选节点编号
+            ranked: 候选已按优先级排序时直接取前max_nodes个，否则按度数选取
+            center: 局部布局的中心坐标（没有保存的布局时使用）
+        """
+        snapshot = self.snapshot
+        selected = candidates
+        if len(candidates) > max_nodes:
+            selected = candidates[:max_nodes] if ranked else \
+                candidates[np.argsort(-snapshot.degrees[candidates], kind="stable")[:max_nodes]]
+        node_ids = np.sort(selected)
+
+        mask = np.zeros(snapshot.number_of_nodes, dtype=bool)
+        mask[node_ids] = True
+        edge_ids = snapshot.edges_within(mask, min_weight)
+        total_edges = len(edge_ids)
+        edge_ids = snapshot.top_edges(edge_ids, snapshot.weight[edge_ids], max_edges)
+
+        stored = self._stored_positions()
+        if stored is not None:
+            pos = stored[node_ids]
+        else:
+            # 局部布局：节点编号映射到 0..k-1，以社区中心为圆心
+            local_src = np.searchsorted(node_ids, snapshot.src[edge_ids])
+            local_dst = np.searchsorted(node_ids, snapshot.dst[edge_ids])
+            pos = GraphLayout.force_layout(len(node_ids), local_src, local_dst, snapshot.weight[edge_ids])
+            radius = self.COMMUNITY_RADIUS * np.sqrt(max(len(node_ids), 1))
+            pos = GraphLayout.rescale(pos, radius) + center
+
+        return {
+            "nodes": self._node_records(node_ids, pos),
+            "edges": self._edge_records(edge_ids),
+            "truncated_nodes": bool(len(node_ids) < len(candidates)),
+            "truncated_edges": bool(len(edge_ids) < total_edges)
+        }
+
+    def _node_records(self, node_ids: np.ndarray, pos: np.ndarray) -> List[Dict]:
+        snapshot = self.snapshot
+        return [{
+            "id": snapshot.nodes[i],
+            "label": snapshot.nodes[i],
+            "group": snapshot.strings[snapshot.node_groups[i]],
+            "community": int(self.partition[i]),
+            "degree": int(snapshot.degrees[i]),
+            "x": float(x),
+            "y": float(y)
+        } for i, (x, y) in zip(node_ids.tolist(), pos.tolist())]
+
+    def _edge_records(self, edge_ids: np.ndarray) -> List[Dict]:
+        snapshot = self.snapshot
+        return [{
+            "id": e,
+            "from": snapshot.nodes[snapshot.src[e]],
+            "to": snapshot.nodes[snapshot.dst[e]],
+            "label": snapshot.strings[snapshot.label[e]],
+            "title": snapshot.strings[snapshot.context[e]],
+            "weight": float(snapshot.weight[e])
+        } for e in edge_ids.tolist()]
@@ -0,0 +1,298 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+from community import community_louvain
+
+from KnowledgeGraphManager.CompactGraph import CompactGraph
+
+
+class GraphSnapshot:
+    """
+    只读图谱快照（CSR邻接表），供RAG查询使用
+
+    功能特点：
+    1. 由 CompactGraph 直接构建，不经过 networkx 的字典结构
+    2. 出边与无向邻接各一份 CSR（indptr / indices / 边编号），邻居、度数、k跳扩展都是数组运算
+    3. 子图边筛选用节点掩码一次完成
+    4. 社区划分（louvain）优先使用保存图谱时算好的结果，旧图谱按快照缓存，同一版本只计算一次
+    5. 快照不可变，多线程共享无需加锁（社区划分的首次计算除外）
+    """
+
+    def __init__(self, compact: CompactGraph, partition: Optional[np.ndarray] = None,
+                 modularity: Optional[float] = None, positions: Optional[np.ndarray] = None):
+        self.nodes: List[str] = compact.nodes
+        self.node_index: Dict[str, int] = compact.node_index
+        self.strings = compact.strings
+        self.node_groups = compact.node_groups
+        self.src = compact.src.astype(np.int64)
+        self.dst = compact.dst.astype(np.int64)
+        self.weight = compact.weight
+        self.label = compact.label
+        self.context = compact.context
+
+        n = len(self.nodes)
+        edge_ids = np.arange(len(self.src), dtype=np.int64)
+        self.out_indptr, self.out_indices, self.out_edges = self._csr(self.src, self.dst, edge_ids, n)
+        self.indptr, self.indices, self.edge_ids = self._csr(
+            np.concatenate([self.src, self.dst]), np.concatenate([self.dst, self.src]),
+            np.concatenate([edge_ids, edge_ids]), n)
+
+        # 有向图度数 = 出度 + 入度（与 networkx DiGraph.degree 一致）
+        self.degrees = np.bincount(self.src, minlength=n) + np.bincount(self.dst, minlength=n)
+
+        if partition is not None and len(partition) != n:
+            # 保存的社区划分与图谱不一致时重新计算
+            partition, modularity = None, None
+        self._partition: Optional[np.ndarray] = None if partition is None else np.asarray(partition, dtype=np.int64)
+        self._modularity: Optional[float] = modularity
+        # 保存时计算的布局坐标 (节点数, 2)，旧图谱没有布局时为None
+        self.positions: Optional[np.ndarray] = None
+        if positions is not None and len(positions) == n:
+            self.positions = np.asarray(positions, dtype=np.float64).reshape(n, 2)
+        self._partition_lock = threading.Lock()
+
+    @classmethod
+    def from_compact(cls, compact: CompactGraph, communities: Optional[Dict] = None,
+                     layout: Optional[Dict] = None) -> "GraphSnapshot":
+        """
+        communities 为保存图谱时计算的 {"partition", "modularity"}，layout 为布局 {"x", "y"}
+        """
+        partition, modularity = (None, None) if communities is None else \
+            (communities["partition"], communities["modularity"])
+        positions = None if layout is None else np.stack([layout["x"], layout["y"]], axis=1)
+        return cls(compact, partition, modularity, positions)
+
+    @staticmethod
+    def _csr(rows: np.ndarray, cols: np.ndarray, edge_ids: np.ndarray, n: int):
+        order = np.argsort(rows, kind="stable")
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return indptr, cols[order], edge_ids[order]
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def number_of_edges(self) -> int:
+        return len(self.src)
+
+    def ids(self, names: Iterable[str]) -> np.ndarray:
+        """实体名 -> 节点编号（忽略不存在的实体）"""
+        return np.asarray([self.node_index[name] for name in names if name in self.node_index], dtype=np.int64)
+
+    def neighbors(self, node: str, directed: bool = False) -> List[str]:
+        """邻居节点（directed=True 时只返回出边邻居）"""
+        i = self.node_index.get(node)
+        if i is None:
+            return []
+        indptr, indices = (self.out_indptr, self.out_indices) if directed else (self.indptr, self.indices)
+        return [self.nodes[j] for j in np.unique(indices[indptr[i]:indptr[i + 1]]).tolist()]
+
+    def degree(self, node: str) -> int:
+        i = self.node_index.get(node)
+        return 0 if i is None else int(self.degrees[i])
+
+    def top_degree(self, n: int) -> List[Tuple[str, int]]:
+        """度数最大的n个节点 [(实体, 度数)]，度数相同时保持节点顺序"""
+        order = np.argsort(-self.degrees, kind="stable")[:n]
+        return [(self.nodes[i], int(self.degrees[i])) for i in order.tolist()]
+
+    def _gather(self, frontier: np.ndarray, indptr: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """取出一组节点在CSR中的全部条目"""
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, dtype=values.dtype)
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        return values[np.arange(total) + offsets]
+
+    def k_hop(self, seeds: Iterable[str], k: int) -> np.ndarray:
+        """
+        k跳邻域（无向）
+
+        返回:
+            长度为节点数的距离数组，未到达的节点为 -1
+        """
+        return self.k_hop_ids(self.ids(seeds), k)
+
+    def k_hop_ids(self, seeds: np.ndarray, k: int) -> np.ndarray:
+        """k_hop 的节点编号版本"""
+        distance = np.full(len(self.nodes), -1, dtype=np.int64)
+        frontier = np.unique(seeds)
+        distance[frontier] = 0
+        for hop in range(1, k + 1):
+            if frontier.size == 0:
+                break
+            reached = np.unique(self._gather(frontier, self.indptr, self.indices))
+            frontier = reached[distance[reached] < 0]
+            distance[frontier] = hop
+        return distance
+
+    def edges_within(self, node_mask: np.ndarray, min_weight: float = None) -> np.ndarray:
+        """两端都在节点掩码内的边编号（可按最小权重过滤）"""
+        mask = node_mask[self.src] & node_mask[self.dst]
+        if min_weight is not None:
+            mask &= self.weight >= min_weight
+        return np.nonzero(mask)[0]
+
+    def edges_of(self, nodes: np.ndarray) -> np.ndarray:
+        """与给定节点相连的所有边编号（去重）"""
+        return np.unique(self._gather(nodes, self.indptr, self.edge_ids))
+
+    def edge_records(self, edge_ids) -> List[Dict]:
+        """边编号 -> [{"source", "target", "relation", "context", "weight"}]"""
+        records = []
+        for e in np.asarray(edge_ids, dtype=np.int64).tolist():
+            records.append({
+                'source': self.nodes[self.src[e]],
+                'target': self.nodes[self.dst[e]],
+                'relation': self.strings[self.label[e]],
+                'context': self.strings[self.context[e]],
+                'weight': float(self.weight[e])
+            })
+        return records
+
+    def sort_by_weight(self, edge_ids: np.ndarray) -> np.ndarray:
+        """按权重降序排列边编号（权重相同保持原顺序）"""
+        return edge_ids[np.argsort(-self.weight[edge_ids], kind="stable")]
+
+    def top_edges(self, edge_ids: np.ndarray, scores: np.ndarray, n: int) -> np.ndarray:
+        """按分数降序取前n条边（部分选择后排序，分数相同保持原顺序）"""
+        if n > 0 and len(edge_ids) > n:
+            keep = np.argpartition(-scores, n - 1)[:n]
+            keep.sort()
+            edge_ids, scores = edge_ids[keep], scores[keep]
+        return edge_ids[np.argsort(-scores, kind="stable")]
+
+    def personalized_pagerank(self, seeds: np.ndarray, node_mask: np.ndarray = None, damping: float = 0.85,
+                              max_iter: int = 50, tol: float = 1.0e-6) -> np.ndarray:
+        """
+        以种子节点为重启分布的个性化PageRank（无向、按权重转移）
+
+        参数:
+            seeds: 种子节点编号
+            node_mask: 只在该节点集合内传播（如k跳邻域），为空时使用整张图
+        返回:
+            每个节点的得分，掩码外的节点为0
+        """
+        n = len(self.nodes)
+        restart = np.zeros(n)
+        if len(seeds) == 0:
+            return restart
+        restart[seeds] = 1.0 / len(seeds)
+
+        edge_mask = np.ones(len(self.src), dtype=bool) if node_mask is None else \
+            node_mask[self.src] & node_mask[self.dst]
+        rows = np.concatenate([self.src[edge_mask], self.dst[edge_mask]])
+        cols = np.concatenate([self.dst[edge_mask], self.src[edge_mask]])
+        weights = np.tile(self.weight[edge_mask], 2)
+        out_weight = np.bincount(rows, weights=weights, minlength=n)
+        share = np.divide(weights, out_weight[rows], out=np.zeros(len(rows)), where=out_weight[rows] > 0)
+        dangling = out_weight == 0
+
+        rank = restart.copy()
+        for _ in range(max_iter):
+            previous = rank
+            # 没有出边的节点把得分还给种子节点
+            rank = damping * (np.bincount(cols, weights=previous[rows] * share, minlength=n)
+                              + previous[dangling].sum() * restart) + (1.0 - damping) * restart
+            if np.abs(rank - previous).sum() < tol:
+                break
+        if node_mask is not None:
+            rank[~node_mask] = 0.0
+        return rank
+
+    def partition(self) -> np.ndarray:
+        """louvain社区划分，返回每个节点的社区编号"""
+        if self._partition is None:
+            with self._partition_lock:
+                if self._partition is None:
+                    self._partition, self._modularity = self.compute_partition(
+                        len(self.nodes), self.src, self.dst, self.weight)
+        return self._partition
+
+    @property
+    def modularity(self) -> Optional[float]:
+        self.partition()
+        return self._modularity
+
+    @property
+    def number_of_communities(self) -> int:
+        partition = self.partition()
+        return int(partition.max()) + 1 if len(partition) else 0
+
+    @staticmethod
+    def compute_partition(n: int, src: np.ndarray, dst: np.ndarray,
+                          weight: np.ndarray) -> Tuple[np.ndarray, Optional[float]]:
+        """
+        louvain社区划分（无向带权），社区编号按社区大小降序重新编号
+
+        返回:
+            (每个节点的社区编号, 模块度)，没有边时每个节点自成一个社区、模块度为None
+        """
+        if len(src) == 0:
+            # 没有边时模块度无定义，每个节点自成一个社区
+            return np.arange(n, dtype=np.int64), None
+        graph = nx.Graph()
+        graph.add_nodes_from(range(n))
+        graph.add_weighted_edges_from(zip(np.asarray(src).tolist(), np.asarray(dst).tolist(),
+                                          np.asarray(weight).tolist()))
+        partition = community_louvain.best_partition(graph, random_state=0)
+        modularity = community_louvain.modularity(partition, graph)
+        labels = np.asarray([partition[i] for i in range(n)], dtype=np.int64)
+        return GraphSnapshot._rank_by_size(labels), modularity
+
+    @staticmethod
+    def extend_partition(src: np.ndarray, dst: np.ndarray, weight: np.ndarray,
+                         partition: np.ndarray) -> np.ndarray:
+        """
+        在已有社区划分上归入新节点（不重新运行louvain）
+
+        partition 中新节点为 -1；新节点逐轮归入相邻已归入节点中边权之和最大的社区，
+        与已有社区都不相连的新节点另起新社区（同一连通部分共用一个）；社区编号按大小降序重新编号
+        """
+        labels = np.asarray(partition, dtype=np.int64).copy()
+        pending = labels < 0
+        if pending.any():
+            src, dst = np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64)
+            weight = np.asarray(weight, dtype=np.float64)
+            # 只保留与新节点相连的边，两个方向各一条：(待归入节点, 邻居, 权重)
+            touch = pending[src] | pending[dst]
+            node = np.concatenate([src[touch], dst[touch]])
+            neighbor = np.concatenate([dst[touch], src[touch]])
+            edge_weight = np.concatenate([weight[touch], weight[touch]])
+            keep = pending[node]
+            node, neighbor, edge_weight = node[keep], neighbor[keep], edge_weight[keep]
+            next_label = int(labels.max()) + 1
+            while pending.any():
+                ready = pending[node] & ~pending[neighbor]
+                if not ready.any():
+                    # 剩余新节点与已归入节点都不相连，取一个另起新社区，再向其相连的新节点扩散
+                    seed = np.flatnonzero(pending)[0]
+                    labels[seed] = next_label
+                    pending[seed] = False
+                    next_label += 1
+                    continue
+                # 每个 (节点, 社区) 的边权之和，每个节点取最大者（相同时取编号小的社区）
+                keys = node[ready] * next_label + labels[neighbor[ready]]
+                unique_keys, inverse = np.unique(keys, return_inverse=True)
+                sums = np.bincount(inverse, weights=edge_weight[ready])
+                nodes, communities = unique_keys // next_label, unique_keys % next_label
+                order = np.lexsort((-sums, nodes))
+                nodes, communities = nodes[order], communities[order]
+                first = np.r_[True, nodes[1:] != nodes[:-1]]
+                labels[nodes[first]] = communities[first]
+                pending[nodes[first]] = False
+        return GraphSnapshot._rank_by_size(labels)
+
+    @staticmethod
+    def _rank_by_size(labels: np.ndarray) -> np.ndarray:
+        """社区按大小降序重新编号（大社区编号小，概览时优先展示）"""
+        _, inverse, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+        rank = np.empty(len(sizes), dtype=np.int64)
+        rank[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+        return rank[inverse]
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+
+class StateFieldStore:
+    """
+    图谱状态字段存储（SQLite）
+
+    功能特点：
+    1. 每个文件的每个状态字段（图谱、排名、社区划分、布局、来源索引、差异等JSON）一行，主键为 (文件, 字段)
+    2. 大字段不写入chromadb：chromadb会为每条文档建立全文索引，每次保存都要重新索引数MB的JSON
+    3. 一个文件的全部字段在同一事务中替换，读取时只取需要的字段
+    """
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS state_fields ("
+                "file TEXT NOT NULL, field TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (file, field))"
+            )
+
+    def replace_file(self, file: str, fields: Dict[str, str]):
+        """用给定字段替换该文件的全部字段（不在其中的旧字段删除）"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM state_fields WHERE file = ? AND field NOT IN ({', '.join('?' * len(fields))})",
+                (file, *fields)
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO state_fields (file, field, value) VALUES (?, ?, ?)",
+                [(file, field, value) for field, value in fields.items()]
+            )
+
+    def insert_many(self, rows: Iterable[Tuple[str, str, str]]):
+        """批量写入 (文件, 字段, JSON) 记录（迁移旧数据时使用）"""
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO state_fields (file, field, value) VALUES (?, ?, ?)", rows)
+
+    def get(self, file: str, fields: List[str]) -> Dict[str, str]:
+        """返回 {字段: JSON字符串}，不存在的字段不在结果中"""
+        if not fields:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT field, value FROM state_fields WHERE file = ? AND field IN ({', '.join('?' * len(fields))})",
+                (file, *fields)
+            ).fetchall()
+        return dict(rows)
+
+    def delete_files(self, files: List[str]):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM state_fields WHERE file = ?", [(file,) for file in files])
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM state_fields LIMIT 1").fetchone() is None
@@ -5,15 +5,33 @@ import chromadb
 import torch
 from chromadb.utils import embedding_functions
 import time
+import threading
 from embedding_tools.embedding_tools import BgeZhEmbeddingFunction
+from TextSlicer.TokenBudget import TokenBudget
+from KnowledgeGraphManager.CompactGraph import CompactGraph
+from KnowledgeGraphManager.GraphDiff import GraphDiff
+from KnowledgeGraphManager.GraphRankings import GraphRankings
+from OmniStore.EntityIndex import EntityIndex
+from OmniStore.FileCatalog import FileCatalog
+from OmniStore.GraphSnapshot import GraphSnapshot
+from OmniStore.StateFieldStore import StateFieldStore
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
 from dotenv import load_dotenv
 import os
+import numpy as np
 
 load_dotenv()  #
 device = os.getenv("DEVICE")
 
 class StoreTool:
+    # 图谱状态中可按需加载的字段
+    STATE_FIELDS = ("kg_triplet", "bidirectional_mapping", "current_G", "Bolts", "provenance", "rankings",
+                    "communities", "layout", "diff")
+    # 主记录的格式标记：字段分开存储；没有该标记的是旧版本整条保存的状态
+    STATE_FORMAT = "fields-v1"
+    # 增量更新沿用已保存的社区划分，累计变化（增删的节点与边）超过图谱规模的该比例时重新运行louvain
+    COMMUNITY_DRIFT = float(os.getenv("COMMUNITY_DRIFT", "0.2"))
+
     def __init__(self, storage_path=os.getenv("CHROMADB_PATH"), embedding_function=None):
         # 初始化chromadb客户端
         self.client = chromadb.PersistentClient(path=storage_path)
@@ -41,6 +59,12 @@ class StoreTool:
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.rerank_model = rerank_model
 
+        # 分割器/嵌入模型/重排模型/大模型统一的token预算
+        self.token_budget = TokenBudget.from_env(
+            embedding_model=getattr(self.embedding_func, "model", None),
+            rerank_tokenizer=self.tokenizer
+        )
+
 
         # 获取图谱的三元组或创建集合
         self.collection = self.client.get_or_create_collection(
@@ -52,17 +76,52 @@ class StoreTool:
             name="bolt_vectors",
             embedding_function=self.embedding_func
         )
+        # 检索用的小子块，metadata中的parent_id指向bolt_vectors中用于抽取的父块
+        self.child_collection = self.client.get_or_create_collection(
+            name="bolt_children",
+            embedding_function=self.embedding_func
+        )
+        # 每个文件图谱的版本号（保存/删除时递增），用于失效查询侧的图谱快照缓存
+        self.graph_versions = defaultdict(int)
+        self._graph_version_lock = threading.Lock()
         # 考虑加入用户聊天记录,方便消息队列处理rag，而不是前端关闭，后端就不进行处理了，方便后端直接保存到数据库
         self.rag_history_collection = self.client.get_or_create_collection(
             name="history_vectors",
             embedding_function=self.embedding_func
         )
+        # 图谱状态的各个字段分开存储在文件目录的SQLite库中，按需只加载用到的字段
+        self.state_fields = StateFieldStore(os.path.join(storage_path or ".", "file_catalog.sqlite3"))
+        if self.state_fields.is_empty() and self.collection.count() > 0:
+            self.migrate_state_fields()
+        # 跨文档实体索引（实体 -> 文档、度数），与chromadb数据放在同一目录
+        self.entity_index = EntityIndex(os.path.join(storage_path or ".", "entity_index.sqlite3"))
+        if self.entity_index.is_empty() and self.collection.count() > 0:
+            self.rebuild_entity_index()
+        # 文件目录（文件名、大小、数量、状态、时间），列出文件时不读取图谱状态
+        self.file_catalog = FileCatalog(os.path.join(storage_path or ".", "file_catalog.sqlite3"))
+        if self.file_catalog.count() == 0 and self.collection.count() > 0:
+            self.rebuild_file_catalog()
 
     def save_state(self, kg_manager):
         """保存文本块向量到chromadb，便于rag使用"""
+        self.save_bolts(kg_manager, kg_manager.Bolts)
+        self._save_graph_state(kg_manager)
+
+    def save_delta(self, kg_manager, added_bolts: list, removed_bids: list):
+        """增量保存：删除被移除块的向量，只为新增块生成向量，再更新图谱状态"""
+        # 更新前的图谱与社区划分，用于记录本次更新的变化并沿用社区划分
+        previous, extras = self.load_graph_extras(kg_manager.file, ["communities"])
+        self.delete_bolts(kg_manager.file, list(removed_bids))
+        self.save_bolts(kg_manager, added_bolts)
+        self._save_graph_state(kg_manager, previous, extras["communities"] if extras else None)
+
+    def save_bolts(self, kg_manager, bolts: list):
+        """为文本块（及其检索子块）生成向量并写入"""
+        if not bolts:
+            return
         bolt_count = len(kg_manager.Bolts)
         metadatas = []
-        for bid, text in kg_manager.Bolts:
+        for bid, text in bolts:
             entry_metadata = {
                 "file": kg_manager.file,
                 "operation_type": "add",
@@ -70,22 +129,34 @@ class StoreTool:
                 "bolt_count": bolt_count,
                 "original_file_type": kg_manager.original_file_type  # 存储原始文件名
             }
+            # 结构感知分割器提供的标题路径等元数据
+            entry_metadata.update(getattr(kg_manager, "bolt_metadata", {}).get(bid, {}))
             metadatas.append(entry_metadata)
 
         self.vector_collection.upsert(
-            ids=[bid for bid, text in kg_manager.Bolts],
+            ids=[bid for bid, text in bolts],
             metadatas=metadatas,
-            embeddings=self.embedding_func([text for bid, text in kg_manager.Bolts]),
-            documents=[text for bid, text in kg_manager.Bolts]
+            embeddings=self.embedding_func([text for bid, text in bolts]),
+            documents=[text for bid, text in bolts]
         )
+        self.save_child_chunks(kg_manager.file, bolts)
 
-        """保存KgManager状态到chromadb"""
-        # 序列化有向图
-        graph_data = nx.node_link_data(kg_manager.current_G)
+    def _save_graph_state(self, kg_manager, previous=None, communities=None):
+        """
+        保存KgManager状态到chromadb
 
-        # 准备需要存储的元数据
-        metadata = {
-            "file": kg_manager.file,
+        参数:
+            previous: 增量更新前的紧凑图谱，提供时保存本次更新的图谱差异
+            communities: 增量更新前保存的社区划分（与 previous 的节点顺序对应），提供时在其上归入新节点
+        """
+        # 序列化有向图（紧凑格式，只含语义属性）
+        compact = CompactGraph.from_networkx(kg_manager.current_G)
+        graph_data = compact.to_dict()
+        self._index_entities(kg_manager.file, compact)
+        diff = None if previous is None else GraphDiff.between(previous, compact)
+
+        # 各字段单独存为一条记录，读取时只解析需要的字段
+        fields = {
             "kg_triplet": json.dumps(kg_manager.kg_triplet),
             "bidirectional_mapping": json.dumps({
                 "entity_to_label": dict(kg_manager.bidirectional_mapping["entity_to_label"]),
@@ -93,7 +164,34 @@ class StoreTool:
             }),
             "current_G": json.dumps(graph_data),
             "Bolts": json.dumps(kg_manager.Bolts),
-            "original_file_type": kg_manager.original_file_type  # 存储原始文件名
+            # 节点排名（度数/加权度数/PageRank），查询主要实体时直接读取
+            "rankings": json.dumps(GraphRankings.compute(compact).to_dict()),
+            # louvain社区划分（按节点顺序），图谱概览与社区检索直接使用
+            "communities": json.dumps(self._update_communities(compact, previous, communities, diff))
+        }
+        if diff is not None:
+            # 最近一次增量更新的变化（完整保存时不保留旧的差异）
+            fields["diff"] = json.dumps(diff)
+        provenance = getattr(kg_manager, "provenance", None)
+        if provenance is not None:
+            # 图谱来源索引（边 -> 文本块）
+            fields["provenance"] = json.dumps(provenance.to_dict())
+        layout = getattr(kg_manager, "layout", None)
+        if layout and all(node in layout for node in compact.nodes):
+            # 布局坐标（按紧凑图谱的节点顺序）
+            fields["layout"] = json.dumps({
+                "x": [round(layout[node][0], 4) for node in compact.nodes],
+                "y": [round(layout[node][1], 4) for node in compact.nodes]
+            })
+
+        # 同时删除旧状态中已不存在的字段（如来源索引）
+        self.state_fields.replace_file(kg_manager.file, fields)
+
+        # 主记录只保存文件信息，列出文件时不再携带整个图谱
+        metadata = {
+            "file": kg_manager.file,
+            "original_file_type": kg_manager.original_file_type,  # 存储原始文件名
+            "state_format": self.STATE_FORMAT
         }
 
         # 使用文件名作为ID，存入集合
@@ -102,28 +200,207 @@ class StoreTool:
             metadatas=[metadata],
             documents=[kg_manager.file]  # 使用文件名作为文档内容
         )
+        self.file_catalog.upsert(
+            file=kg_manager.file,
+            original_filename=kg_manager.original_file_type,
+            text_size=sum(len(text) for _, text in kg_manager.Bolts),
+            bolt_count=len(kg_manager.Bolts),
+            node_count=compact.number_of_nodes,
+            edge_count=compact.number_of_edges
+        )
+        self._bump_graph_version(kg_manager.file)
 
-    def load_state(self, filename):
-        """从chromadb加载指定文件名的状态"""
-        results = self.collection.get(ids=[filename])
+    @staticmethod
+    def _compute_communities(compact):
+        partition, modularity = GraphSnapshot.compute_partition(
+            compact.number_of_nodes, compact.src, compact.dst, compact.weight)
+        return {"partition": partition.tolist(), "modularity": modularity}
+
+    @classmethod
+    def _update_communities(cls, compact, previous=None, communities=None, diff=None):
+        """
+        增量更新时沿用已保存的社区划分：保留节点的社区不变，新节点归入相邻节点中权重最大的社区
+
+        完整保存、旧状态缺少社区划分、或自上次louvain以来累计变化超过 COMMUNITY_DRIFT 时重新计算；
+        模块度保留上次louvain的结果
+        """
+        if previous is None or diff is None or not communities or \
+                len(communities.get("partition", [])) != previous.number_of_nodes:
+            return cls._compute_communities(compact)
+        summary = diff["summary"]
+        drift = communities.get("drift", 0) + summary["added_nodes"] + summary["removed_nodes"] + \
+            summary["added_edges"] + summary["removed_edges"]
+        if drift > cls.COMMUNITY_DRIFT * max(compact.number_of_nodes + compact.number_of_edges, 1):
+            return cls._compute_communities(compact)
+
+        stored = np.asarray(communities["partition"], dtype=np.int64)
+        old_ids = np.fromiter((previous.node_index.get(node, -1) for node in compact.nodes),
+                              dtype=np.int64, count=compact.number_of_nodes)
+        partition = np.where(old_ids >= 0, stored[np.maximum(old_ids, 0)], -1) if len(stored) else \
+            np.full(compact.number_of_nodes, -1, dtype=np.int64)
+        partition = GraphSnapshot.extend_partition(compact.src, compact.dst, compact.weight, partition)
+        return {"partition": partition.tolist(), "modularity": communities.get("modularity"), "drift": drift}
+
+    def migrate_state_fields(self):
+        """把旧版本存放在chromadb（kg_state_fields集合）中的状态字段迁移到SQLite，迁移后删除该集合"""
+        legacy = self.client.get_or_create_collection(name="kg_state_fields", embedding_function=None)
+        total = legacy.count()
+        if total:
+            print(f"迁移图谱状态字段，记录数: {total}")
+        for offset in range(0, total, 100):
+            records = legacy.get(include=["documents", "metadatas"], limit=100, offset=offset)
+            self.state_fields.insert_many(
+                (meta["file"], meta["field"], document)
+                for meta, document in zip(records["metadatas"], records["documents"])
+            )
+        self.client.delete_collection("kg_state_fields")
+
+    def _index_entities(self, filename, compact):
+        """把文档图谱中的实体及其度数写入跨文档实体索引"""
+        degrees = np.bincount(compact.src, minlength=compact.number_of_nodes) + \
+                  np.bincount(compact.dst, minlength=compact.number_of_nodes)
+        self.entity_index.replace_file(filename, zip(compact.nodes, degrees.tolist()))
+
+    def rebuild_entity_index(self):
+        """由已保存的全部图谱重建跨文档实体索引（首次启用索引时执行一次）"""
+        filenames = self.collection.get(include=[])["ids"]
+        print(f"重建跨文档实体索引，文件数: {len(filenames)}")
+        for filename in filenames:
+            compact = self.load_compact_graph(filename)
+            if compact is not None:
+                self._index_entities(filename, compact)
+
+    def rebuild_file_catalog(self):
+        """由已保存的全部状态重建文件目录（首次启用目录时执行一次）"""
+        filenames = self.collection.get(include=[])["ids"]
+        print(f"重建文件目录，文件数: {len(filenames)}")
+        for filename in filenames:
+            state = self.load_state(filename, fields=["Bolts"])
+            compact = self.load_compact_graph(filename)
+            if state is None or compact is None:
+                continue
+            bolts = state["Bolts"] or []
+            self.file_catalog.upsert(
+                file=filename,
+                original_filename=state["original_file_type"],
+                text_size=sum(len(text) for _, text in bolts),
+                bolt_count=len(bolts),
+                node_count=compact.number_of_nodes,
+                edge_count=compact.number_of_edges
+            )
+
+    def _bump_graph_version(self, filename):
+        with self._graph_version_lock:
+            self.graph_versions[filename] += 1
+
+    def graph_version(self, filename) -> int:
+        """当前进程内该文件图谱的版本号"""
+        return self.graph_versions[filename]
+
+    def _load_raw_fields(self, filename, fields):
+        """
+        读取状态字段的原始JSON字符串
+
+        返回:
+            (主记录metadata, {字段: JSON字符串})，文件不存在时返回 (None, None)；
+            旧版本整条保存的状态直接从主记录中取字段
+        """
+        results = self.collection.get(ids=[filename], include=["metadatas"])
         if not results["metadatas"]:
+            return None, None
+        head = results["metadatas"][0]
+        if head.get("state_format") != self.STATE_FORMAT:
+            return head, {field: head[field] for field in fields if field in head}
+        if not fields:
+            return head, {}
+        return head, self.state_fields.get(filename, fields)
+
+    def load_compact_graph(self, filename):
+        """只加载图谱（紧凑格式），不还原为networkx，文件不存在时返回None"""
+        _, raw = self._load_raw_fields(filename, ["current_G"])
+        if not raw or "current_G" not in raw:
             return None
+        return self._compact_from_json(raw["current_G"])
 
-        metadata = results["metadatas"][0]
+    def load_graph_extras(self, filename, fields):
+        """
+        加载紧凑图谱及与其节点顺序对应的附加字段（一次读取），如社区划分、布局
 
-        # 反序列化数据
-        return {
-            "file": metadata["file"],
-            "kg_triplet": json.loads(metadata["kg_triplet"]),
-            "bidirectional_mapping": {
-                "entity_to_label": dict(json.loads(metadata["bidirectional_mapping"])["entity_to_label"]),
-                "label_to_entities": defaultdict(list,
-                                                 json.loads(metadata["bidirectional_mapping"])["label_to_entities"])
-            },
-            "current_G": nx.node_link_graph(json.loads(metadata["current_G"])),
-            "Bolts": json.loads(metadata["Bolts"]),
-            "original_file_type": metadata.get("original_file_type", filename)  # 使用原始文件名
+        返回:
+            (CompactGraph, {字段: 解析后的JSON，旧状态缺少时为None})；文件不存在时返回 (None, None)
+        """
+        _, raw = self._load_raw_fields(filename, ["current_G", *fields])
+        if not raw or "current_G" not in raw:
+            return None, None
+        extras = {field: json.loads(raw[field]) if field in raw else None for field in fields}
+        return self._compact_from_json(raw["current_G"]), extras
+
+    @staticmethod
+    def _compact_from_json(value):
+        graph_data = json.loads(value)
+        if CompactGraph.is_compact(graph_data):
+            return CompactGraph.from_dict(graph_data)
+        return CompactGraph.from_networkx(nx.node_link_graph(graph_data))
+
+    def load_state(self, filename, fields=None):
+        """
+        从chromadb加载指定文件名的状态
+
+        参数:
+            filename: 文件ID
+            fields: 需要的字段（STATE_FIELDS的子集），为空时加载全部字段
+        返回:
+            {"file", "original_file_type", 以及请求的字段}，文件不存在时返回None
+        """
+        fields = list(self.STATE_FIELDS if fields is None else fields)
+        unknown = set(fields) - set(self.STATE_FIELDS)
+        if unknown:
+            raise ValueError(f"未知的状态字段: {', '.join(sorted(unknown))}")
+        head, raw = self._load_raw_fields(filename, fields)
+        if head is None:
+            return None
+
+        state = {
+            "file": head["file"],
+            "original_file_type": head.get("original_file_type", filename)  # 使用原始文件名
         }
+        # 反序列化数据
+        for field in fields:
+            state[field] = self._decode_field(field, raw.get(field))
+        return state
+
+    def _decode_field(self, field, value):
+        if value is None:
+            # 旧版本保存的状态可能没有来源索引和排名
+            return None
+        data = json.loads(value)
+        if field == "bidirectional_mapping":
+            return {
+                "entity_to_label": dict(data["entity_to_label"]),
+                "label_to_entities": defaultdict(list, data["label_to_entities"])
+            }
+        if field == "current_G":
+            return self._load_graph(data)
+        if field == "rankings":
+            return GraphRankings.from_dict(data)
+        return data
+
+    def load_rankings(self, filename):
+        """加载节点排名，旧版本保存的状态没有排名时由图谱计算，文件不存在时返回None"""
+        head, raw = self._load_raw_fields(filename, ["rankings"])
+        if head is None:
+            return None
+        if "rankings" in raw:
+            return GraphRankings.from_dict(json.loads(raw["rankings"]))
+        compact = self.load_compact_graph(filename)
+        return None if compact is None else GraphRankings.compute(compact)
+
+    @staticmethod
+    def _load_graph(graph_data):
+        """加载图谱：紧凑格式直接还原，旧版 node_link 格式去掉样式属性后还原"""
+        if CompactGraph.is_compact(graph_data):
+            return CompactGraph.from_dict(graph_data).to_networkx()
+        return CompactGraph.from_networkx(nx.node_link_graph(graph_data)).to_networkx()
 
     def delete_states(self, filenames: list):
         if not isinstance(filenames, list) or len(filenames) == 0:
@@ -132,19 +409,69 @@ class StoreTool:
         self.vector_collection.delete(
             where={"file": {"$in": filenames}}
         )
+        self.child_collection.delete(
+            where={"file": {"$in": filenames}}
+        )
+        self.state_fields.delete_files(filenames)
         self.collection.delete(ids=filenames)
+        self.entity_index.delete_files(filenames)
+        self.file_catalog.delete_files(filenames)
+        for filename in filenames:
+            self._bump_graph_version(filename)
         return "delete_states success"
 
-    def list_files(self):
-        """获取所有存储的文件信息"""
-        return self.collection.get()
+    def _child_chunks(self, bid: str, text: str):
+        """把父块切成嵌入模型与重排模型都能完整处理的子块"""
+        consumer = min(("embedder", "reranker"), key=lambda name: self.token_budget.consumer(name).capacity)
+        return self.token_budget.sub_chunks(consumer, bid, text)
+
+    def save_child_chunks(self, file: str, bolts: list):
+        """为父块生成检索子块并写入bolt_children"""
+        ids, documents, metadatas = [], [], []
+        for bid, text in bolts:
+            for child_id, child_text in self._child_chunks(bid, text):
+                ids.append(child_id)
+                documents.append(child_text)
+                metadatas.append({"file": file, "parent_id": bid})
+        if not ids:
+            return
+        # 先删除这些父块已有的子块（子块数量或ID格式变化时不留下旧子块）
+        self.child_collection.delete(
+            where={"$and": [{"file": file}, {"parent_id": {"$in": [bid for bid, _ in bolts]}}]})
+        self.child_collection.upsert(
+            ids=ids,
+            metadatas=metadatas,
+            embeddings=self.embedding_func(documents),
+            documents=documents
+        )
+
+    def delete_bolts(self, file: str, bids: list):
+        """删除指定父块及其检索子块"""
+        if not bids:
+            return
+        self.vector_collection.delete(where={"file": file}, ids=bids)
+        self.child_collection.delete(where={"$and": [{"file": file}, {"parent_id": {"$in": bids}}]})
+
+    def list_files(self, offset: int = 0, limit: int = None):
+        """
+        分页获取已存储的文件信息（来自文件目录，不读取图谱状态）
+
+        返回:
+            (文件记录列表, 文件总数)
+        """
+        return self.file_catalog.list(offset, limit), self.file_catalog.count()
+
+    def file_exists(self, filename) -> bool:
+        return self.file_catalog.exists(filename)
 
     # rerank 重拍 向量检索结果
     def rerank_with_bge(self,query: str, documents: list, ids: list,metadata:list, top_k: int = 3):
         if not documents:
             return []
 
-        # 准备query-doc对
+        # 准备query-doc对，超出重排模型上限的文档记录警告
+        for doc_id, doc in zip(ids, documents):
+            self.token_budget.check("reranker", doc, f"重排文档 {doc_id} ")
         pairs = [[query, doc] for doc in documents]
 
         # 使用bge-reranker计算分数
@@ -155,18 +482,25 @@ class StoreTool:
 
         # 将分数与文档组合并排序
         reranked_results = list(zip(documents, ids, metadata,scores))
-        reranked_results.sort(key=lambda x: x[2], reverse=True)
+        reranked_results.sort(key=lambda x: x[3], reverse=True)
 
         return reranked_results[:top_k]
 
     # 查询向量
-    def select_vectors(self, query: str, file: str, n_results: int = 3):
+    @staticmethod
+    def _file_filter(file):
+        """单个文件名或文件名列表 -> chromadb元数据过滤条件"""
+        if isinstance(file, (list, tuple)):
+            return {"file": {"$in": list(file)}}
+        return {"file": file}
+
+    def select_vectors(self, query: str, file, n_results: int = 3):
 
         """查询指定文件中最相似的文本块
 
         Args:
             query: 查询文本
-            file: 要过滤的文件名
+            file: 要过滤的文件名（传入列表时在这些文件中检索）
             n_results: 返回结果数量
 
         Returns:
@@ -180,10 +514,15 @@ class StoreTool:
         # 生成查询向量
         query_embedding = self.embedding_func([query])
 
-        # 执行带元数据过滤的相似度查询
+        # 优先在子块上检索与重排，命中后回溯父块作为上下文
+        parent_results = self._select_by_children(query, query_embedding, file, n_results)
+        if parent_results is not None:
+            return parent_results
+
+        # 没有子块的旧数据直接检索父块
         results = self.vector_collection.query(
             query_embeddings=query_embedding,
-            where={"file": file},  # 元数据过滤
+            where=self._file_filter(file),  # 元数据过滤
             n_results=n_results,
             include=["documents", "metadatas", "distances"]
         )
@@ -220,6 +559,48 @@ class StoreTool:
                 "distances": results["distances"][0]
             }
 
+    def _select_by_children(self, query: str, query_embedding, file: str, n_results: int):
+        """
+        子块检索：召回 n_results 的若干倍子块并重排，按父块聚合取最高分，返回前 n_results 个父块
+
+        Returns:
+            与 select_vectors 相同的结构（distances 为命中子块的重排分数），
+            该文件没有子块时返回 None
+        """
+        candidate_count = max(n_results * int(os.getenv("CHILD_CANDIDATE_FACTOR", "4")), 10)
+        results = self.child_collection.query(
+            query_embeddings=query_embedding,
+            where=self._file_filter(file),
+            n_results=candidate_count,
+            include=["documents", "metadatas"]
+        )
+        if not results["ids"] or not results["ids"][0]:
+            return None
+
+        parent_ids = [metadata["parent_id"] for metadata in results["metadatas"][0]]
+        reranked = self.rerank_with_bge(query, results["documents"][0], results["ids"][0], parent_ids,
+                                        len(parent_ids))
+
+        # 重排结果已按分数降序，每个父块保留第一次（最高分）命中
+        best = {}
+        for _, child_id, parent_id, score in reranked:
+            if parent_id not in best:
+                best[parent_id] = (child_id, score)
+            if len(best) >= n_results:
+                break
+
+        selected = list(best)
+        parents = self.vector_collection.get(ids=selected, include=["documents", "metadatas"])
+        parent_map = {pid: (doc, meta) for pid, doc, meta in
+                      zip(parents["ids"], parents["documents"], parents["metadatas"])}
+        selected = [pid for pid in selected if pid in parent_map]
+        return {
+            "ids": selected,
+            "documents": [parent_map[pid][0] for pid in selected],
+            "metadatas": [{**parent_map[pid][1], "matched_child": best[pid][0]} for pid in selected],
+            "distances": [best[pid][1] for pid in selected]
+        }
+
     def save_rag_history(self, filename, messages):
         """保存RAG对话历史到数据库
 
@@ -1,24 +1,48 @@
+import gzip
+import hashlib
+import json
 import os
 import random
-from community import community_louvain
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from dotenv import load_dotenv
+from OmniStore.GraphSnapshot import GraphSnapshot
+from OmniStore.GraphLevelOfDetail import GraphLevelOfDetail
+from KnowledgeGraphManager.GraphDiff import GraphDiff
+from KnowledgeGraphManager.GraphLayout import GraphLayout
 
 load_dotenv()  # 默认会加载根目录下的.env文件
 prompt_vision = os.getenv("PROMPTVISION")
 
 class  storeManager:
+    # 图谱快照缓存（storeManager按请求创建，缓存在进程内共享） file -> (版本号, GraphSnapshot)
+    _snapshot_cache = OrderedDict()
+    _snapshot_lock = threading.Lock()
+    # 节点排名缓存 file -> (版本号, GraphRankings)
+    _rankings_cache = OrderedDict()
+    # 图谱JSON（含布局）缓存 file -> (版本号, {"etag", "json", "gzip"})
+    _payload_cache = OrderedDict()
+    # 分级展示缓存（社区布局） file -> (快照, GraphLevelOfDetail)
+    _lod_cache = OrderedDict()
+    snapshot_cache_size = int(os.getenv("GRAPH_SNAPSHOT_CACHE_SIZE", "16"))
+
     def __init__(self,store,agent):
         self.store = store
         self.agent = agent
 
-    def list_files(self):
-        return self.store.list_files()
+    def list_files(self, offset=0, limit=None):
+        return self.store.list_files(offset, limit)
+
+    def file_exists(self, file):
+        return self.store.file_exists(file)
 
 
     def get_G(self, file):
         try:
-            state = self.store.load_state(file)
-            if state is None or 'current_G' not in state:
+            state = self.store.load_state(file, fields=["current_G"])
+            if state is None or state['current_G'] is None:
                 print(f"找不到文件的知识图谱状态: {file}")
                 return None
 
@@ -28,12 +52,110 @@ class  storeManager:
             print(f"加载知识图谱出错: {file}, 错误: {str(e)}")
             return None
 
+    def get_snapshot(self, file):
+        """获取文件图谱的只读CSR快照，图谱保存或删除后自动重建"""
+        version = self.store.graph_version(file)
+        with self._snapshot_lock:
+            cached = self._snapshot_cache.get(file)
+            if cached is not None and cached[0] == version:
+                self._snapshot_cache.move_to_end(file)
+                return cached[1]
+
+        try:
+            compact, extras = self.store.load_graph_extras(file, ["communities", "layout"])
+        except Exception as e:
+            print(f"加载知识图谱出错: {file}, 错误: {str(e)}")
+            return None
+        if compact is None:
+            print(f"找不到文件的知识图谱状态: {file}")
+            return None
+        snapshot = GraphSnapshot.from_compact(compact, extras["communities"], extras["layout"])
+
+        with self._snapshot_lock:
+            self._snapshot_cache[file] = (version, snapshot)
+            self._snapshot_cache.move_to_end(file)
+            while len(self._snapshot_cache) > self.snapshot_cache_size:
+                self._snapshot_cache.popitem(last=False)
+        return snapshot
+
+    def get_level_of_detail(self, file):
+        """获取文件图谱的分级展示对象（社区概览、社区/邻域展开），随快照一起失效"""
+        snapshot = self.get_snapshot(file)
+        if snapshot is None:
+            return None
+        with self._snapshot_lock:
+            cached = self._lod_cache.get(file)
+            if cached is not None and cached[0] is snapshot:
+                self._lod_cache.move_to_end(file)
+                return cached[1]
+
+        level_of_detail = GraphLevelOfDetail(snapshot)
+
+        with self._snapshot_lock:
+            self._lod_cache[file] = (snapshot, level_of_detail)
+            self._lod_cache.move_to_end(file)
+            while len(self._lod_cache) > self.snapshot_cache_size:
+                self._lod_cache.popitem(last=False)
+        return level_of_detail
+
+    def get_graph_payload(self, file):
+        """
+        获取前端查看器使用的图谱JSON（紧凑格式），按图谱版本缓存
+
+        返回:
+            {"etag": 内容哈希, "json": 字节串, "gzip": 预压缩的字节串}，文件不存在时返回None
+        """
+        version = self.store.graph_version(file)
+        with self._snapshot_lock:
+            cached = self._payload_cache.get(file)
+            if cached is not None and cached[0] == version:
+                self._payload_cache.move_to_end(file)
+                return cached[1]
+
+        compact, extras = self.store.load_graph_extras(file, ["layout"])
+        if compact is None:
+            print(f"找不到文件的知识图谱状态: {file}")
+            return None
+        graph_data = compact.to_dict()
+        layout = extras["layout"]
+        if layout and len(layout["x"]) == compact.number_of_nodes:
+            # 保存时计算好的布局（前端像素坐标），查看器可直接绘制而不做物理模拟
+            scale = GraphLayout.display_scale(compact.number_of_nodes)
+            graph_data["x"] = [round(x * scale, 1) for x in layout["x"]]
+            graph_data["y"] = [round(y * scale, 1) for y in layout["y"]]
+        body = json.dumps(graph_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        payload = {
+            # 以内容哈希作为ETag，进程重启后同一图谱的ETag不变
+            "etag": hashlib.blake2b(body, digest_size=16).hexdigest(),
+            "json": body,
+            "gzip": gzip.compress(body, compresslevel=6)
+        }
+
+        with self._snapshot_lock:
+            self._payload_cache[file] = (version, payload)
+            self._payload_cache.move_to_end(file)
+            while len(self._payload_cache) > self.snapshot_cache_size:
+                self._payload_cache.popitem(last=False)
+        return payload
+
+    def get_graph_diff(self, file, limit=None):
+        """
+        获取最近一次增量更新的图谱差异
+
+        返回:
+            {"summary", "nodes", "edges"}（按limit截取时另含 "truncated"），文件不存在或没有增量更新记录时返回None
+        """
+        state = self.store.load_state(file, fields=["diff"])
+        if state is None or state["diff"] is None:
+            return None
+        diff = state["diff"]
+        return diff if limit is None else GraphDiff.truncate(diff, limit)
+
     def get_n_entity(self,file,n):
-        # "bidirectional_mapping": {
-        #     "entity_to_label": dict(json.l
         try:
-            state = self.store.load_state(file)
-            if state is None or 'bidirectional_mapping' not in state:
+            # 只加载实体映射，不解析图谱与文本块
+            state = self.store.load_state(file, fields=["bidirectional_mapping"])
+            if state is None or state['bidirectional_mapping'] is None:
                 print(f"找不到文件的实体状态: {file}")
                 return None
 
@@ -46,23 +168,50 @@ class  storeManager:
             print(f"加载知识图谱出错: {file}, 错误: {str(e)}")
             return None
 
-    def edge_max_node(self,file,n):
-        current_g = self.get_G(file)
-        degrees = current_g.degree()
-        sorted_degrees = sorted(degrees, key=lambda x: x[1], reverse=True)
-        return sorted_degrees[:n]
+    def get_rankings(self, file):
+        """获取文件图谱的节点排名（保存图谱时预先计算），按图谱版本缓存"""
+        version = self.store.graph_version(file)
+        with self._snapshot_lock:
+            cached = self._rankings_cache.get(file)
+            if cached is not None and cached[0] == version:
+                self._rankings_cache.move_to_end(file)
+                return cached[1]
+
+        rankings = self.store.load_rankings(file)
+        if rankings is None:
+            print(f"找不到文件的知识图谱状态: {file}")
+            return None
+
+        with self._snapshot_lock:
+            self._rankings_cache[file] = (version, rankings)
+            self._rankings_cache.move_to_end(file)
+            while len(self._rankings_cache) > self.snapshot_cache_size:
+                self._rankings_cache.popitem(last=False)
+        return rankings
+
+    def edge_max_node(self,file,n,metric="degree"):
+        """
+        按指标返回排名前n的实体 [(实体, 分数)]
+
+        Args:
+            metric: degree（度数）、weighted_degree（加权度数）或 pagerank
+        """
+        rankings = self.get_rankings(file)
+        if rankings is None:
+            return None
+        return rankings.top(metric, n)
 
 
 
     def text2entity(self, query: str, file: str):
-        current_g = self.get_G(file)
-        # 添加对current_G为None的检查
-        if current_g is None:
+        snapshot = self.get_snapshot(file)
+        # 添加对图谱为None的检查
+        if snapshot is None:
             print(f"无法获取知识图谱数据: {file}")
             return []
 
         prompt = open(f"./prompt/{prompt_vision}/entity_q2merge.txt", encoding='utf-8').read()
-        entity = [str(i) for i in current_g]
+        entity = [str(i) for i in snapshot.nodes]
         input_parameter = f"实体列表：{entity}\n问题：{query}"
         output = self.agent.agent_safe_generate_response(prompt, input_parameter)
         return output.get("entities",[])
@@ -95,67 +244,200 @@ class  storeManager:
         Returns:
             知识库列表
         """
-        current_G = self.get_G(file)
-        if current_G is None:
+        snapshot = self.get_snapshot(file)
+        if snapshot is None:
             print(f"无法获取知识图谱数据进行社区检测: {file}")
             return []
 
-        knowledge_base = []
+        edge_ids, _ = self._community_edges(snapshot, entity_names, weight_threshold, top_n)
+
+        print(f"\nModularity of the entire graph: {snapshot.modularity}")
+
+        # 转换为知识库格式
+        return self._format_relations(snapshot, edge_ids)
+
+    def k_hop_G(self, file, entity_names, weight_threshold=0.3, top_n=20, max_hops=2):
+        """从种子实体逐跳扩展检索关系（见 _k_hop_edges）"""
+        snapshot = self.get_snapshot(file)
+        if snapshot is None:
+            print(f"无法获取知识图谱数据进行k跳检索: {file}")
+            return []
+        edge_ids, _ = self._k_hop_edges(snapshot, entity_names, weight_threshold, top_n, max_hops)
+        return self._format_relations(snapshot, edge_ids)
+
+    def ppr_G(self, file, entity_names, weight_threshold=0.3, top_n=20, max_hops=2):
+        """在种子实体的k跳邻域内做个性化PageRank检索关系（见 _ppr_edges）"""
+        snapshot = self.get_snapshot(file)
+        if snapshot is None:
+            print(f"无法获取知识图谱数据进行PageRank检索: {file}")
+            return []
+        edge_ids, _ = self._ppr_edges(snapshot, entity_names, weight_threshold, top_n, max_hops)
+        return self._format_relations(snapshot, edge_ids)
+
+    def graph_retrieve(self, file, entity_names, mode="community", weight_threshold=0.3, top_n=20, max_hops=2):
+        """
+        按检索模式从图谱中取关系
+
+        Args:
+            mode: community（社区检索）、ppr（个性化PageRank）或 khop（k跳扩展）
+            max_hops: ppr/khop 模式从种子实体向外扩展的最大跳数
+        """
+        if mode == "ppr":
+            return self.ppr_G(file, entity_names, weight_threshold, top_n, max_hops)
+        if mode == "khop":
+            return self.k_hop_G(file, entity_names, weight_threshold, top_n, max_hops)
+        return self.community_louvain_G(file, entity_names, weight_threshold, top_n)
+
+    def _retrieve_edges(self, snapshot, entity_names, mode, weight_threshold, top_n, max_hops):
+        """按检索模式返回 (边编号, 边得分)，得分已降序"""
+        if mode == "ppr":
+            return self._ppr_edges(snapshot, entity_names, weight_threshold, top_n, max_hops)
+        if mode == "khop":
+            return self._k_hop_edges(snapshot, entity_names, weight_threshold, top_n, max_hops)
+        return self._community_edges(snapshot, entity_names, weight_threshold, top_n)
+
+    @staticmethod
+    def _community_edges(snapshot, entity_names, weight_threshold, top_n):
+        """种子实体所在社区内、权重不低于阈值的边，按权重降序"""
+        # 执行社区检测（在整个图上，按图谱版本缓存）
+        partition = snapshot.partition()
 
-        # 执行社区检测（在整个图上）
-        partition = community_louvain.best_partition(current_G.to_undirected())
-        
         # 获取每个输入实体的社区编号
-        community_ids = set()
-        for entity in entity_names:
-            if entity in partition:
-                community_ids.add(partition[entity])
-
-        # 提取特定社区内的所有节点
-        community_nodes = [node for node, comm_id in partition.items() if comm_id in community_ids]
-
-        # 构建包含选定社区内所有节点的子图
-        subgraph = current_G.subgraph(community_nodes)
-
-        # 收集所有边信息并根据权重排序
-        edges_with_weight = []
-        for edge in subgraph.edges(data=True):
-            source, target = edge[0], edge[1]
-            edge_data = edge[2]
-            # 从边属性中获取数据
-            relation = edge_data.get('label', 'Unknown')
-            context = edge_data.get('title', 'No Context')
-            weight = edge_data.get('weight', 0.5)  # 获取权重，默认0.5
-            
-            # 只添加权重大于等于阈值的边
-            if weight >= weight_threshold:
-                edges_with_weight.append({
-                    'source': source,
-                    'target': target,
-                    'relation': relation,
-                    'context': context,
-                    'weight': weight
-                })
-        
-        # 按权重降序排序
-        edges_with_weight.sort(key=lambda x: x['weight'], reverse=True)
-        # print(edges_with_weight, "test")
-        # 如果指定了top_n，则只取前top_n个关系
+        community_ids = np.unique(partition[snapshot.ids(entity_names)])
+
+        # 提取特定社区内的所有节点，收集两端都在其中且权重大于等于阈值的边
+        community_mask = np.isin(partition, community_ids)
+        edge_ids = snapshot.edges_within(community_mask, min_weight=weight_threshold)
+
+        # 按权重降序排序，如果指定了top_n，则只取前top_n个关系
+        edge_ids = snapshot.top_edges(edge_ids, snapshot.weight[edge_ids], top_n)
+        return edge_ids, snapshot.weight[edge_ids]
+
+    @staticmethod
+    def _k_hop_edges(snapshot, entity_names, weight_threshold, top_n, max_hops, decay=0.5):
+        """
+        从种子实体逐跳扩展，边得分 = 相关度 × 权重，相关度 = decay^跳数
+
+        已收集的前top_n条边的最低分不低于下一跳可能达到的最高分时提前停止
+        """
+        empty = np.empty(0, dtype=np.int64), np.empty(0)
+        frontier = np.unique(snapshot.ids(entity_names))
+        if frontier.size == 0 or snapshot.number_of_edges == 0:
+            return empty
+
+        max_weight = float(snapshot.weight.max())
+        visited = np.zeros(snapshot.number_of_nodes, dtype=bool)
+        visited[frontier] = True
+        seen_edges = np.zeros(snapshot.number_of_edges, dtype=bool)
+        candidate_ids, candidate_scores = [], []
+        collected = 0
+        for hop in range(max(max_hops, 1)):
+            edge_ids = snapshot.edges_of(frontier)
+            edge_ids = edge_ids[~seen_edges[edge_ids]]
+            seen_edges[edge_ids] = True
+            kept = edge_ids[snapshot.weight[edge_ids] >= weight_threshold]
+            candidate_ids.append(kept)
+            candidate_scores.append(snapshot.weight[kept] * decay ** hop)
+            collected += len(kept)
+
+            if top_n > 0 and collected >= top_n:
+                scores = np.concatenate(candidate_scores)
+                kth_score = -np.partition(-scores, top_n - 1)[top_n - 1]
+                if kth_score >= max_weight * decay ** (hop + 1):
+                    break
+
+            neighbors = np.concatenate([snapshot.src[edge_ids], snapshot.dst[edge_ids]])
+            frontier = np.unique(neighbors[~visited[neighbors]])
+            visited[frontier] = True
+            if frontier.size == 0:
+                break
+
+        edge_ids, scores = np.concatenate(candidate_ids), np.concatenate(candidate_scores)
+        order = np.argsort(-scores, kind="stable")
+        edge_ids, scores = edge_ids[order], scores[order]
         if top_n > 0:
-            edges_with_weight = edges_with_weight[:top_n]
-        
-        # 转换为知识库格式
-        for edge in edges_with_weight:
-            knowledge_base.append(
-                f"Edge from {edge['source']} to {edge['target']}, Relation: {edge['relation']}, context:{edge['context']}, weight:{edge['weight']}"
-            )
+            edge_ids, scores = edge_ids[:top_n], scores[:top_n]
+        return edge_ids, scores
 
-        # 计算模块度
-        modularity = community_louvain.modularity(partition, current_G.to_undirected())
-        print(f"\nModularity of the entire graph: {modularity}")
+    @staticmethod
+    def _ppr_edges(snapshot, entity_names, weight_threshold, top_n, max_hops):
+        """在种子实体的k跳邻域内做个性化PageRank，边得分 = (两端节点得分之和) × 权重"""
+        seeds = np.unique(snapshot.ids(entity_names))
+        if seeds.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
 
-        return knowledge_base
+        node_mask = snapshot.k_hop_ids(seeds, max_hops) >= 0
+        rank = snapshot.personalized_pagerank(seeds, node_mask)
+        edge_ids = snapshot.edges_within(node_mask, min_weight=weight_threshold)
+        scores = (rank[snapshot.src[edge_ids]] + rank[snapshot.dst[edge_ids]]) * snapshot.weight[edge_ids]
+        order = snapshot.top_edges(np.arange(len(edge_ids)), scores, top_n)
+        return edge_ids[order], scores[order]
 
+    @staticmethod
+    def _format_relations(snapshot, edge_ids, prefix=""):
+        """边编号 -> 知识库格式的关系描述"""
+        return [
+            f"{prefix}Edge from {edge['source']} to {edge['target']}, Relation: {edge['relation']}, context:{edge['context']}, weight:{edge['weight']}"
+            for edge in snapshot.edge_records(edge_ids)
+        ]
 
+    def federated_text2entity(self, query: str, candidate_limit: int = 200):
+        """
+        跨文档实体识别：先用实体索引在问题中匹配已知实体作为候选，再由大模型筛选
 
+        Returns:
+            实体列表
+        """
+        candidates = self.store.entity_index.match_in_text(query, limit=candidate_limit)
+        if not candidates:
+            return []
+        prompt = open(f"./prompt/{prompt_vision}/entity_q2merge.txt", encoding='utf-8').read()
+        input_parameter = f"实体列表：{candidates}\n问题：{query}"
+        output = self.agent.agent_safe_generate_response(prompt, input_parameter)
+        if not isinstance(output, dict):
+            return candidates
+        return output.get("entities", []) or candidates
+
+    def federated_retrieve(self, entity_names, mode="community", weight_threshold=0.3, top_n=20, max_hops=2,
+                           max_documents=None):
+        """
+        跨文档图谱检索：只加载包含相关实体的文档图谱（并行），合并各文档的关系后按得分取前top_n
 
+        Args:
+            max_documents: 最多检索的文档数，默认取环境变量 FEDERATED_MAX_DOCUMENTS
+
+        Returns:
+            (涉及的文档列表, 知识库列表)，关系前带有 [文档名] 前缀
+        """
+        max_documents = max_documents or int(os.getenv("FEDERATED_MAX_DOCUMENTS", "8"))
+        documents = [file for file, _ in self.store.entity_index.documents_for(entity_names, max_documents)]
+        if not documents:
+            return [], []
+
+        def retrieve(file):
+            snapshot = self.get_snapshot(file)
+            if snapshot is None:
+                return file, None, np.empty(0, dtype=np.int64), np.empty(0)
+            edge_ids, scores = self._retrieve_edges(snapshot, entity_names, mode, weight_threshold, top_n, max_hops)
+            return file, snapshot, edge_ids, scores
+
+        with ThreadPoolExecutor(max_workers=min(len(documents), 8)) as executor:
+            results = list(executor.map(retrieve, documents))
+
+        # community/khop 的得分基于权重，各文档可直接比较；PageRank得分随图谱规模变化，按文档内最高分归一化
+        merged = []
+        for order, (file, snapshot, edge_ids, scores) in enumerate(results):
+            if snapshot is None or len(scores) == 0:
+                continue
+            if mode == "ppr" and scores.max() > 0:
+                scores = scores / scores.max()
+            merged.extend((score, order, file, snapshot, edge_id)
+                          for edge_id, score in zip(edge_ids.tolist(), scores.tolist()))
+        merged.sort(key=lambda x: (-x[0], x[1]))
+        if top_n > 0:
+            merged = merged[:top_n]
+
+        knowledge_base = []
+        for _, _, file, snapshot, edge_id in merged:
+            knowledge_base.extend(self._format_relations(snapshot, [edge_id], prefix=f"[{file}] "))
+        return documents, knowledge_base
@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable
+
+
+class CaptionCache:
+    """
+    图片描述缓存（SQLite）
+
+    功能特点：
+    1. 以 图片内容哈希 + 多模态模型名 为键保存描述，同一张图片（如每页重复的logo、页眉）只识别一次
+    2. 跨文件、跨进程重启持久保存，重新上传或增量更新同一文档时不再调用多模态模型
+    3. 批量查询，一次取出一个文档中全部已缓存的描述
+    """
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS captions ("
+                "image_hash TEXT NOT NULL, model TEXT NOT NULL, caption TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (image_hash, model))"
+            )
+
+    def get_many(self, image_hashes: Iterable[str], model: str) -> Dict[str, str]:
+        """返回 {图片哈希: 描述}，未缓存的图片不在结果中"""
+        image_hashes = list(image_hashes)
+        captions = {}
+        with self._lock:
+            # 分批查询，避免超出SQLite的参数数量上限
+            for start in range(0, len(image_hashes), 500):
+                batch = image_hashes[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT image_hash, caption FROM captions WHERE model = ? "
+                    f"AND image_hash IN ({', '.join('?' * len(batch))})",
+                    (model, *batch)
+                ).fetchall()
+                captions.update(rows)
+        return captions
+
+    def put(self, image_hash: str, model: str, caption: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO captions (image_hash, model, caption, created_at) VALUES (?, ?, ?, ?)",
+                (image_hash, model, caption, time.time())
+            )
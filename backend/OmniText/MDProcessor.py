@@ -52,7 +52,8 @@ class MDProcessor:
                 content = f.read()
             filename = os.path.basename(path)
             parsed = self._parse_qa_table(content)
-            self.results[filename] = parsed
+            # 没有问答表格时保留原始Markdown，交给结构感知分割器按标题切分
+            self.results[filename] = parsed if parsed else [content]
 
     def save_as_txt(self, combine: bool = False, output_path: Optional[str] = None):
         if not self.results:
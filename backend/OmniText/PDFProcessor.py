@@ -1,10 +1,17 @@
 import base64
 import camelot
+import concurrent.futures
+import hashlib
+import json
+import math
 import re
 import fitz
 import os
+from collections import defaultdict
 from typing import Union, List, Dict, Optional
 
+from OmniText.CaptionCache import CaptionCache
+
 # 兼容无tqdm环境
 try:
     from tqdm import tqdm
@@ -13,19 +20,32 @@ except ImportError:
 
 
 class PDFProcessor:
-    def __init__(self, output_dir: str = "output", image_dir: str = "images", vl_client=None):
+    # 页数不少于该值时按页范围分发到进程池并行提取
+    PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+    # 横线、竖线都不少于该数量的页面才交给camelot检测表格
+    TABLE_MIN_LINES = 3
+    # 表格缓存的格式版本（预扫描规则或缓存内容变化时递增）
+    TABLE_CACHE_VERSION = 1
+    # 宽或高小于该像素数的图片视为装饰性图片（图标、分隔线等），不调用多模态模型
+    CAPTION_MIN_SIZE = int(os.getenv("PDF_CAPTION_MIN_SIZE", "64"))
+
+    def __init__(self, output_dir: str = "output", image_dir: str = "images", vl_client=None,
+                 workers: Optional[int] = None, cache_dir: Optional[str] = None):
         self.output_dir = output_dir
         self.image_dir = image_dir
         self.results = {}  # 存储结构：{filename: content_list}
         self.vl_client = vl_client
+        # 页面提取的进程数，1 表示不使用进程池
+        self.workers = workers or int(os.getenv("PDF_WORKERS", "1"))
+        # 按文件内容哈希缓存的中间结果（如表格提取结果）
+        self.cache_dir = cache_dir or os.getenv("PDF_CACHE_DIR") or os.path.join(self.output_dir, ".cache")
+        # 多模态模型与并发识别的图片数
+        self.vl_model = os.getenv("VL_MODEL", "qwen-vl-max-latest")
+        self.vl_concurrency = int(os.getenv("VL_CONCURRENCY", "4"))
+        self._caption_cache: Optional[CaptionCache] = None
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.image_dir, exist_ok=True)
 
-    #  base 64 编码格式
-    def encode_image(self, image_path):
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode("utf-8")
-
     @staticmethod
     def _clean_text(text: str) -> str:
         return re.sub(r'\s+', ' ', text).strip() if isinstance(text, str) else text
@@ -91,6 +111,116 @@ class PDFProcessor:
         result = list(zip(*filtered_cols)) if filtered_cols else []
         return [list(row) for row in result]
 
+    @staticmethod
+    def _file_hash(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def _has_ruling_lines(cls, page) -> bool:
+        """页面的矢量绘图中是否有足够的横线与竖线（lattice表格由框线围成）"""
+        horizontal = vertical = 0
+        for drawing in page.get_drawings():
+            for item in drawing["items"]:
+                if item[0] == "re":
+                    horizontal += 2
+                    vertical += 2
+                elif item[0] == "l":
+                    p1, p2 = item[1], item[2]
+                    if abs(p1.y - p2.y) < 1:
+                        horizontal += 1
+                    elif abs(p1.x - p2.x) < 1:
+                        vertical += 1
+                if horizontal >= cls.TABLE_MIN_LINES and vertical >= cls.TABLE_MIN_LINES:
+                    return True
+        return False
+
+    def _extract_tables(self, pdf_path: str, candidate_pages: List[int]) -> List[Dict]:
+        """
+        只在预扫描选出的页面上用camelot提取表格（页数较多时分发到进程池），结果按文件哈希缓存
+
+        参数:
+            candidate_pages: 候选页码（从0开始，升序）
+        返回:
+            [{"page", "bbox", "data"}]，按页码顺序
+        """
+        if not candidate_pages:
+            tqdm.write("未发现表格框线，跳过表格提取")
+            return []
+
+        cache_path = os.path.join(self.cache_dir, "tables",
+                                  f"{self._file_hash(pdf_path)}-v{self.TABLE_CACHE_VERSION}.json")
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                tqdm.write(f"读取表格缓存失败: {str(e)}")
+
+        tqdm.write(f"在 {len(candidate_pages)} 个候选页面上提取表格")
+        workers = min(self.workers, len(candidate_pages))
+        step = max(1, math.ceil(len(candidate_pages) / (workers * 2)))
+        chunks = [candidate_pages[start:start + step] for start in range(0, len(candidate_pages), step)]
+        results: List[Optional[List[Dict]]] = [None] * len(chunks)
+        if workers > 1 and len(chunks) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(_read_tables, pdf_path, chunk): i for i, chunk in enumerate(chunks)}
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        tqdm.write(f"无法提取表格: {str(e)}")
+        else:
+            for i, chunk in enumerate(chunks):
+                try:
+                    results[i] = _read_tables(pdf_path, chunk)
+                except Exception as e:
+                    tqdm.write(f"无法提取表格: {str(e)}")
+
+        tables = [table for chunk in results if chunk for table in chunk]
+        if all(chunk is not None for chunk in results):
+            # 部分页面提取失败时不缓存，下次重新提取
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                temp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(tables, f, ensure_ascii=False)
+                os.replace(temp_path, cache_path)
+            except Exception as e:
+                tqdm.write(f"写入表格缓存失败: {str(e)}")
+        return tables
+
+    @staticmethod
+    def _assign_tables(blocks: List[Dict], tables: List[Dict]) -> List[Optional[int]]:
+        """
+        一次扫描找出每个块所在的表格编号（不在表格内为None）
+
+        块已按上边界排序；表格按上边界排序后依次加入活动列表，下边界已在当前块上方的表格移出，
+        块只与活动表格比较，取上边界最靠上的包含它的表格
+        """
+        order = sorted(tables, key=lambda t: t["fitz_bbox"][1])
+        active = []
+        next_table = 0
+        assigned = []
+        for block in blocks:
+            x0, y0, x1, y1 = block["bbox"]
+            while next_table < len(order) and order[next_table]["fitz_bbox"][1] <= y0:
+                active.append(order[next_table])
+                next_table += 1
+            if active:
+                active = [t for t in active if t["fitz_bbox"][3] >= y0]
+            match = None
+            for table in active:
+                t_bbox = table["fitz_bbox"]
+                if x0 >= t_bbox[0] and x1 <= t_bbox[2] and y1 <= t_bbox[3]:
+                    match = table["index"]
+                    break
+            assigned.append(match)
+        return assigned
+
     def _process_tables(self, detailed_tables):
         filtered = self._filter_empty_rows_cols(detailed_tables)
         if not filtered:
@@ -101,37 +231,226 @@ class PDFProcessor:
             markdown += "| " + " | ".join(row) + " |\n"
         return f"<table>\n{markdown}</table>"
 
-    def _extract_images(self, page, page_num):
+    @staticmethod
+    def _extract_images(page, images: Dict[str, Dict], xref_hashes: Dict[int, str]):
+        """
+        提取页面中的图片，图片内容按哈希保存在内存中（同一文档重复引用的图片只解码一次）
+
+        参数:
+            images: {图片哈希: {"data", "ext", "width", "height"}}，新图片写入其中
+            xref_hashes: {xref: 图片哈希}，已解码过的xref
+        返回:
+            [{"hash", "bbox"}]，同一图片在页面中出现多次时每处一项
+        """
         image_info_list = []
         image_blocks = page.get_images(full=True)
 
         for img in image_blocks:
             xref = img[0]
-            base_image = page.parent.extract_image(xref)
-            image_ext = base_image["ext"]
-            image_data = base_image["image"]
-            # TODO 可能多文件图片名会冲突，建议再加上文件名
-            image_filename = f"page_{page_num + 1}_img_{xref}.{image_ext}"
-            image_path = os.path.join(self.image_dir, image_filename)
-
-            with open(image_path, "wb") as img_file:
-                img_file.write(image_data)
+            image_hash = xref_hashes.get(xref)
+            if image_hash is None:
+                base_image = page.parent.extract_image(xref)
+                image_hash = hashlib.sha256(base_image["image"]).hexdigest()
+                xref_hashes[xref] = image_hash
+                images.setdefault(image_hash, {
+                    "data": base_image["image"],
+                    "ext": base_image["ext"],
+                    "width": base_image.get("width", 0),
+                    "height": base_image.get("height", 0)
+                })
 
             image_rects = page.get_image_rects(xref)
             for rect in image_rects:
+                # 与文本块一致为 (x0, y0, x1, y1)，四周各外扩2个单位
                 adj_bbox = (
                     max(0, rect.x0 - 2),
-                    max(0, rect.y1 - 2),
+                    max(0, rect.y0 - 2),
                     min(page.rect.width, rect.x1 + 2),
-                    min(page.rect.height, rect.y0 + 2)
+                    min(page.rect.height, rect.y1 + 2)
                 )
                 image_info_list.append({
-                    "path": image_path,
+                    "hash": image_hash,
                     "bbox": adj_bbox
                 })
 
         return image_info_list
 
+    def _save_image(self, image_hash: str, image: Dict) -> str:
+        """按内容哈希保存图片（跨文档去重，已存在时不重复写入），返回路径"""
+        image_path = os.path.join(self.image_dir, f"{image_hash}.{image['ext']}")
+        if not os.path.exists(image_path):
+            temp_path = f"{image_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as img_file:
+                img_file.write(image["data"])
+            os.replace(temp_path, image_path)
+        return image_path
+
+    @classmethod
+    def _extract_page(cls, doc, page_num: int, images: Dict[str, Dict], xref_hashes: Dict[int, str]) -> Dict:
+        """
+        提取单页的结构化块（文本块与图片块，按从上到下、从左到右排序），图片块只记录图片哈希
+
+        返回:
+            {"page", "height", "blocks": [{"type", "bbox", "content"}], "table_candidate": 是否可能含有表格}，
+            页面处理失败时另含 "error"
+        """
+        try:
+            page = doc.load_page(page_num)
+
+            try:
+                text_blocks = page.get_text("blocks")
+            except Exception as e:
+                tqdm.write(f"页面 {page_num + 1} 文本提取失败: {str(e)}")
+                text_blocks = []
+
+            try:
+                image_blocks = cls._extract_images(page, images, xref_hashes)
+            except Exception as e:
+                tqdm.write(f"页面 {page_num + 1} 图像提取失败: {str(e)}")
+                image_blocks = []
+
+            all_blocks = []
+            for block in text_blocks:
+                all_blocks.append({
+                    "type": "text",
+                    "bbox": (block[0], block[1], block[2], block[3]),
+                    "content": cls._clean_text(block[4])
+                })
+            for img in image_blocks:
+                all_blocks.append({
+                    "type": "image",
+                    "bbox": img["bbox"],
+                    "image": img["hash"]
+                })
+
+            all_blocks.sort(key=lambda x: (x["bbox"][1], x["bbox"][0]))
+
+            try:
+                table_candidate = cls._has_ruling_lines(page)
+            except Exception as e:
+                tqdm.write(f"页面 {page_num + 1} 表格预扫描失败: {str(e)}")
+                # 预扫描失败时交给camelot判断
+                table_candidate = True
+            return {"page": page_num, "height": page.rect.height, "blocks": all_blocks,
+                    "table_candidate": table_candidate}
+        except Exception as e:
+            return {"page": page_num, "height": 0, "blocks": [], "error": str(e)}
+
+    def _extract_pages(self, pdf_path: str, doc):
+        """
+        按页提取结构化块，页数较多时分发到进程池
+
+        返回:
+            (按页码顺序的页面列表, {图片哈希: 图片内容与信息})
+        """
+        page_count = len(doc)
+        workers = min(self.workers, page_count)
+        with tqdm(total=page_count, desc=f"处理 {os.path.basename(pdf_path)}",
+                  leave=False, unit='page') as page_pbar:
+            if workers > 1 and page_count >= self.PARALLEL_MIN_PAGES:
+                try:
+                    return self._extract_pages_parallel(pdf_path, page_count, workers, page_pbar)
+                except Exception as e:
+                    tqdm.write(f"并行提取页面失败，改为逐页处理: {str(e)}")
+
+            pages = []
+            images = {}
+            xref_hashes = {}
+            for page_num in range(page_count):
+                pages.append(self._extract_page(doc, page_num, images, xref_hashes))
+                page_pbar.update(1)
+            return pages, images
+
+    def _extract_pages_parallel(self, pdf_path: str, page_count: int, workers: int, page_pbar):
+        # 页范围的段数多于进程数，各页耗时不均时负载更平衡
+        step = max(1, math.ceil(page_count / (workers * 4)))
+        pages = [None] * page_count
+        images = {}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_extract_page_range, pdf_path, start, min(start + step, page_count)): start
+                for start in range(0, page_count, step)
+            }
+            for future in concurrent.futures.as_completed(futures):
+                start = futures[future]
+                result, range_images = future.result()
+                pages[start:start + len(result)] = result
+                images.update(range_images)
+                page_pbar.update(len(result))
+        return pages, images
+
+    def _caption_images(self, images: Dict[str, Dict]) -> Dict[str, str]:
+        """
+        并发识别图片内容（图片已按内容哈希去重），跳过过小的装饰性图片，已缓存的描述直接使用
+
+        参数:
+            images: {图片哈希: {"data", "ext", "width", "height"}}
+        返回:
+            {图片哈希: 描述}，识别失败的图片不在结果中
+        """
+        unique = {image_hash: image for image_hash, image in images.items()
+                  if image["width"] >= self.CAPTION_MIN_SIZE and image["height"] >= self.CAPTION_MIN_SIZE}
+        if not unique:
+            return {}
+
+        if self._caption_cache is None:
+            self._caption_cache = CaptionCache(os.path.join(self.cache_dir, "captions.sqlite3"))
+        captions = self._caption_cache.get_many(unique, self.vl_model)
+        missing = [image_hash for image_hash in unique if image_hash not in captions]
+        tqdm.write(f"不重复的图片 {len(images)} 张，跳过小图后 {len(unique)} 张，"
+                   f"缓存命中 {len(captions)} 张，需识别 {len(missing)} 张")
+        if not missing:
+            return captions
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.vl_concurrency, len(missing))) as executor:
+            futures = {executor.submit(self._caption_image, unique[image_hash]): image_hash
+                       for image_hash in missing}
+            for future in concurrent.futures.as_completed(futures):
+                image_hash = futures[future]
+                try:
+                    caption = future.result()
+                except Exception as e:
+                    # 识别失败时回退到不处理图片
+                    tqdm.write(f"图片处理失败: {str(e)}")
+                    continue
+                if caption:
+                    captions[image_hash] = caption
+                    self._caption_cache.put(image_hash, self.vl_model, caption)
+        return captions
+
+    def _caption_image(self, image: Dict) -> str:
+        """调用多模态模型识别单张图片（直接编码内存中的图片内容）"""
+        base64_image = base64.b64encode(image["data"]).decode("utf-8")
+        completion = self.vl_client.chat.completions.create(
+            model=self.vl_model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": [{"type": "text", "text": "You are a helpful assistant."}]},
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image_url",
+                            # 需要注意，传入Base64，图像格式（即image/{format}）需要与支持的图片列表中的Content Type保持一致。"f"是字符串格式化的方法。
+                            # PNG图像：  f"data:image/png;base64,{base64_image}"
+                            # JPEG图像： f"data:image/jpeg;base64,{base64_image}"
+                            # WEBP图像： f"data:image/webp;base64,{base64_image}"
+                            "image_url": {"url": f"data:image/{image['ext'].lower()};base64,{base64_image}"},
+                        },
+                        {"type": "text", "text": '''
+                                    你是一个笔记图像理解助手，图片表达了什么? 请遵循以下指南：
+                                    - 不要解释任何图中文字的概念
+                                    - 用最简练的话告诉我图像的主要内容
+                                    - 如果是图表请告诉我表的数据
+                                    - 告诉我图片类型就不要继续解释这类图片的特点了，例如：知识图谱，照片，柱状图，表格等
+                                    '''},
+                    ],
+                }
+            ],
+        )
+        return completion.choices[0].message.content
+
     def _process_pdf(self, pdf_path: str, use_img2txt: bool = False) -> List[str]:
         # 确保use_img2txt是布尔类型
         if isinstance(use_img2txt, str):
@@ -142,195 +461,95 @@ class PDFProcessor:
 
         tqdm.write(f"处理PDF {os.path.basename(pdf_path)} 使用图片文本识别: {use_img2txt}")
 
-        try:
-            tables = camelot.read_pdf(pdf_path, pages='all', flavor='lattice')
-        except Exception as e:
-            tqdm.write(f"无法提取表格: {str(e)}")
-            tables = []  # 使用空列表表示无法提取表格
-
         try:
             doc = fitz.open(pdf_path)
         except Exception as e:
             tqdm.write(f"无法打开PDF文件: {str(e)}")
             return [f"无法处理文件 {os.path.basename(pdf_path)}: {str(e)}"]
 
+        try:
+            pages, images = self._extract_pages(pdf_path, doc)
+        finally:
+            doc.close()
+
+        # 只在有表格框线的页面上检测表格，纯文本PDF不调用camelot
+        tables = self._extract_tables(pdf_path, [page["page"] for page in pages if page.get("table_candidate")])
+        # 表格按页分组（一次遍历）
+        tables_by_page = defaultdict(list)
+        for idx, table in enumerate(tables):
+            tables_by_page[table["page"]].append({"bbox": tuple(table["bbox"]), "index": idx})
         full_content = []
-        table_meta = []
 
-        if tables and len(tables) > 0:
-            for idx, table in enumerate(tables):
-                try:
-                    page_num = int(table.parsing_report['page']) - 1
-                    x1, y1, x2, y2 = table._bbox
-                    table_meta.append({
-                        "page": page_num,
-                        "bbox": (x1, y1, x2, y2),
-                        "index": idx
-                    })
-                except Exception as e:
-                    tqdm.write(f"处理表格信息失败: {str(e)}")
-                    # 继续处理下一个表格
+        for page in pages:
+            page_num = page["page"]
+            if "error" in page:
+                tqdm.write(f"处理页面 {page_num + 1} 时出错: {page['error']}")
+                full_content.append({
+                    "type": "text",
+                    "content": f"[页面 {page_num + 1} 处理失败: {page['error']}]"
+                })
+                continue
+
+            page_height = page["height"]
+            current_tables = []
+            for table in tables_by_page.get(page_num, ()):
+                # camelot坐标原点在左下角，转换为fitz的左上角坐标
+                x1, y1, x2, y2 = table["bbox"]
+                current_tables.append({
+                    "fitz_bbox": (x1, page_height - y2, x2, page_height - y1),
+                    "index": table["index"]
+                })
 
-        # 添加页面处理进度条
-        with tqdm(total=len(doc), desc=f"处理 {os.path.basename(pdf_path)}",
-                  leave=False, unit='page') as page_pbar:
-            for page_num in range(len(doc)):
-                try:
-                    page = doc.load_page(page_num)
-                    page_rect = page.rect
-                    page_height = page_rect.height
-
-                    current_tables = []
-                    for table in table_meta:
-                        if table["page"] == page_num:
-                            x1, y1, x2, y2 = table["bbox"]
-                            fitz_bbox = (
-                                x1,
-                                page_height - y2,
-                                x2,
-                                page_height - y1
-                            )
-                            current_tables.append({
-                                "fitz_bbox": fitz_bbox,
-                                "index": table["index"]
-                            })
+            processed_tables = set()
+            block_tables = self._assign_tables(page["blocks"], current_tables)
+            for block, table_index in zip(page["blocks"], block_tables):
+                block_bbox = block["bbox"]
 
-                    try:
-                        text_blocks = page.get_text("blocks")
-                    except Exception as e:
-                        tqdm.write(f"页面 {page_num + 1} 文本提取失败: {str(e)}")
-                        text_blocks = []
+                if block_bbox[1] < page_height * 0.07:
+                    continue
 
-                    try:
-                        image_blocks = self._extract_images(page, page_num)
-                    except Exception as e:
-                        tqdm.write(f"页面 {page_num + 1} 图像提取失败: {str(e)}")
-                        image_blocks = []
-
-                    all_blocks = []
-                    for block in text_blocks:
-                        all_blocks.append({
+                if table_index is not None:
+                    if table_index not in processed_tables:
+                        full_content.append({"type": "table", "index": table_index})
+                        processed_tables.add(table_index)
+                else:
+                    if block["type"] == "text" and block["content"]:
+                        full_content.append({
                             "type": "text",
-                            "bbox": (block[0], block[1], block[2], block[3]),
-                            "content": self._clean_text(block[4])
+                            "content": block["content"]
                         })
-                    for img in image_blocks:
-                        all_blocks.append({
+                    elif block["type"] == "image":
+                        full_content.append({
                             "type": "image",
-                            "bbox": img["bbox"],
-                            "content": f"<image>{img['path']}</image>"
+                            "image": block["image"]
                         })
 
-                    all_blocks.sort(key=lambda x: (x["bbox"][1], x["bbox"][0]))
-
-                    processed_tables = set()
-                    for block in all_blocks:
-                        block_bbox = block["bbox"]
-
-                        if block_bbox[1] < page_rect.height * 0.07:
-                            continue
-
-                        in_table = False
-                        for table in sorted(current_tables, key=lambda t: t["fitz_bbox"][1]):
-                            t_bbox = table["fitz_bbox"]
-                            if (block_bbox[0] >= t_bbox[0] and
-                                    block_bbox[2] <= t_bbox[2] and
-                                    block_bbox[1] >= t_bbox[1] and
-                                    block_bbox[3] <= t_bbox[3]):
-                                if table["index"] not in processed_tables:
-                                    full_content.append({"type": "table", "index": table["index"]})
-                                    processed_tables.add(table["index"])
-                                in_table = True
-                                break
-
-                        if not in_table:
-                            if block["type"] == "text" and block["content"]:
-                                full_content.append({
-                                    "type": "text",
-                                    "content": block["content"]
-                                })
-                            elif block["type"] == "image":
-                                full_content.append({
-                                    "type": "image",
-                                    "content": block["content"]
-                                })
-                except Exception as e:
-                    tqdm.write(f"处理页面 {page_num + 1} 时出错: {str(e)}")
-                    full_content.append({
-                        "type": "text",
-                        "content": f"[页面 {page_num + 1} 处理失败: {str(e)}]"
-                    })
-                finally:
-                    page_pbar.update(1)
+        captions = {}
+        if use_img2txt and self.vl_client is not None:
+            used = {item["image"] for item in full_content if item["type"] == "image"}
+            captions = self._caption_images({image_hash: images[image_hash] for image_hash in used})
 
         final_output = []
-        table_index = 0
         for item in full_content:
             if item["type"] == "text":
                 final_output.append(item["content"])
             elif item["type"] == "image":
-                if use_img2txt and self.vl_client is not None:
-                    # 对图片进行多模态处理
-                    try:
-                        # print(item["content"])
-                        input_string = item["content"]
-                        content = re.search(r'<image>(.*?)</image>', input_string).group(1)
-                        # 获取文件类型
-                        file_type = content.split('.')[-1].lower()
-                        # 将xxxx/test.png替换为你本地图像的绝对路径
-                        base64_image = self.encode_image(content)
-                        completion = self.vl_client.chat.completions.create(
-                            model="qwen-vl-max-latest",
-                            messages=[
-                                {
-                                    "role": "system",
-                                    "content": [{"type": "text", "text": "You are a helpful assistant."}]},
-                                {
-                                    "role": "user",
-                                    "content": [
-                                        {
-                                            "type": "image_url",
-                                            # 需要注意，传入Base64，图像格式（即image/{format}）需要与支持的图片列表中的Content Type保持一致。"f"是字符串格式化的方法。
-                                            # PNG图像：  f"data:image/png;base64,{base64_image}"
-                                            # JPEG图像： f"data:image/jpeg;base64,{base64_image}"
-                                            # WEBP图像： f"data:image/webp;base64,{base64_image}"
-                                            "image_url": {"url": f"data:image/{file_type};base64,{base64_image}"},
-                                        },
-                                        {"type": "text", "text": '''
-                                                    你是一个笔记图像理解助手，图片表达了什么? 请遵循以下指南：
-                                                    - 不要解释任何图中文字的概念
-                                                    - 用最简练的话告诉我图像的主要内容
-                                                    - 如果是图表请告诉我表的数据
-                                                    - 告诉我图片类型就不要继续解释这类图片的特点了，例如：知识图谱，照片，柱状图，表格等
-                                                    '''},
-                                    ],
-                                }
-                            ],
-                        )
-                        img_dcs = completion.choices[0].message.content
-                        result = f'<image>{img_dcs}</image>'
-                    except Exception as e:
-                        tqdm.write(f"图片处理失败: {str(e)}")
-                        # 如果处理失败，回退到不处理图片
-                        result = item["content"]
+                caption = captions.get(item["image"])
+                if caption is not None:
+                    final_output.append(f'<image>{caption}</image>')
                 else:
-                    result = item["content"]
-
-                final_output.append(result)
+                    # 未识别（关闭识别、装饰性图片或识别失败）时才保存图片文件，文本中保留图片路径
+                    final_output.append(f'<image>{self._save_image(item["image"], images[item["image"]])}</image>')
             elif item["type"] == "table":
-                if tables and table_index < len(tables):
-                    try:
-                        table = tables[table_index]
-                        processed = self._process_table_optimized(table.data)
-                        if not self._is_empty_table(processed):
-                            final_output.append(self._process_tables(processed))
-                        else:
-                            final_output.append("<table>表格解析失败</table>")
-                        table_index += 1
-                    except Exception as e:
-                        tqdm.write(f"处理表格索引 {table_index} 失败: {str(e)}")
-                        final_output.append("<table>表格解析出错</table>")
-                        table_index += 1
+                try:
+                    processed = self._process_table_optimized(tables[item["index"]]["data"])
+                    if not self._is_empty_table(processed):
+                        final_output.append(self._process_tables(processed))
+                    else:
+                        final_output.append("<table>表格解析失败</table>")
+                except Exception as e:
+                    tqdm.write(f"处理表格索引 {item['index']} 失败: {str(e)}")
+                    final_output.append("<table>表格解析出错</table>")
 
         if not final_output:
             # 如果没有成功提取任何内容，返回一个错误信息
@@ -457,4 +676,34 @@ class PDFProcessor:
                 combined.extend(content)
             return "\n".join(combined)
         else:
-            return {filename: "\n".join(content) for filename, content in self.results.items()}
\ No newline at end of file
+            return {filename: "\n".join(content) for filename, content in self.results.items()}
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int):
+    """
+    进程池任务：子进程中单独打开文档，提取 [start, end) 页的结构化块
+
+    返回:
+        (页面列表, {图片哈希: 图片内容与信息})，同一页范围内重复的图片只返回一份
+    """
+    images = {}
+    xref_hashes = {}
+    with fitz.open(pdf_path) as doc:
+        pages = [PDFProcessor._extract_page(doc, page_num, images, xref_hashes) for page_num in range(start, end)]
+    return pages, images
+
+
+def _read_tables(pdf_path: str, pages: List[int]) -> List[Dict]:
+    """用camelot提取指定页（从0开始）的表格，返回可序列化的页码、坐标与单元格（可在进程池中执行）"""
+    tables = camelot.read_pdf(pdf_path, pages=",".join(str(page + 1) for page in pages), flavor='lattice')
+    result = []
+    for table in tables:
+        try:
+            result.append({
+                "page": int(table.parsing_report['page']) - 1,
+                "bbox": list(table._bbox),
+                "data": table.data
+            })
+        except Exception as e:
+            tqdm.write(f"处理表格信息失败: {str(e)}")
+    return result
@@ -30,8 +30,9 @@ class CharacterTextSplitter:
                     chunk_text = remaining_text
                 else:
                     chunk_text = self.encoder.decode(tokens[:self.max_tokens])
+                chunk_text = chunk_text.strip()
                 bid = self._generate_block_id(chunk_text, chunk_counter, doc_id)
-                chunks.append((bid, chunk_text.strip()))
+                chunks.append((bid, chunk_text))
                 break
 
             # 提取当前块文本
@@ -45,9 +46,10 @@ class CharacterTextSplitter:
                 # 如果超出最大令牌数，按最大令牌数截断
                 chunk_text = self.encoder.decode(tokens[:self.max_tokens])
 
-            # 生成块ID并添加到结果
+            # 生成块ID并添加到结果（按返回的块文本生成，与并行分割时主进程重新编号的结果一致）
+            chunk_text = chunk_text.strip()
             bid = self._generate_block_id(chunk_text, chunk_counter, doc_id)
-            chunks.append((bid, chunk_text.strip()))
+            chunks.append((bid, chunk_text))
 
             # 更新位置和计数器
             chunk_counter += 1
@@ -55,6 +57,17 @@ class CharacterTextSplitter:
 
         return chunks
 
+    def hard_boundaries(self, text: str) -> List[int]:
+        """
+        返回分割结果一定会断开的位置（分隔符之后），供并行分割预分区使用
+        """
+        boundaries = []
+        pos = text.find(self.separator)
+        while pos != -1:
+            boundaries.append(pos + len(self.separator))
+            pos = text.find(self.separator, pos + len(self.separator))
+        return boundaries
+
     def _generate_block_id(self, text: str, counter: int, doc_id: Optional[str]) -> str:
         """生成块ID"""
         prefix = f"{doc_id}_" if doc_id else ""
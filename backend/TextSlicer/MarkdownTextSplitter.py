@@ -0,0 +1,221 @@
+import re
+import tiktoken
+from typing import List, Tuple, Optional, Dict
+
+
+class MarkdownTextSplitter:
+    """
+    Markdown结构感知分割器
+
+    功能特点：
+    1. 一次遍历解析标题树，代码块内的 # 不会被识别为标题
+    2. 以章节为单位打包，尽量不跨标题切分，章节超长时才在段落/列表/代码块边界切分
+    3. 每个块的token数只编码一次，打包时直接累加
+    4. 块元数据中携带标题路径（heading_path）
+    5. 一级标题与 </end> 标记视为硬边界，不会被合并到同一块中
+    """
+
+    HEADING_PATTERN = re.compile(r'^(#{1,6})[ \t]+(.*?)[ \t]*#*[ \t]*$')
+    FENCE_PATTERN = re.compile(r'^[ \t]*(`{3,}|~{3,})')
+
+    def __init__(self, max_tokens: int = 2048, min_tokens: int = 0, end_marker: str = "</end>",
+                 heading_separator: str = " > "):
+        """
+        参数:
+            max_tokens: 每个块的最大token数
+            min_tokens: 章节不足该token数时继续与后续章节合并
+            end_marker: 独占一行时视为硬边界的标记（MDProcessor问答输出使用 </end>）
+            heading_separator: 元数据中标题路径的连接符
+        """
+        self.encoder = tiktoken.get_encoding("cl100k_base")
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.end_marker = end_marker
+        self.heading_separator = heading_separator
+
+        if self.min_tokens >= self.max_tokens:
+            raise ValueError("min_tokens 必须小于 max_tokens")
+
+    def split_text(self, text: str, doc_id: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        按Markdown结构分割文本
+
+        参数:
+            text: 待分割的Markdown文本
+            doc_id: 可选文档标识符
+
+        返回:
+            元组列表 (块ID, 文本块)
+        """
+        return [(bid, chunk) for bid, chunk, _ in self.split_text_with_metadata(text, doc_id)]
+
+    def split_text_with_metadata(self, text: str, doc_id: Optional[str] = None) -> List[Tuple[str, str, Dict]]:
+        """
+        按Markdown结构分割文本并返回元数据
+
+        返回:
+            元组列表 (块ID, 文本块, {"heading_path": str})
+        """
+        sections = self._parse_sections(text)
+        chunks = []
+        for chunk_text, heading_path in self._pack_sections(sections):
+            bid = self._generate_block_id(chunk_text, len(chunks) + 1, doc_id)
+            chunks.append((bid, chunk_text, {"heading_path": self.heading_separator.join(heading_path)}))
+        return chunks
+
+    def hard_boundaries(self, text: str) -> List[int]:
+        """
+        返回一级标题所在行的起始位置（代码块内除外），供并行分割预分区使用
+
+        一级标题会清空标题路径且不与之前的章节合并，在此处分区与整体分割结果一致
+        """
+        boundaries = []
+        fence = None
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            if fence is not None:
+                if line.strip().startswith(fence):
+                    fence = None
+            else:
+                fence_match = self.FENCE_PATTERN.match(line)
+                if fence_match:
+                    fence = fence_match.group(1)
+                elif offset > 0 and line.startswith("#"):
+                    heading_match = self.HEADING_PATTERN.match(line.rstrip("\r\n"))
+                    if heading_match and len(heading_match.group(1)) == 1:
+                        boundaries.append(offset)
+            offset += len(line)
+        return boundaries
+
+    def _parse_sections(self, text: str) -> List[Dict]:
+        """
+        单次遍历解析章节
+
+        每个章节：{"path": [标题...], "blocks": [(文本, token数)], "hard": 是否以硬边界开头}
+        块为不可再分的单元：连续非空行（段落/列表/表格）或完整的代码块
+        """
+        sections = []
+        path = []
+        current = {"path": [], "blocks": [], "hard": True}
+        buffer = []
+        fence = None
+
+        def flush_buffer():
+            if buffer:
+                block = "\n".join(buffer).strip("\n")
+                if block.strip():
+                    current["blocks"].append((block, len(self.encoder.encode(block))))
+                buffer.clear()
+
+        for line in text.splitlines():
+            if fence is not None:
+                buffer.append(line)
+                if line.strip().startswith(fence):
+                    fence = None
+                    flush_buffer()
+                continue
+
+            fence_match = self.FENCE_PATTERN.match(line)
+            if fence_match:
+                flush_buffer()
+                fence = fence_match.group(1)
+                buffer.append(line)
+                continue
+
+            if self.end_marker and line.strip() == self.end_marker:
+                flush_buffer()
+                sections.append(current)
+                current = {"path": list(path), "blocks": [], "hard": True}
+                continue
+
+            heading_match = self.HEADING_PATTERN.match(line)
+            if heading_match:
+                flush_buffer()
+                sections.append(current)
+                level = len(heading_match.group(1))
+                path = path[:level - 1] + [heading_match.group(2)]
+                current = {"path": list(path), "blocks": [], "hard": level == 1}
+                current["blocks"].append((line.strip(), len(self.encoder.encode(line.strip()))))
+                continue
+
+            if line.strip():
+                buffer.append(line)
+            else:
+                flush_buffer()
+
+        # 未闭合的代码块按原样保留
+        flush_buffer()
+        sections.append(current)
+        return [section for section in sections if section["blocks"]]
+
+    def _pack_sections(self, sections: List[Dict]) -> List[Tuple[str, List[str]]]:
+        """把章节打包成不超过max_tokens的块，尽量在标题处切分"""
+        packed = []
+        current_blocks = []
+        current_tokens = 0
+        current_path = []
+
+        def flush():
+            nonlocal current_blocks, current_tokens
+            if current_blocks:
+                packed.append(("\n\n".join(current_blocks), current_path))
+            current_blocks = []
+            current_tokens = 0
+
+        for section in sections:
+            # 分隔符"\n\n"按1个token计
+            section_tokens = sum(tokens for _, tokens in section["blocks"]) + len(section["blocks"]) - 1
+
+            if current_blocks and (section["hard"] or current_tokens >= self.min_tokens or
+                                   current_tokens + 1 + section_tokens > self.max_tokens):
+                flush()
+
+            if section_tokens <= self.max_tokens:
+                if not current_blocks:
+                    current_path = section["path"]
+                current_blocks.extend(block for block, _ in section["blocks"])
+                current_tokens += section_tokens + (1 if current_tokens else 0)
+                continue
+
+            # 章节超长：在块边界切分，续块沿用该章节的标题路径
+            flush()
+            current_path = section["path"]
+            for block, tokens in section["blocks"]:
+                if current_blocks and current_tokens + 1 + tokens > self.max_tokens:
+                    flush()
+                if tokens > self.max_tokens:
+                    for piece in self._split_oversized_block(block):
+                        packed.append((piece, current_path))
+                    continue
+                current_blocks.append(block)
+                current_tokens += tokens + (1 if current_tokens else 0)
+            flush()
+
+        flush()
+        return packed
+
+    def _split_oversized_block(self, block: str) -> List[str]:
+        """单个块超过max_tokens时先按行切分，单行仍超长则按token窗口硬切"""
+        pieces = []
+        lines = []
+        line_tokens = 0
+        for line in block.split("\n"):
+            tokens = self.encoder.encode(line)
+            if lines and line_tokens + len(tokens) + 1 > self.max_tokens:
+                pieces.append("\n".join(lines))
+                lines = []
+                line_tokens = 0
+            if len(tokens) > self.max_tokens:
+                for start in range(0, len(tokens), self.max_tokens):
+                    pieces.append(self.encoder.decode(tokens[start:start + self.max_tokens]))
+                continue
+            lines.append(line)
+            line_tokens += len(tokens) + (1 if len(lines) > 1 else 0)
+        if lines:
+            pieces.append("\n".join(lines))
+        return [piece for piece in pieces if piece.strip()]
+
+    def _generate_block_id(self, text: str, counter: int, doc_id: Optional[str]) -> str:
+        """生成块ID"""
+        prefix = f"{doc_id}_" if doc_id else ""
+        return f"{prefix}block_{counter}_{hash(text[:50])}"
@@ -0,0 +1,123 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _resident_memory_mb() -> Optional[float]:
+    """当前进程常驻内存（MB），无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        return rss_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModelRegistry:
+    """
+    进程级模型注册表
+
+    功能特点：
+    1. 按名称注册加载函数，首次使用时才加载
+    2. 同一进程内只加载一次，所有分割器与线程共享同一实例
+    3. 记录每个模型的加载耗时和加载前后的常驻内存变化
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """注册模型加载函数（不会立即加载）"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """获取模型，未加载时加载；并发请求同一模型时只有一个线程真正加载"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"模型未注册: {name}")
+            load_lock = self._load_locks[name]
+
+        with load_lock:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            rss_before = _resident_memory_mb()
+            start_time = time.time()
+            model = self._loaders[name]()
+            load_seconds = time.time() - start_time
+            rss_after = _resident_memory_mb()
+
+            self._models[name] = model
+            self._stats[name] = {
+                "load_seconds": round(load_seconds, 3),
+                "rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+                "loaded_at": time.time()
+            }
+            logger.info(f"模型 {name} 加载完成，耗时: {load_seconds:.2f}秒，"
+                        f"常驻内存增加: {self._stats[name]['rss_delta_mb']}MB")
+            return model
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def unload(self, name: str):
+        """释放模型，下次使用时重新加载"""
+        with self._lock:
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+
+    def stats(self) -> Dict:
+        """
+        返回注册表状态
+
+        返回:
+            {"pid": int, "rss_mb": float, "models": {name: {"loaded": bool, "load_seconds": float, ...}}}
+        """
+        with self._lock:
+            names = list(self._loaders)
+        models = {}
+        for name in names:
+            models[name] = {"loaded": name in self._models, **self._stats.get(name, {})}
+        rss = _resident_memory_mb()
+        return {
+            "pid": os.getpid(),
+            "rss_mb": round(rss, 1) if rss is not None else None,
+            "models": models
+        }
+
+
+def _load_sentence_model():
+    from sentence_transformers import SentenceTransformer
+    # return SentenceTransformer('bge-base-zh')
+    return SentenceTransformer('all-MiniLM-L6-v2')
+
+
+def _load_spacy_zh():
+    import spacy
+    return spacy.load("zh_core_web_sm")
+
+
+# 进程级单例：子进程（如进程池中的分割任务）各自按需加载一次
+model_registry = ModelRegistry()
+model_registry.register("all-MiniLM-L6-v2", _load_sentence_model)
+model_registry.register("zh_core_web_sm", _load_spacy_zh)
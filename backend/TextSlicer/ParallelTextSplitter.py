@@ -0,0 +1,108 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional, Dict
+
+# 进程池中每个工作进程持有的分割器（由initializer设置，只反序列化一次）
+_worker_splitter = None
+
+
+def _init_worker(splitter):
+    global _worker_splitter
+    _worker_splitter = splitter
+
+
+def _split_partition(text: str) -> List[Tuple[str, Dict]]:
+    return _split_with(_worker_splitter, text)
+
+
+def _split_with(splitter, text: str) -> List[Tuple[str, Dict]]:
+    """分割单个分区，只返回文本与元数据，块ID由主进程统一生成"""
+    if hasattr(splitter, "split_text_with_metadata"):
+        return [(chunk, metadata) for _, chunk, metadata in splitter.split_text_with_metadata(text)]
+    return [(chunk, {}) for _, chunk in splitter.split_text(text)]
+
+
+class ParallelTextSplitter:
+    """
+    大文档并行分割器（包装任意分割器）
+
+    功能特点：
+    1. 在分割器声明的硬边界（hard_boundaries()，分割结果一定会断开的位置）处预分区
+    2. 相邻小分区合并到 min_partition_chars 以上，减少进程间传输
+    3. 分区在进程池中分割，主进程按原顺序拼接并重新编号生成块ID，结果与直接调用该分割器一致
+    4. 分割器没有声明硬边界时（如 SimpleTextSplitter、SemanticTextSplitter 的块间重叠与块长会跨越任意位置），
+       直接串行调用该分割器，不做预分区
+    """
+
+    def __init__(self, splitter, max_workers: int = 4, min_partition_chars: int = 20000,
+                 parallel_threshold: int = 200000):
+        """
+        参数:
+            splitter: 实际执行分割的分割器（需可被pickle）
+            max_workers: 进程池大小，小于2时始终串行
+            min_partition_chars: 合并后每个分区的最小字符数
+            parallel_threshold: 文本字符数达到该值才启用进程池
+        """
+        self.splitter = splitter
+        self.max_workers = max_workers
+        self.min_partition_chars = min_partition_chars
+        self.parallel_threshold = parallel_threshold
+
+    def split_text(self, text: str, doc_id: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        分割文本
+
+        返回:
+            元组列表 (块ID, 文本块)
+        """
+        return [(bid, chunk) for bid, chunk, _ in self.split_text_with_metadata(text, doc_id)]
+
+    def split_text_with_metadata(self, text: str, doc_id: Optional[str] = None) -> List[Tuple[str, str, Dict]]:
+        """
+        分割文本并返回元数据
+
+        返回:
+            元组列表 (块ID, 文本块, 元数据)
+        """
+        if not hasattr(self.splitter, "hard_boundaries"):
+            # 无法安全预分区，整篇交给分割器，块ID与元数据保持原样
+            if hasattr(self.splitter, "split_text_with_metadata"):
+                return self.splitter.split_text_with_metadata(text, doc_id)
+            return [(bid, chunk, {}) for bid, chunk in self.splitter.split_text(text, doc_id)]
+
+        partitions = self._partition(text)
+
+        if self.max_workers > 1 and len(partitions) > 1 and len(text) >= self.parallel_threshold:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(partitions)),
+                                     initializer=_init_worker, initargs=(self.splitter,)) as executor:
+                results = list(executor.map(_split_partition, partitions))
+        else:
+            results = [_split_with(self.splitter, partition) for partition in partitions]
+
+        # 按分区顺序拼接并连续编号
+        chunks = []
+        for partition_chunks in results:
+            for chunk, metadata in partition_chunks:
+                bid = self._generate_block_id(chunk, len(chunks) + 1, doc_id)
+                chunks.append((bid, chunk, metadata))
+        return chunks
+
+    def _partition(self, text: str) -> List[str]:
+        """在分割器声明的硬边界处切分文本，并合并过小的相邻分区"""
+        boundaries = self.splitter.hard_boundaries(text)
+
+        partitions = []
+        start = 0
+        for boundary in boundaries:
+            if boundary - start >= self.min_partition_chars:
+                partitions.append(text[start:boundary])
+                start = boundary
+        if start < len(text):
+            partitions.append(text[start:])
+        return partitions
+
+    def _generate_block_id(self, text: str, counter: int, doc_id: Optional[str]) -> str:
+        """生成块ID（与被包装分割器保持同一规则）"""
+        if hasattr(self.splitter, "_generate_block_id"):
+            return self.splitter._generate_block_id(text, counter, doc_id)
+        prefix = f"{doc_id}_" if doc_id else ""
+        return f"{prefix}block_{counter}_{hash(text[:50])}"
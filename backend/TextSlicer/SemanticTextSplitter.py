@@ -1,9 +1,8 @@
 import re
 from typing import Optional, List, Tuple
 import numpy as np
-import spacy
 import tiktoken
-from sentence_transformers import SentenceTransformer
+from TextSlicer.ModelRegistry import model_registry
 
 
 class SemanticTextSplitter:
@@ -15,7 +14,7 @@ class SemanticTextSplitter:
     2. 实体边界保护
     3. 动态调整分割阈值
     4. 内容类型自适应
-    5. 预加载模型提高效率
+    5. 模型由进程级注册表懒加载并共享
     """
 
     SPLIT_PUNCTUATION = [
@@ -45,11 +44,8 @@ class SemanticTextSplitter:
         self.semantic_threshold = semantic_threshold
         self.enforce_entity_boundary = enforce_entity_boundary
 
-        # 预加载模型（单例）
+        # 语义模型与spacy模型由进程级注册表按需加载并在分割器之间共享
         self.encoder = tiktoken.get_encoding("cl100k_base")
-        # self.semantic_model = SentenceTransformer('bge-base-zh')
-        self.semantic_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.nlp = spacy.load("zh_core_web_sm")
 
         # 参数校验
         if self.min_tokens >= self.max_tokens:
@@ -57,6 +53,14 @@ class SemanticTextSplitter:
         if self.overlap_tokens >= self.min_tokens:
             raise ValueError("overlap_tokens 应小于 min_tokens")
 
+    @property
+    def semantic_model(self):
+        return model_registry.get("all-MiniLM-L6-v2")
+
+    @property
+    def nlp(self):
+        return model_registry.get("zh_core_web_sm")
+
     def split_text(self, text: str, doc_id: Optional[str] = None) -> List[Tuple[str, str]]:
         """
         分割文本方法
@@ -0,0 +1,181 @@
+import logging
+import os
+import re
+from typing import Dict, List, Tuple
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+
+class ConsumerBudget:
+    """
+    单个文本消费方（分割器/嵌入模型/重排模型/大模型）的分词器与长度上限
+
+    tokenizer 为 HuggingFace 分词器时使用模型自身的分词结果，
+    为空时使用 tiktoken（cl100k_base）近似计数
+    """
+
+    def __init__(self, name: str, limit: int, tokenizer=None, reserved: int = 0,
+                 encoding_name: str = "cl100k_base"):
+        """
+        参数:
+            name: 消费方名称
+            limit: 模型可接受的最大token数
+            tokenizer: HuggingFace分词器，为空时使用tiktoken
+            reserved: 需要预留的token数（特殊符号、查询文本、输出长度等）
+        """
+        self.name = name
+        self.limit = limit
+        self.reserved = reserved
+        self.tokenizer = tokenizer
+        self.encoder = tiktoken.get_encoding(encoding_name) if tokenizer is None else None
+
+    @property
+    def capacity(self) -> int:
+        """实际可用于正文的token数"""
+        return max(1, self.limit - self.reserved)
+
+    def count(self, text: str) -> int:
+        if self.tokenizer is not None:
+            return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+        return len(self.encoder.encode(text))
+
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        """返回每个token在原文中的字符区间 [(start, end), ...]"""
+        if self.tokenizer is not None:
+            try:
+                encoded = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+                return [tuple(span) for span in encoded["offset_mapping"]]
+            except (NotImplementedError, ValueError, KeyError):
+                # 慢速分词器不支持offset，退回tiktoken近似
+                pass
+        encoder = self.encoder or tiktoken.get_encoding("cl100k_base")
+        tokens = encoder.encode(text)
+        _, starts = encoder.decode_with_offsets(tokens)
+        ends = starts[1:] + [len(text)]
+        return list(zip(starts, ends))
+
+
+class TokenBudget:
+    """
+    统一的分块token预算
+
+    功能特点：
+    1. 记录每个消费方的分词器与上限，计数与模型实际看到的一致
+    2. 按消费方的分词器把文本切成恰好放得下的子块（优先在标点/换行处切分）
+    3. 超限时记录警告，不再静默截断
+    4. 根据大模型上下文与提示词长度给出分割器可用的最大块大小
+    """
+
+    SNAP_PATTERN = re.compile(r'\n|[。！？；.!?;]')
+
+    def __init__(self, consumers: Dict[str, ConsumerBudget]):
+        self.consumers = consumers
+
+    @classmethod
+    def from_env(cls, embedding_model=None, rerank_tokenizer=None):
+        """
+        根据环境变量与已加载的模型构建预算
+
+        参数:
+            embedding_model: SentenceTransformer实例（使用其tokenizer与max_seq_length）
+            rerank_tokenizer: 重排模型的分词器
+        """
+        consumers = {
+            "splitter": ConsumerBudget("splitter", int(os.getenv("SPLIT_MAX_TOKENS", "2048"))),
+            "llm": ConsumerBudget(
+                "llm",
+                int(os.getenv("LLM_CONTEXT_TOKENS", "32768")),
+                reserved=int(os.getenv("LLM_OUTPUT_TOKENS", "4096"))
+            ),
+        }
+
+        if embedding_model is not None and getattr(embedding_model, "tokenizer", None) is not None:
+            # [CLS] 与 [SEP]
+            consumers["embedder"] = ConsumerBudget("embedder", embedding_model.max_seq_length,
+                                                   tokenizer=embedding_model.tokenizer, reserved=2)
+        else:
+            consumers["embedder"] = ConsumerBudget("embedder", 512, reserved=2)
+
+        # 查询文本预留 + [CLS] [SEP] [SEP]
+        rerank_query_tokens = int(os.getenv("RERANK_QUERY_TOKENS", "64"))
+        consumers["reranker"] = ConsumerBudget("reranker", 512, tokenizer=rerank_tokenizer,
+                                               reserved=rerank_query_tokens + 3)
+        return cls(consumers)
+
+    def consumer(self, name: str) -> ConsumerBudget:
+        return self.consumers[name]
+
+    def count(self, consumer: str, text: str) -> int:
+        return self.consumers[consumer].count(text)
+
+    def fits(self, consumer: str, text: str) -> bool:
+        return self.count(consumer, text) <= self.consumers[consumer].capacity
+
+    def check(self, consumer: str, text: str, label: str = "") -> bool:
+        """检查文本是否放得下，放不下时记录警告（模型会截断的部分不会被看到）"""
+        budget = self.consumers[consumer]
+        tokens = budget.count(text)
+        if tokens > budget.capacity:
+            logger.warning(f"{label or '文本'}超出{budget.name}的token上限: {tokens} > {budget.capacity}，"
+                           f"超出部分将被模型截断")
+            return False
+        return True
+
+    def max_chunk_tokens(self, requested: int, prompt_tokens: int = 0) -> int:
+        """分割器块大小不超过大模型扣除提示词与输出预留后的剩余上下文"""
+        available = self.consumers["llm"].capacity - prompt_tokens
+        if requested > available:
+            logger.warning(f"分块大小 {requested} 超出大模型可用上下文，调整为 {available}")
+        return max(1, min(requested, available))
+
+    def split_to_fit(self, consumer: str, text: str, extra_reserved: int = 0) -> List[str]:
+        """
+        按消费方的分词器把文本切成每段都不超过上限的子块
+
+        单次分词得到每个token的字符区间，在窗口内最后一个标点/换行处切分，
+        找不到合适断点时按窗口硬切
+
+        参数:
+            extra_reserved: 在消费方预留之外再扣除的token数（如提示词长度）
+        """
+        budget = self.consumers[consumer]
+        capacity = max(1, budget.capacity - extra_reserved)
+        spans = budget.token_spans(text)
+        if len(spans) <= capacity:
+            return [text] if text.strip() else []
+
+        pieces = []
+        start_token = 0
+        while start_token < len(spans):
+            end_token = min(start_token + capacity, len(spans))
+            start_char = spans[start_token][0]
+            end_char = spans[end_token - 1][1] if end_token < len(spans) else len(text)
+
+            if end_token < len(spans):
+                # 只在窗口后半段寻找断点，避免产生过小的子块
+                snap_from = spans[start_token + capacity // 2][0]
+                last_break = None
+                for match in self.SNAP_PATTERN.finditer(text, snap_from, end_char):
+                    last_break = match.end()
+                if last_break is not None:
+                    while end_token > start_token + 1 and spans[end_token - 1][0] >= last_break:
+                        end_token -= 1
+                    # 以token边界结束，避免跨断点的token被截掉一半
+                    end_char = spans[end_token - 1][1]
+
+            piece = text[start_char:end_char].strip()
+            if piece:
+                pieces.append(piece)
+            start_token = end_token
+        return pieces
+
+    def sub_chunks(self, consumer: str, bid: str, text: str) -> List[Tuple[str, str]]:
+        """
+        把父块切成适合该消费方的子块
+
+        返回:
+            元组列表 (子块ID, 子块文本)，子块ID格式为 "{父块ID}#c{序号}"（与大模型切分片段的 "#p{序号}" 区分）
+        """
+        return [(f"{bid}#c{i}", piece) for i, piece in enumerate(self.split_to_fit(consumer, text), 1)]
@@ -51,12 +51,16 @@ class BgeZhEmbeddingFunction(EmbeddingFunction):
             raise RuntimeError("无法初始化嵌入模型") from e
 
     def _preprocess_texts(self, texts: Documents) -> List[str]:
-        """文本预处理"""
-        return [
-            # 移除多余空格并截断长度
-            " ".join(t.strip().split())[:512]  # BGE模型最大支持512 tokens
-            for t in texts
-        ]
+        """文本预处理：移除多余空格，超出模型token上限时记录警告（由模型按token截断）"""
+        processed = [" ".join(t.strip().split()) for t in texts]
+        max_tokens = self.model.max_seq_length - 2  # [CLS] [SEP]
+        for text in processed:
+            # 每个token至少覆盖一个字符，字符数不超过上限时无需分词计数
+            if len(text) > max_tokens:
+                tokens = len(self.model.tokenizer(text, add_special_tokens=False)["input_ids"])
+                if tokens > max_tokens:
+                    logger.warning(f"嵌入文本超出模型token上限: {tokens} > {max_tokens}，超出部分不会参与向量计算")
+        return processed
 
     def __call__(self, texts: Documents, **encode_params) -> Embeddings:
         """生成文本嵌入
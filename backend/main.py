@@ -1,13 +1,14 @@
 import asyncio
 from openai import OpenAI
 from pydantic import BaseModel
-from fastapi import FastAPI, File, UploadFile, BackgroundTasks, Form
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi import FastAPI, File, UploadFile, BackgroundTasks, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import time
 import shutil
 import logging
-from typing import Dict, List, Optional, AsyncGenerator
+from typing import Dict, List, Literal, Optional, AsyncGenerator
 from urllib.parse import quote
 from OmniStore.storeManager import storeManager
 from OmniText.PDFProcessor import PDFProcessor
@@ -16,10 +17,23 @@ from concurrent.futures import ThreadPoolExecutor
 import threading
 import json
 import uuid
-from collections import deque
+from collections import deque, OrderedDict
+import codecs
+import html
+import gzip
+import hashlib
 from dotenv import load_dotenv
 import os
 import os
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
 
 load_dotenv(dotenv_path="./.env")
@@ -43,6 +57,8 @@ class rag_item(BaseModel):
     top_k: int = 1
     weight_threshold: float = 0.3  # 添加权重阈值参数
     max_relations: int = 20  # 添加最大关系数量参数
+    retrieval_mode: Literal["community", "ppr", "khop"] = "community"  # 图谱检索模式：community（社区）/ ppr（个性化PageRank）/ khop（k跳扩展）
+    max_hops: int = 2  # ppr/khop 模式的最大扩展跳数
     filename: Optional[str] = None
     messages: Optional[List[Dict[str, str]]] = None  # 确保消息格式正确
     session_id: Optional[str] = None  # 会话ID，用于跟踪特定文件的对话
@@ -52,18 +68,34 @@ app = FastAPI(title="图谱笔记", description="大模型知识图谱笔记软
 
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER")
 TXT_FOLDER = os.getenv("TXT_FOLDER")
-RESULT_FOLDER = os.getenv("RESULT_FOLDER")
 
 PROCESS_STATUS: Dict[str, str] = {}
 
 # 确保目录存在
-for folder in [UPLOAD_FOLDER, TXT_FOLDER, RESULT_FOLDER]:
+for folder in [UPLOAD_FOLDER, TXT_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 
+# 前端静态资源（vis-network 与知识图谱查看器），浏览器可长期缓存
+LIB_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib")
+app.mount("/lib", StaticFiles(directory=LIB_FOLDER), name="lib")
+# 查看器页面只读取一次，/result 只注入接口地址与文件名
+with open(os.path.join(LIB_FOLDER, "graph-viewer", "index.html"), encoding="utf-8") as f:
+    GRAPH_VIEWER_TEMPLATE = f.read()
+# 节点数超过该值时查看器使用分级展示（社区概览 + 按需展开）
+GRAPH_LOD_NODE_THRESHOLD = int(os.getenv("GRAPH_LOD_NODE_THRESHOLD", "1500"))
+# /result 渲染结果（含预压缩版本）的缓存条数
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()
+RESULT_CACHE_LOCK = threading.Lock()
+# /file-content 流式读取的块大小与分页的默认/最大字节数
+FILE_CONTENT_CHUNK = 64 * 1024
+FILE_CONTENT_PAGE_LIMIT = int(os.getenv("FILE_CONTENT_PAGE_LIMIT", str(256 * 1024)))
+
 # 初始化知识图谱组件
 from OmniStore.chromadb_store import StoreTool
 from sentence_transformers import SentenceTransformer
 from KnowledgeGraphManager.KGManager import KgManager
+from KnowledgeGraphManager.GraphRankings import GraphRankings
 
 
 
@@ -81,6 +113,17 @@ else:
 
 # 创建两个独立的存储工具
 chromadb_store = StoreTool(storage_path= os.getenv("CHROMADB_PATH"), embedding_function=embeddings)
+# 后台任务不会在服务重启后继续，文件目录中上次未完成的记录改为失败
+interrupted = chromadb_store.file_catalog.fail_pending()
+if interrupted:
+    logger.warning(f"{interrupted} 个文件的处理在服务重启前未完成，状态已改为error")
+
+
+def set_file_status(base_name: str, status: str, filename: Optional[str] = None):
+    """更新文件处理状态：进程内状态表与文件目录（持久保存，列出文件时使用）"""
+    PROCESS_STATUS[base_name] = status
+    chromadb_store.file_catalog.set_status(base_name, status, filename)
+
 
 client = OpenAI(
     api_key=os.getenv("API_KEY"),
@@ -98,24 +141,65 @@ from LLM.Openai_Agent import OpenaiAgent
 rag_agent = OpenaiAgent(client)
 kg_agent = OpenaiAgent(client)
 
+
+def parse_extensions(value: str) -> set:
+    """解析分割器的文件类型配置（如 "[txt, .PDF]"），返回不带"."的小写扩展名集合"""
+    return {ext.strip().lstrip(".").lower() for ext in value.strip().strip("[]").split(",")} - {""}
+
+
 # 创建两个独立的splitter
-simple_files = os.getenv("SIMPLE", "").split(",")
-semantic_files = os.getenv("SEMANTIC", "").split(",")
-character_files = os.getenv("CHARACTER", "").split(",")
+simple_files = parse_extensions(os.getenv("SIMPLE", ""))
+semantic_files = parse_extensions(os.getenv("SEMANTIC", ""))
+character_files = parse_extensions(os.getenv("CHARACTER", ""))
+markdown_files = parse_extensions(os.getenv("MARKDOWN", ""))
+# 并行分割的进程数，1表示串行
+split_workers = int(os.getenv("SPLIT_WORKERS", "1"))
+
+# 分块大小受大模型上下文约束（扣除关系抽取提示词与输出预留）
+token_budget = chromadb_store.token_budget
+with open(f"./prompt/{os.getenv('PROMPTVISION')}/relationship_extraction2.txt", encoding='utf-8') as f:
+    split_max_tokens = token_budget.max_chunk_tokens(token_budget.consumer("splitter").limit,
+                                                     token_budget.count("llm", f.read()))
+split_min_tokens = min(1024, split_max_tokens // 2)
 
 # 初始化默认分割器
 kg_splitter = None
 
-# 创建默认分割器
-if len(simple_files) > 0:
-    from TextSlicer.SimpleTextSplitter import SimpleTextSplitter
-    kg_splitter = SimpleTextSplitter(2048, 1024)
-elif len(semantic_files) > 0:
+# 创建默认分割器（均未配置时使用简单分割器）
+if semantic_files and not simple_files:
     from TextSlicer.SemanticTextSplitter import SemanticTextSplitter
-    kg_splitter = SemanticTextSplitter(2048, 1024)
-elif len(character_files) > 0:
+    kg_splitter = SemanticTextSplitter(split_max_tokens, split_min_tokens)
+elif character_files and not simple_files:
     from TextSlicer.CharacterTextSplitter import CharacterTextSplitter
-    kg_splitter = CharacterTextSplitter(separator="</end>", keep_separator=False, max_tokens=2048, min_tokens=1024)
+    kg_splitter = CharacterTextSplitter(separator="</end>", keep_separator=False, max_tokens=split_max_tokens, min_tokens=split_min_tokens)
+else:
+    from TextSlicer.SimpleTextSplitter import SimpleTextSplitter
+    kg_splitter = SimpleTextSplitter(split_max_tokens, split_min_tokens)
+
+
+def select_splitter(file_ext: str):
+    """按文件扩展名选择文本分块器（未配置的类型使用默认分割器），并行分割时外包一层进程池分割器"""
+    ext = file_ext.lstrip(".").lower()
+    splitter = kg_splitter
+    if ext in simple_files:
+        from TextSlicer.SimpleTextSplitter import SimpleTextSplitter
+        splitter = SimpleTextSplitter(split_max_tokens, split_min_tokens)
+    elif ext in semantic_files:
+        from TextSlicer.SemanticTextSplitter import SemanticTextSplitter
+        splitter = SemanticTextSplitter(split_max_tokens, split_min_tokens)
+    elif ext in character_files:
+        from TextSlicer.CharacterTextSplitter import CharacterTextSplitter
+        splitter = CharacterTextSplitter(separator="</end>", keep_separator=False, max_tokens=split_max_tokens, min_tokens=split_min_tokens)
+    elif ext in markdown_files:
+        from TextSlicer.MarkdownTextSplitter import MarkdownTextSplitter
+        splitter = MarkdownTextSplitter(split_max_tokens, split_min_tokens)
+
+    # 大文档按分割器声明的硬边界预分区后在进程池中并行分割（未声明硬边界的分割器仍串行）
+    if split_workers > 1:
+        from TextSlicer.ParallelTextSplitter import ParallelTextSplitter
+        splitter = ParallelTextSplitter(splitter, max_workers=split_workers)
+    return splitter
+
 
 # 创建两个独立的kg_manager
 kg_manager = KgManager(agent=kg_agent, splitter=kg_splitter, embedding_model=embeddings, store=chromadb_store)
@@ -267,6 +351,60 @@ async def hybridrag_stream(item: rag_item):
         session_events[item.session_id] = asyncio.Event()
         session_responses[item.session_id] = {"status": "idle", "response": None}
 
+    async def answer_stream(community_info, results):
+        """由检索到的关系与文本块生成流式回答"""
+        loop = asyncio.get_event_loop()
+        # 准备流式输出
+        logger.info(f"使用流式输出模式: {item.request}")
+
+        # 创建响应流 - 使用hybrid_rag_stream函数，使用RAG专用线程池
+        try:
+            response_stream = await loop.run_in_executor(
+                rag_executor,
+                rag_agent.hybrid_rag_stream,
+                item.request,
+                community_info,
+                results,
+                item.messages
+            )
+
+            # 确保response_stream不为None
+            if response_stream is None:
+                raise ValueError("响应流生成失败")
+
+            # 处理流式响应
+            full_text = ""
+            for chunk in response_stream:
+                # 检查chunk是否为None
+                if chunk is None:
+                    continue
+
+                content = rag_agent.process_hybrid_rag_stream_chunk(chunk)
+                if content:
+                    full_text += content
+                    yield "data: " + json.dumps({
+                        "type": "content",
+                        "chunk": content,
+                        "full": full_text,
+                        "request_id": request_id
+                    }) + "\n\n"
+            # 处理最终结果
+            answer, material = rag_agent.extract_material_from_text(full_text)
+            # 发送最终结果
+            yield "data: " + json.dumps({
+                "type": "final",
+                "answer": answer,
+                "material": material,
+                "request_id": request_id
+            }) + "\n\n"
+        except Exception as e:
+            logger.error(f"处理响应流时出错: {str(e)}")
+            yield "data: " + json.dumps({
+                "type": "error",
+                "content": f"处理响应失败: {str(e)}",
+                "request_id": request_id
+            }) + "\n\n"
+
     async def stream_generator() -> AsyncGenerator[str, None]:
         try:
             loop = asyncio.get_event_loop()
@@ -299,9 +437,10 @@ async def hybridrag_stream(item: rag_item):
                             {"type": "status", "content": "实体识别完成", "request_id": request_id}) + "\n\n"
 
                         # 执行RAG流程 - 社区检测，使用RAG专用线程池
-                        community_info = await loop.run_in_executor(rag_executor, store_manager.community_louvain_G,
-                                                                    base_name, rag_entity, item.weight_threshold, 
-                                                                    item.max_relations)
+                        community_info = await loop.run_in_executor(rag_executor, store_manager.graph_retrieve,
+                                                                    base_name, rag_entity, item.retrieval_mode,
+                                                                    item.weight_threshold, item.max_relations,
+                                                                    item.max_hops)
                         if not community_info:  # 如果返回空列表
                             logger.warning(f"未能进行社区检测: {item.filename}")
                             community_info = []  # 确保是空列表而不是None
@@ -318,56 +457,8 @@ async def hybridrag_stream(item: rag_item):
                         yield "data: " + json.dumps(
                             {"type": "status", "content": "生成中...", "request_id": request_id}) + "\n\n"
 
-                        # 准备流式输出
-                        logger.info(f"使用流式输出模式: {item.request}")
-
-                        # 创建响应流 - 使用hybrid_rag_stream函数，使用RAG专用线程池
-                        try:
-                            response_stream = await loop.run_in_executor(
-                                rag_executor,
-                                rag_agent.hybrid_rag_stream,
-                                item.request,
-                                community_info,
-                                results,
-                                item.messages
-                            )
-
-                            # 确保response_stream不为None
-                            if response_stream is None:
-                                raise ValueError("响应流生成失败")
-
-                            # 处理流式响应
-                            full_text = ""
-                            for chunk in response_stream:
-                                # 检查chunk是否为None
-                                if chunk is None:
-                                    continue
-
-                                content = rag_agent.process_hybrid_rag_stream_chunk(chunk)
-                                if content:
-                                    full_text += content
-                                    yield "data: " + json.dumps({
-                                        "type": "content",
-                                        "chunk": content,
-                                        "full": full_text,
-                                        "request_id": request_id
-                                    }) + "\n\n"
-                            # 处理最终结果
-                            answer, material = rag_agent.extract_material_from_text(full_text)
-                            # 发送最终结果
-                            yield "data: " + json.dumps({
-                                "type": "final",
-                                "answer": answer,
-                                "material": material,
-                                "request_id": request_id
-                            }) + "\n\n"
-                        except Exception as e:
-                            logger.error(f"处理响应流时出错: {str(e)}")
-                            yield "data: " + json.dumps({
-                                "type": "error",
-                                "content": f"处理响应失败: {str(e)}",
-                                "request_id": request_id
-                            }) + "\n\n"
+                        async for message in answer_stream(community_info, results):
+                            yield message
                 else:
                     # 如果锁被占用，将请求入队
                     if item.session_id not in message_queues:
@@ -388,6 +479,34 @@ async def hybridrag_stream(item: rag_item):
                         "session_id": item.session_id,
                         "request_id": request_id
                     }) + "\n\n"
+            else:
+                # 未指定文件：通过跨文档实体索引检索整个知识库
+                logger.info(f"开始处理跨文档知识图谱查询: {item.request}")
+                yield "data: " + json.dumps(
+                    {"type": "status", "content": "开始处理", "request_id": request_id}) + "\n\n"
+
+                store_manager = storeManager(store=chromadb_store, agent=kg_agent)
+                rag_entity = await loop.run_in_executor(rag_executor, store_manager.federated_text2entity,
+                                                        item.request)
+                yield "data: " + json.dumps(
+                    {"type": "status", "content": "实体识别完成", "request_id": request_id}) + "\n\n"
+
+                documents, community_info = await loop.run_in_executor(
+                    rag_executor, store_manager.federated_retrieve, rag_entity, item.retrieval_mode,
+                    item.weight_threshold, item.max_relations, item.max_hops)
+                logger.info(f"跨文档检索涉及的文件: {documents}")
+                yield "data: " + json.dumps(
+                    {"type": "status", "content": "社区检测完成", "request_id": request_id}) + "\n\n"
+
+                results = []
+                if documents:
+                    results = await loop.run_in_executor(rag_executor, store_manager.select_vectors, item.request,
+                                                         documents, item.top_k)
+                yield "data: " + json.dumps(
+                    {"type": "status", "content": "生成中...", "request_id": request_id}) + "\n\n"
+
+                async for message in answer_stream(community_info, results):
+                    yield message
 
         except Exception as e:
             logger.error(f"流式处理出错: {str(e)}", exc_info=True)  # 添加详细错误堆栈
@@ -405,6 +524,37 @@ async def hybridrag_stream(item: rag_item):
     return StreamingResponse(stream_generator(), media_type="text/event-stream")
 
 
+async def answer_queued(session_id: str, item: rag_item, community_info, results):
+    """由检索到的关系与文本块生成回答，并写入会话结果"""
+    loop = asyncio.get_event_loop()
+    try:
+        # 使用hybrid_rag函数，使用RAG专用线程池
+        result = await loop.run_in_executor(
+            rag_executor,
+            rag_agent.hybrid_rag,
+            item.request,
+            community_info,
+            results,
+            item.messages,
+            item.flow
+        )
+
+        # 确保结果有效
+        if not result or result == -1:
+            session_responses[session_id]["status"] = "error"
+            session_responses[session_id]["response"] = "生成回答失败"
+        else:
+            session_responses[session_id]["status"] = "completed"
+            session_responses[session_id]["response"] = {
+                "answer": result.get('answer', ''),
+                "material": result.get('material', '')
+            }
+    except Exception as e:
+        logger.error(f"处理队列中的响应时出错: {str(e)}", exc_info=True)
+        session_responses[session_id]["status"] = "error"
+        session_responses[session_id]["response"] = f"处理失败: {str(e)}"
+
+
 # 处理会话队列的后台任务
 async def process_session_queue(session_id: str):
     """处理特定会话的消息队列"""
@@ -430,41 +580,30 @@ async def process_session_queue(session_id: str):
                     store_manager = storeManager(store=chromadb_store, agent=kg_agent)
 
                     # 执行RAG流程，使用RAG专用线程池
-                    flow = item.flow
                     rag_entity = await loop.run_in_executor(rag_executor, store_manager.text2entity, item.request,
                                                             base_name)
-                    community_info = await loop.run_in_executor(rag_executor, store_manager.community_louvain_G,
-                                                                base_name, rag_entity, item.weight_threshold, 
-                                                                item.max_relations)
+                    community_info = await loop.run_in_executor(rag_executor, store_manager.graph_retrieve,
+                                                                base_name, rag_entity, item.retrieval_mode,
+                                                                item.weight_threshold, item.max_relations,
+                                                                item.max_hops)
                     results = await loop.run_in_executor(rag_executor, store_manager.select_vectors, item.request,
                                                          base_name, item.top_k)
 
-                    try:
-                        # 使用hybrid_rag函数，使用RAG专用线程池
-                        result = await loop.run_in_executor(
-                            rag_executor,
-                            rag_agent.hybrid_rag,
-                            item.request,
-                            community_info,
-                            results,
-                            item.messages,
-                            flow
-                        )
-
-                        # 确保结果有效
-                        if not result or result == -1:
-                            session_responses[session_id]["status"] = "error"
-                            session_responses[session_id]["response"] = "生成回答失败"
-                        else:
-                            session_responses[session_id]["status"] = "completed"
-                            session_responses[session_id]["response"] = {
-                                "answer": result.get('answer', ''),
-                                "material": result.get('material', '')
-                            }
-                    except Exception as e:
-                        logger.error(f"处理队列中的响应时出错: {str(e)}", exc_info=True)
-                        session_responses[session_id]["status"] = "error"
-                        session_responses[session_id]["response"] = f"处理失败: {str(e)}"
+                    await answer_queued(session_id, item, community_info, results)
+            else:
+                # 未指定文件：通过跨文档实体索引检索整个知识库
+                logger.info(f"开始处理队列中的跨文档知识图谱查询: {item.request}")
+                store_manager = storeManager(store=chromadb_store, agent=kg_agent)
+                rag_entity = await loop.run_in_executor(rag_executor, store_manager.federated_text2entity,
+                                                        item.request)
+                documents, community_info = await loop.run_in_executor(
+                    rag_executor, store_manager.federated_retrieve, rag_entity, item.retrieval_mode,
+                    item.weight_threshold, item.max_relations, item.max_hops)
+                results = []
+                if documents:
+                    results = await loop.run_in_executor(rag_executor, store_manager.select_vectors, item.request,
+                                                         documents, item.top_k)
+                await answer_queued(session_id, item, community_info, results)
 
             # 通知等待的请求处理已完成
             session_events[session_id].set()
@@ -539,8 +678,9 @@ async def delete_session(session_id: str):
     return {"message": f"会话 {session_id} 已清除"}
 
 
-def process_knowledge_graph(base_name: str, text_content: str, original_filename: str, noteType: str = "general"):
-    """处理文本内容生成知识图谱"""
+def process_knowledge_graph(base_name: str, text_content: str, original_filename: str, noteType: str = "general",
+                            splitter=None):
+    """处理文本内容生成知识图谱（splitter为空时使用默认分割器）"""
     try:
         # 获取文件处理锁
         if base_name not in file_locks:
@@ -551,10 +691,11 @@ def process_knowledge_graph(base_name: str, text_content: str, original_filename
             start_time = time.time()
 
             # 更新状态为处理中
-            PROCESS_STATUS[base_name] = "processing"
+            set_file_status(base_name, "processing", original_filename)
 
             # 新建独立的KgManager实例
-            kg_manager = KgManager(agent=kg_agent, splitter=kg_splitter, embedding_model=embeddings, store=chromadb_store)
+            kg_manager = KgManager(agent=kg_agent, splitter=splitter or kg_splitter, embedding_model=embeddings,
+                                   store=chromadb_store)
 
             # 设置笔记类型
             kg_manager.noteType = noteType
@@ -562,34 +703,29 @@ def process_knowledge_graph(base_name: str, text_content: str, original_filename
 
             # 知识图谱构建过程
             r = kg_manager.知识图谱的构建(text_content)
-            kg_manager.知识融合(r)
+            merged = kg_manager.知识融合(r)
             logger.info(f"知识图谱构建完成，耗时: {time.time() - start_time:.2f}秒")
 
-            # 转换为有向图
-            kg_manager.三元组转有向图nx(r)
+            # 转换为有向图（kg_triplet保留原始抽取结果，图谱使用融合后的关系）
+            kg_manager.三元组转有向图nx(merged)
 
-            # 绘制知识图谱
+            # 保存图谱（前端查看器通过 /graph 接口获取图谱数据渲染，不再生成HTML）
             start_time = time.time()
-            kg_manager.绘制知识图谱(base_name)
+            kg_manager.file = base_name  # 图谱状态、文本块向量与文件目录都以文件名（不含扩展名）为键
             kg_manager.original_file_type = original_filename  # 使用原始文件名
 
             kg_manager.save_store()
-            logger.info(f"知识图谱绘制完成，耗时: {time.time() - start_time:.2f}秒")
-
-            # 保存并移动结果文件
-            result_file = f"{base_name}.html"
-            if os.path.exists(result_file):
-                shutil.move(result_file, os.path.join(RESULT_FOLDER, result_file))
-            else:
-                raise FileNotFoundError("未生成结果HTML文件")
+            if not chromadb_store.file_exists(base_name):
+                raise ValueError(f"知识图谱保存后无法按文件名读取: {base_name}")
+            logger.info(f"知识图谱保存完成，耗时: {time.time() - start_time:.2f}秒")
 
             # 更新处理状态为已完成
-            PROCESS_STATUS[base_name] = "completed"
+            set_file_status(base_name, "completed", original_filename)
             logger.info(f"知识图谱处理完成: {base_name}")
 
     except Exception as e:
         error_msg = str(e)
-        PROCESS_STATUS[base_name] = "error"
+        set_file_status(base_name, "error", original_filename)
         logger.error(f"处理文件 {base_name} 出错: {error_msg}", exc_info=True)
         raise
 
@@ -604,7 +740,7 @@ def process_uploaded_file(original_path: str, filename: str, noteType: str = "ge
         txt_path = os.path.join(TXT_FOLDER, txt_filename)
 
         # 在开始处理前将状态设置为processing
-        PROCESS_STATUS[base_name] = "processing"
+        set_file_status(base_name, "processing", filename)
         logger.info(f"开始处理文件: {filename}, 状态已设置为processing")
 
         # 新建独立的KgManager实例
@@ -643,28 +779,20 @@ def process_uploaded_file(original_path: str, filename: str, noteType: str = "ge
 
         logger.info(f"文件 {filename} 转换完成，开始处理知识图谱")
 
-        # 根据文件类型选择不同的文本分块器
-        if len(simple_files) > 0 and file_ext in simple_files:
-            from TextSlicer.SimpleTextSplitter import SimpleTextSplitter
-            kg_manager.splitter = SimpleTextSplitter(2045, 1024)
-        elif len(semantic_files) > 0 and file_ext in semantic_files:
-            from TextSlicer.SemanticTextSplitter import SemanticTextSplitter
-            kg_manager.splitter = SemanticTextSplitter(2045, 1024)
-        elif len(character_files) > 0 and file_ext in character_files:
-            from TextSlicer.CharacterTextSplitter import CharacterTextSplitter
-            kg_manager.splitter = CharacterTextSplitter(separator="</end>", keep_separator=False, max_tokens=2045, min_tokens=1024)
+        # 根据文件类型选择文本分块器
+        kg_manager.splitter = select_splitter(file_ext)
 
-        # 处理知识图谱（传入独立kg_manager）
-        process_knowledge_graph(base_name, text_content, filename, noteType)
+        # 处理知识图谱（传入所选分割器）
+        process_knowledge_graph(base_name, text_content, filename, noteType, kg_manager.splitter)
 
         # 处理完成后更新状态
-        PROCESS_STATUS[base_name] = "completed"
+        set_file_status(base_name, "completed", filename)
         logger.info(f"文件 {filename} 处理完成，状态已设置为completed")
 
     except Exception as e:
         error_msg = f"文件处理失败: {str(e)}"
         if 'base_name' in locals():  # 确保base_name已定义
-            PROCESS_STATUS[base_name] = "error"
+            set_file_status(base_name, "error", filename)
         logger.error(error_msg, exc_info=True)
 
 
@@ -678,11 +806,12 @@ def process_update_file(original_path: str, filename: str, txt_path: str, use_im
         new_txt_path = os.path.join(TXT_FOLDER, new_txt_filename)
 
         # 在开始处理前将状态设置为updating
-        PROCESS_STATUS[base_name] = "updating"
+        set_file_status(base_name, "updating", filename)
         logger.info(f"开始处理文件更新: {filename}, 状态已设置为updating")
 
-        # 新建独立的KgManager实例
-        kg_manager = KgManager(agent=kg_agent, splitter=kg_splitter, embedding_model=embeddings, store=chromadb_store)
+        # 新建独立的KgManager实例（按文件类型选择分割器，与上传时一致）
+        kg_manager = KgManager(agent=kg_agent, splitter=select_splitter(file_ext), embedding_model=embeddings,
+                               store=chromadb_store)
 
         # 设置原始文件名
         kg_manager.original_file_type = filename  # 使用完整文件名
@@ -729,7 +858,7 @@ def process_update_file(original_path: str, filename: str, txt_path: str, use_im
             os.remove(new_txt_path)
 
             # 更新处理状态为已完成
-            PROCESS_STATUS[base_name] = "completed"
+            set_file_status(base_name, "completed", filename)
             return
 
         # 增量更新前，先加载原有知识图谱
@@ -740,12 +869,11 @@ def process_update_file(original_path: str, filename: str, txt_path: str, use_im
         logger.info(f"开始执行增量更新: {base_name}")
         start_time = time.time()
 
-        # 执行增量更新
-        new_kg_triplet = kg_manager.增量更新(new_text_content)
-        new_kg_triplet = kg_manager.知识融合(new_kg_triplet)
+        # 执行增量更新（只抽取新增块，只重新融合受影响的实体对）
+        delta = kg_manager.增量更新(new_text_content)
 
         # 检查更新结果是否为空
-        if not new_kg_triplet or len(new_kg_triplet) == 0:
+        if not delta["added_bolts"] and not delta["removed_bids"]:
             logger.info(f"无新增内容，知识图谱保持不变: {base_name}")
 
             # 更新完成后，用新文件替换旧文件
@@ -753,48 +881,28 @@ def process_update_file(original_path: str, filename: str, txt_path: str, use_im
             os.remove(new_txt_path)  # 删除临时文件
 
             # 更新处理状态为已完成
-            PROCESS_STATUS[base_name] = "completed"
+            set_file_status(base_name, "completed", filename)
             return
 
-        # 转换为有向图
-        kg_manager.三元组转有向图nx(new_kg_triplet)
-
-        # 绘制更新后的知识图谱
-        kg_manager.绘制知识图谱(base_name)
+        logger.info(f"新增块: {len(delta['added_bolts'])}，删除块: {len(delta['removed_bids'])}，"
+                    f"受影响的实体对: {len(delta['affected_pairs'])}")
 
         # 更新完成后，用新文件替换旧文件
         shutil.copy(new_txt_path, txt_path)
         os.remove(new_txt_path)  # 删除临时文件
 
-        # 安全检查：确保Bolts不为空再保存
-        if hasattr(kg_manager, 'Bolts') and kg_manager.Bolts:
-            # 保存更新后的知识图谱
-            try:
-                kg_manager.save_store()
-                logger.info(f"知识图谱增量更新完成，耗时: {time.time() - start_time:.2f}秒")
-            except ValueError as ve:
-                if "输入必须是非空字符串列表" in str(ve):
-                    logger.warning(f"知识图谱增量更新过程中没有生成新的节点，跳过保存步骤")
-                else:
-                    raise
-        else:
-            logger.warning(f"知识图谱增量更新没有生成有效的节点，跳过保存步骤")
-
-        # 保存并移动结果文件
-        result_file = f"{base_name}.html"
-        if os.path.exists(result_file):
-            shutil.move(result_file, os.path.join(RESULT_FOLDER, result_file))
-        else:
-            raise FileNotFoundError("未生成结果HTML文件")
+        # 只保存变化的文本块向量与更新后的图谱状态
+        kg_manager.save_delta(delta["added_bolts"], delta["removed_bids"])
+        logger.info(f"知识图谱增量更新完成，耗时: {time.time() - start_time:.2f}秒")
 
         # 更新处理状态为已完成
-        PROCESS_STATUS[base_name] = "completed"
+        set_file_status(base_name, "completed", filename)
         logger.info(f"知识图谱增量更新完成: {base_name}")
 
     except Exception as e:
         error_msg = f"文件增量更新失败: {str(e)}"
         if 'base_name' in locals():  # 确保base_name已定义
-            PROCESS_STATUS[base_name] = "error"
+            set_file_status(base_name, "error", filename)
         logger.error(error_msg, exc_info=True)
 
         # 清理临时文件
@@ -848,13 +956,11 @@ async def upload_file(
         file_exists = False
         existing_txt = False
 
-        # 创建一个专用的storeManager实例来检查文件是否存在
+        # 创建一个专用的storeManager实例来检查文件是否存在（查询文件目录）
         file_manager = storeManager(store=chromadb_store, agent=kg_agent)
-        db_files = file_manager.list_files()
-        db_file_ids = db_files.get('ids', [])
 
         # 检查文件是否存在于数据库中
-        if base_name in [os.path.splitext(file_id)[0] for file_id in db_file_ids]:
+        if file_manager.file_exists(base_name):
             file_exists = True
             # 检查文本文件是否存在
             if os.path.exists(txt_path):
@@ -871,7 +977,7 @@ async def upload_file(
         # 设置状态和后台处理任务
         if file_exists and existing_txt:
             # 文件在数据库中已存在，执行增量更新
-            PROCESS_STATUS[base_name] = "updating"
+            set_file_status(base_name, "updating", filename)
             logger.info(f"文件 {filename} 已存在，将进行增量更新")
             background_tasks.add_task(process_update_file, original_path, filename, txt_path, use_img2txt_bool)
 
@@ -883,7 +989,7 @@ async def upload_file(
             })
         else:
             # 新文件上传，执行常规处理
-            PROCESS_STATUS[base_name] = "uploading"
+            set_file_status(base_name, "uploading", filename)
             background_tasks.add_task(process_uploaded_file, original_path, filename, noteType, use_img2txt_bool)
 
             return JSONResponse({
@@ -921,6 +1027,10 @@ async def get_processing_status(filename: str):
     """
     base_name = os.path.splitext(filename)[0]
     status = PROCESS_STATUS.get(base_name)
+    if status is None:
+        # 服务重启后进程内状态表为空，读取文件目录中保存的状态
+        record = chromadb_store.file_catalog.get(base_name)
+        status = record["status"] if record else None
 
     # 状态映射，用于前端展示
     status_map = {
@@ -932,7 +1042,7 @@ async def get_processing_status(filename: str):
     }
 
     if status:
-        result_exists = os.path.exists(os.path.join(RESULT_FOLDER, f'{base_name}.html'))
+        result_exists = chromadb_store.file_exists(base_name)
         display_status = status_map.get(status, status)
 
         return JSONResponse({
@@ -948,78 +1058,220 @@ async def get_processing_status(filename: str):
         )
 
 
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 是否命中：逗号分隔的ETag列表，"*" 匹配任意内容，比较时忽略弱校验前缀 W/"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def conditional_response(request: Request, etag: str, bodies: Dict[str, bytes], media_type: str,
+                         headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    带ETag的条件响应：If-None-Match 命中时返回304，否则按 Accept-Encoding 选择预压缩的内容
+
+    参数:
+        bodies: {"identity": 原始内容, "gzip": ..., "br": ...}，压缩版本可缺省
+    """
+    headers = {
+        "ETag": etag,
+        # 允许缓存，但每次使用前用ETag向服务端确认
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        **(headers or {})
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    accepted = request.headers.get("accept-encoding", "")
+    for encoding in ("br", "gzip"):
+        if encoding in bodies and encoding in accepted:
+            headers["Content-Encoding"] = encoding
+            return Response(bodies[encoding], media_type=media_type, headers=headers)
+    return Response(bodies["identity"], media_type=media_type, headers=headers)
+
+
+def compress_variants(body: bytes) -> Dict[str, bytes]:
+    """原始内容及其gzip/brotli压缩版本（未安装brotli时只有gzip）"""
+    bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=6)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(body, quality=5)
+    return bodies
+
+
+def iter_file_range(path: str, start: int, end: int):
+    """按块读取文件的 [start, end] 字节区间"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(FILE_CONTENT_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def parse_byte_range(header: str, size: int) -> Optional[tuple]:
+    """
+    解析单个 Range: bytes=start-end（也支持 start- 与 -suffix）
+
+    返回:
+        (start, end)，范围无效时返回None
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            length = int(last)
+            if length <= 0:
+                return None
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start < 0 or start > end:
+        return None
+    return start, end
+
+
+def read_text_page(path: str, offset: int, limit: int) -> Dict:
+    """
+    按字节偏移读取一页UTF-8文本，边界落在多字节字符中间时自动对齐到完整字符
+
+    返回:
+        {"content", "offset", "next_offset", "total_size", "eof"}
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(limit)
+    # 起点落在字符中间时跳过残余的续字节
+    skip = 0
+    while skip < len(data) and skip < 3 and (data[skip] & 0xC0) == 0x80:
+        skip += 1
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    content = decoder.decode(data[skip:], final=offset + len(data) >= size)
+    # 末尾不完整的字符留给下一页
+    pending = len(decoder.getstate()[0])
+    next_offset = offset + len(data) - pending
+    return {
+        "content": content,
+        "offset": offset + skip,
+        "next_offset": next_offset,
+        "total_size": size,
+        "eof": next_offset >= size
+    }
+
+
 @app.get("/file-content/{filename}")
-async def get_file_content(filename: str):
+async def get_file_content(filename: str, request: Request, offset: Optional[int] = None,
+                           limit: Optional[int] = None, stream: bool = False):
     """
     获取转换后的文本内容。
     
     用途：
-        获取指定文件转换后的纯文本内容。
+        获取指定文件转换后的纯文本内容。大文件可分页或按字节区间读取，避免一次读入内存。
     
     参数：
         filename (str): 文件名。
+        offset (int, optional): 分页读取的起始字节偏移，指定 offset 或 limit 时按页返回。
+        limit (int, optional): 每页最多读取的字节数，默认 FILE_CONTENT_PAGE_LIMIT。
+        stream (bool): 为真时以 text/plain 流式返回全文。
+        请求头 Range: bytes=start-end 时以 206 流式返回对应字节区间。
     
     返回：
-        JSONResponse: {"content": str}
+        JSONResponse: {"content": str}；分页时另含 offset/next_offset/total_size/eof
+        StreamingResponse: 流式全文或字节区间
     
     异常：
-        文件不存在或读取失败时返回404/500。
+        文件不存在或读取失败时返回404/500，区间无效时返回416。
     """
     txt_filename = f"{os.path.splitext(filename)[0]}.txt"
     txt_path = os.path.join(TXT_FOLDER, txt_filename)
 
-    if os.path.exists(txt_path):
-        try:
-            with open(txt_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            return JSONResponse({"content": content})
-        except Exception as e:
-            error_msg = str(e)
-            logger.error(f"读取文件内容失败: {error_msg}")
-            return JSONResponse(
-                status_code=500,
-                content={"error": f"读取文件内容失败: {error_msg}"}
-            )
-    else:
+    if not os.path.exists(txt_path):
         return JSONResponse(
             status_code=404,
             content={"error": "文件不存在或尚未完成转换"}
         )
 
+    try:
+        stat = os.stat(txt_path)
+        size = stat.st_size
+        # 文本文件只在转换时写入，大小与修改时间足以判断内容是否变化
+        etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Accept-Ranges": "bytes"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        range_header = request.headers.get("range")
+        if range_header:
+            byte_range = parse_byte_range(range_header, size)
+            if byte_range is None:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+            start, end = byte_range
+            headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+            return StreamingResponse(iter_file_range(txt_path, start, end), status_code=206,
+                                     media_type="text/plain; charset=utf-8", headers=headers)
+
+        if stream:
+            headers["Content-Length"] = str(size)
+            return StreamingResponse(iter_file_range(txt_path, 0, size - 1), media_type="text/plain; charset=utf-8",
+                                     headers=headers)
+
+        if offset is not None or limit is not None:
+            offset = max(offset or 0, 0)
+            limit = min(max(limit or FILE_CONTENT_PAGE_LIMIT, 1), FILE_CONTENT_PAGE_LIMIT)
+            page = await asyncio.get_event_loop().run_in_executor(None, read_text_page, txt_path, offset, limit)
+            return JSONResponse(page, headers=headers)
+
+        with open(txt_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        return JSONResponse({"content": content}, headers=headers)
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"读取文件内容失败: {error_msg}")
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"读取文件内容失败: {error_msg}"}
+        )
+
 
 @app.get("/result/{filename}")
-async def get_result(filename: str):
+async def get_result(filename: str, request: Request):
     """
-    获取处理结果的HTML文件。
+    获取知识图谱查看器页面。
     
     用途：
-        下载或预览知识图谱HTML结果。
+        返回静态查看器页面（只注入接口地址与文件名），图谱数据由页面通过 /graph 接口获取。
     
     参数：
         filename (str): 文件名。
     
     返回：
-        FileResponse: HTML文件。
+        Response: 查看器HTML（按 Accept-Encoding 返回预压缩版本，未变化时返回304）。
         JSONResponse: 错误时返回错误信息。
     
     异常：
-        结果文件不存在时返回404。
+        图谱不存在时返回404。
     """
     base_name = os.path.splitext(filename)[0]
-    result_file = f"{base_name}.html"
-    result_path = os.path.join(RESULT_FOLDER, result_file)
-
-    if os.path.exists(result_path):
-        safe_filename = quote(result_file, safe='')
-        return FileResponse(
-            result_path,
-            media_type="text/html",
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Content-Disposition": f"inline; filename*=utf-8''{safe_filename}"
-            }
-        )
-    else:
+    if not chromadb_store.file_exists(base_name):
         status = PROCESS_STATUS.get(base_name, "unknown")
         return JSONResponse(
             status_code=404,
@@ -1030,6 +1282,209 @@ async def get_result(filename: str):
             }
         )
 
+    api_base = str(request.base_url).rstrip("/")
+    # 节点数超过阈值的大图先展示社区概览，按需展开
+    record = chromadb_store.file_catalog.get(base_name)
+    level_of_detail = record is not None and record["node_count"] > GRAPH_LOD_NODE_THRESHOLD
+    # 页面只由接口地址、文件名与是否分级决定，渲染结果与压缩版本按此缓存
+    key = (api_base, filename, level_of_detail)
+    with RESULT_CACHE_LOCK:
+        cached = RESULT_CACHE.get(key)
+        if cached is not None:
+            RESULT_CACHE.move_to_end(key)
+    if cached is None:
+        # 传入原始文件名（/graph 接口只去掉一次扩展名，文件名本身含"."时也能对应）
+        config = json.dumps({"apiBase": api_base, "file": filename, "levelOfDetail": level_of_detail})
+        # 文件名与Host头都来自请求方：JSON中的 < > & 转义后才能放进 <script>，href 按HTML属性转义
+        config = config.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+        # 页面可能以 srcdoc 方式嵌入，用 <base> 让相对路径的静态资源指向本服务
+        injection = (
+            f'<base href="{html.escape(api_base + "/lib/graph-viewer/", quote=True)}">\n'
+            f'    <script>window.GRAPH_VIEWER_CONFIG = {config};</script>'
+        )
+        page = GRAPH_VIEWER_TEMPLATE.replace("<!-- GRAPH_VIEWER_CONFIG -->", injection, 1)
+        body = page.encode("utf-8")
+        cached = (f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', compress_variants(body))
+        with RESULT_CACHE_LOCK:
+            RESULT_CACHE[key] = cached
+            while len(RESULT_CACHE) > RESULT_CACHE_SIZE:
+                RESULT_CACHE.popitem(last=False)
+
+    safe_filename = quote(f"{base_name}.html", safe='')
+    etag, bodies = cached
+    return conditional_response(
+        request,
+        etag,
+        bodies,
+        "text/html; charset=utf-8",
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Content-Disposition": f"inline; filename*=utf-8''{safe_filename}"
+        }
+    )
+
+
+@app.get("/graph/{filename}")
+async def get_graph(filename: str, request: Request, format: str = "json"):
+    """
+    获取知识图谱数据（紧凑格式）。
+    
+    用途：
+        供查看器渲染图谱；按内容哈希返回ETag，未变化时返回304，支持gzip与msgpack。
+    
+    参数：
+        filename (str): 文件名。
+        format (str): json（默认）或 msgpack（需安装msgpack，未安装时返回json）。
+    
+    返回：
+        Response: {"format", "nodes", "node_groups", "strings", "src", "dst", "weight", "label", "context"}
+    
+    异常：
+        图谱不存在时返回404，格式不支持时返回400。
+    """
+    if format not in ("json", "msgpack"):
+        return JSONResponse(status_code=400, content={"error": f"不支持的格式: {format}"})
+    base_name = os.path.splitext(filename)[0]
+    manager = storeManager(store=chromadb_store, agent=kg_agent)
+    payload = await asyncio.get_event_loop().run_in_executor(rag_executor, manager.get_graph_payload, base_name)
+    if payload is None:
+        return JSONResponse(status_code=404, content={"error": "知识图谱不存在", "filename": filename})
+
+    if format == "msgpack" and msgpack is not None:
+        etag = f'"{payload["etag"]}-m"'
+        if etag_matches(request, etag):
+            return conditional_response(request, etag, {}, "application/x-msgpack")
+        body = msgpack.packb(json.loads(payload["json"]), use_bin_type=True)
+        return conditional_response(request, etag, {"identity": body}, "application/x-msgpack")
+    return conditional_response(request, f'"{payload["etag"]}"', {"identity": payload["json"], "gzip": payload["gzip"]},
+                                "application/json")
+
+
+@app.get("/graph/{filename}/overview")
+async def get_graph_overview(filename: str, max_communities: int = 200, max_edges: int = 500,
+                             min_weight: Optional[float] = None):
+    """
+    获取大图的社区概览。
+    
+    用途：
+        每个社区折叠为一个超级节点，社区间的边按社区对聚合，节点带坐标，前端可关闭物理模拟。
+    
+    参数：
+        filename (str): 文件名。
+        max_communities (int): 最多展示的社区数（按社区大小），默认200。
+        max_edges (int): 最多返回的社区间边数（按权重和），默认500。
+        min_weight (Optional[float]): 只聚合权重不低于该值的边。
+    
+    返回：
+        JSONResponse: {"nodes", "edges", "total_nodes", "total_edges", "communities", "hidden_communities", "modularity"}
+    
+    异常：
+        图谱不存在时返回404。
+    """
+    base_name = os.path.splitext(filename)[0]
+    manager = storeManager(store=chromadb_store, agent=kg_agent)
+    level_of_detail = await asyncio.get_event_loop().run_in_executor(
+        rag_executor, manager.get_level_of_detail, base_name)
+    if level_of_detail is None:
+        return JSONResponse(status_code=404, content={"error": "知识图谱不存在", "filename": filename})
+    overview = await asyncio.get_event_loop().run_in_executor(
+        rag_executor, level_of_detail.overview, max_communities, max_edges, min_weight)
+    return JSONResponse(overview)
+
+
+@app.get("/graph/{filename}/community/{community}")
+async def get_graph_community(filename: str, community: int, max_nodes: int = 500, max_edges: int = 2000,
+                              min_weight: Optional[float] = None):
+    """
+    展开单个社区。
+    
+    参数：
+        filename (str): 文件名。
+        community (int): 社区编号（概览中超级节点的community）。
+        max_nodes (int): 最多返回的节点数（按度数），默认500。
+        max_edges (int): 最多返回的边数（按权重），默认2000。
+        min_weight (Optional[float]): 只返回权重不低于该值的边。
+    
+    返回：
+        JSONResponse: {"nodes", "edges", "community", "truncated_nodes", "truncated_edges"}
+    
+    异常：
+        图谱或社区不存在时返回404。
+    """
+    base_name = os.path.splitext(filename)[0]
+    manager = storeManager(store=chromadb_store, agent=kg_agent)
+    level_of_detail = await asyncio.get_event_loop().run_in_executor(
+        rag_executor, manager.get_level_of_detail, base_name)
+    if level_of_detail is None:
+        return JSONResponse(status_code=404, content={"error": "知识图谱不存在", "filename": filename})
+    view = await asyncio.get_event_loop().run_in_executor(
+        rag_executor, level_of_detail.community, community, max_nodes, max_edges, min_weight)
+    if view is None:
+        return JSONResponse(status_code=404, content={"error": f"社区不存在: {community}"})
+    return JSONResponse(view)
+
+
+@app.get("/graph/{filename}/neighborhood")
+async def get_graph_neighborhood(filename: str, entity: str, hops: int = 1, max_nodes: int = 300,
+                                 max_edges: int = 1000, min_weight: Optional[float] = None):
+    """
+    展开实体的k跳邻域。
+    
+    参数：
+        filename (str): 文件名。
+        entity (str): 中心实体。
+        hops (int): 扩展跳数，默认1。
+        max_nodes (int): 最多返回的节点数（距离近、度数高的优先），默认300。
+        max_edges (int): 最多返回的边数（按权重），默认1000。
+        min_weight (Optional[float]): 只返回权重不低于该值的边。
+    
+    返回：
+        JSONResponse: {"nodes", "edges", "center", "truncated_nodes", "truncated_edges"}
+    
+    异常：
+        图谱或实体不存在时返回404。
+    """
+    base_name = os.path.splitext(filename)[0]
+    manager = storeManager(store=chromadb_store, agent=kg_agent)
+    level_of_detail = await asyncio.get_event_loop().run_in_executor(
+        rag_executor, manager.get_level_of_detail, base_name)
+    if level_of_detail is None:
+        return JSONResponse(status_code=404, content={"error": "知识图谱不存在", "filename": filename})
+    view = await asyncio.get_event_loop().run_in_executor(
+        rag_executor, level_of_detail.neighborhood, entity, hops, max_nodes, max_edges, min_weight)
+    if view is None:
+        return JSONResponse(status_code=404, content={"error": f"实体不存在: {entity}"})
+    return JSONResponse(view)
+
+
+@app.get("/graph/{filename}/diff")
+async def get_graph_diff(filename: str, limit: int = 2000):
+    """
+    获取最近一次增量更新的图谱变化。
+
+    用途：
+        增量更新保存时已与更新前的图谱比较并保存差异，查看器按状态着色展示“哪些变了”。
+
+    参数：
+        filename (str): 文件名。
+        limit (int): 最多返回的变化边数（新增、删除、修改依次截取），默认2000。
+
+    返回：
+        JSONResponse: {"summary", "nodes", "edges", "truncated"}，节点与边带 added/removed/changed/unchanged 状态
+
+    异常：
+        图谱不存在或尚无增量更新记录时返回404。
+    """
+    base_name = os.path.splitext(filename)[0]
+    if not chromadb_store.file_exists(base_name):
+        return JSONResponse(status_code=404, content={"error": "知识图谱不存在", "filename": filename})
+    manager = storeManager(store=chromadb_store, agent=kg_agent)
+    diff = await asyncio.get_event_loop().run_in_executor(rag_executor, manager.get_graph_diff, base_name,
+                                                          max(limit, 1))
+    if diff is None:
+        return JSONResponse(status_code=404, content={"error": "该文件尚无增量更新记录", "filename": filename})
+    return JSONResponse(diff)
+
 
 @app.get("/health")
 async def health_check():
@@ -1051,76 +1506,85 @@ async def health_check():
     return {"status": "healthy", "timestamp": time.time()}
 
 
+@app.get("/model-stats")
+async def model_stats():
+    """
+    获取分割器共享模型的加载状态。
+
+    用途：
+        查看进程级模型注册表中各模型是否已加载、加载耗时及常驻内存占用。
+
+    参数：
+        无
+
+    返回：
+        dict: {"pid": int, "rss_mb": float, "models": {name: {"loaded": bool, "load_seconds": float, "rss_delta_mb": float}}}
+
+    异常：
+        无
+    """
+    from TextSlicer.ModelRegistry import model_registry
+    return model_registry.stats()
+
+
 @app.get("/list-files")
-async def list_files():
+async def list_files(offset: int = 0, limit: Optional[int] = None):
     """
     获取所有已处理文件列表。
     
     用途：
-        查询所有已上传并处理过的文件及其状态。
+        查询所有已上传的文件及其状态，含处理中与失败的文件（读取文件目录，不加载图谱状态）。
     
     参数：
-        无
+        offset (int): 分页起始位置，默认0。
+        limit (Optional[int]): 每页数量，默认返回全部。
     
     返回：
-        JSONResponse: {"files": List[dict]}
+        JSONResponse: {"files": List[dict], "total": int, "offset": int, "limit": Optional[int]}
     
     异常：
         获取失败时返回500。
     """
+    if offset < 0 or (limit is not None and limit <= 0):
+        return JSONResponse(status_code=400, content={"error": "offset不能为负数，limit必须大于0"})
     try:
         # 创建一个专用的storeManager实例来获取文件列表
         file_manager = storeManager(store=chromadb_store, agent=kg_agent)
 
-        # 获取数据库中的文件列表
-        db_files = file_manager.list_files()
-        db_file_ids = db_files.get('ids', [])
-        db_metadatas = db_files.get('metadatas', [])
-
-        # 获取当前正在处理的文件（从PROCESS_STATUS获取）
-        processing_statuses = ["uploading", "processing"]
-        processing_files = {base_name: status for base_name, status in PROCESS_STATUS.items()
-                            if status in processing_statuses}
-
         # 状态映射，用于前端展示
         status_map = {
             "uploading": "上传中",
             "processing": "处理中",
+            "updating": "增量更新中",
             "completed": "已完成",
             "error": "失败"
         }
 
-        # 合并结果：先处理数据库中的文件
-        processed_files = []
-        for i, file_id in enumerate(db_file_ids):
-            if i >= len(db_metadatas):
-                continue  # 防止索引错误
-
-            base_name = os.path.splitext(file_id)[0]
-            original_filename = db_metadatas[i].get('original_file_type', file_id)
-
-            # 获取状态：优先从PROCESS_STATUS获取
-            status = PROCESS_STATUS.get(base_name, "completed")
-            display_status = status_map.get(status, status)
+        # 文件目录分页（上传开始即写入记录，处理中与失败的文件也在其中）
+        db_records, db_total = file_manager.list_files(offset, limit)
 
+        processed_files = []
+        for record in db_records:
+            status = record["status"]
             processed_files.append({
-                "filename": original_filename,
+                "filename": record["original_filename"],
                 "status": status,
-                "display_status": display_status
+                "display_status": status_map.get(status, status),
+                "size": record["text_size"],
+                "file_type": record["file_type"],
+                "bolt_count": record["bolt_count"],
+                "node_count": record["node_count"],
+                "edge_count": record["edge_count"],
+                "created_at": record["created_at"],
+                "updated_at": record["updated_at"]
             })
 
-        # 再添加仅在PROCESS_STATUS中的文件（正在处理但尚未添加到数据库的文件）
-        db_base_names = [os.path.splitext(file_id)[0] for file_id in db_file_ids]
-        for base_name, status in processing_files.items():
-            if base_name not in db_base_names:
-                display_status = status_map.get(status, status)
-                processed_files.append({
-                    "filename": f"{base_name}.txt",  # 默认使用txt扩展名
-                    "status": status,
-                    "display_status": display_status
-                })
-
-        return JSONResponse({"files": processed_files})
+        return JSONResponse({
+            "files": processed_files,
+            "total": db_total,
+            "offset": offset,
+            "limit": limit
+        })
     except Exception as e:
         logger.error(f"获取文件列表失败: {str(e)}", exc_info=True)
         return JSONResponse(
@@ -1191,7 +1655,7 @@ async def delete_rag_history(filename: str):
 
 
 @app.get("/file-entities/{filename}")
-async def get_file_entities(filename: str, count: int = 5):
+async def get_file_entities(filename: str, count: int = 5, metric: str = "degree"):
     """
     获取文件的主要实体。
     
@@ -1201,6 +1665,7 @@ async def get_file_entities(filename: str, count: int = 5):
     参数：
         filename (str): 文件名。
         count (int): 返回实体数量，默认5。
+        metric (str): 排名指标，degree/weighted_degree/pagerank，默认degree。
     
     返回：
         JSONResponse: {"entities": List[str]}
@@ -1214,9 +1679,15 @@ async def get_file_entities(filename: str, count: int = 5):
         # 创建一个存储管理器实例
         manager = storeManager(store=chromadb_store, agent=kg_agent)
 
+        if metric not in GraphRankings.METRICS:
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"不支持的排名指标: {metric}"}
+            )
+
         # 获取文件中的主要实体
-        # 按关联度最高的节点
-        entities = manager.edge_max_node(base_name, count)
+        # 按预先计算的排名（默认关联度最高的节点）
+        entities = manager.edge_max_node(base_name, count, metric)
         # 随机节点
         # entities = manager.get_n_entity(base_name, count)
 